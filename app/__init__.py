@@ -35,6 +35,52 @@ def create_app(config_name=None):
     
     
     from app import models
+    from app.utils.metrics import register_metric_listeners
+    register_metric_listeners()
+
+    from app.utils.cache import stats_cache
+    stats_cache.init_app(app)
+
+    from app.admin.stats import register_stats_invalidation
+    register_stats_invalidation()
+
+    from app.utils.events import event_broker, register_event_publishers
+    event_broker.init_app(app)
+    register_event_publishers()
+
+    from app.utils.video_rooms import video_rooms
+    video_rooms.init_app(app)
+
+    from app.appointments.search import register_search_sync
+    register_search_sync()
+
+    from app.appointments.facets import register_facet_invalidation
+    register_facet_invalidation()
+
+    from app.uploads.quota import storage_quota, register_storage_counter
+    storage_quota.init_app(app)
+    register_storage_counter()
+
+    from app.uploads.renditions import rendition_worker, register_rendition_jobs
+    rendition_worker.init_app(app)
+    register_rendition_jobs()
+    
+    from app.utils.jobs import job_queue, register_job_wakeups
+    job_queue.init_app(app)
+    register_job_wakeups()
+    
+    from app.uploads.pdf_pages import page_renderer
+    page_renderer.init_app(app)
+    
+    from app.uploads.analysis_cache import analysis_cache
+    analysis_cache.init_app(app)
+
+    from app.utils.gemini_client import gemini_client
+    gemini_client.init_app(app)
+
+    from app.uploads.pipeline import UploadRequest, discard_staged_uploads
+    app.request_class = UploadRequest
+    app.teardown_request(discard_staged_uploads)
     
     
     from app.auth import bp as auth_bp
@@ -64,6 +110,9 @@ def create_app(config_name=None):
     from app.notifications import bp as notifications_bp
     app.register_blueprint(notifications_bp, url_prefix='/notifications')
 
+    from app.events import bp as events_bp
+    app.register_blueprint(events_bp, url_prefix='/events')
+
     from app.ai_assistant import bp as ai_assistant_bp
     app.register_blueprint(ai_assistant_bp, url_prefix='/ai-assistant')
 
@@ -121,6 +170,8 @@ def create_app(config_name=None):
     
     with app.app_context():
         db.create_all()
+        from app.appointments.search import doctor_search
+        doctor_search.ensure_index()
     
     return app
 
@@ -3,6 +3,10 @@ from flask_login import login_required, current_user
 from app import db
 from app.admin import bp
 from app.admin.forms import EditUserForm, SendAnnouncementForm, SystemSettingsForm
+from app.admin.stats import get_platform_stats, get_cached_daily_series, get_recent_activities
+from app.utils.cache import stats_cache
+from app.uploads.analysis_cache import analysis_cache
+from app.utils.gemini_client import gemini_client
 from app.models import User, Appointment, Payment, MedicalFile, Message, Notification, Referral, Setting
 from app.utils.decorators import admin_required
 from app.utils.helpers import create_notification
@@ -16,88 +20,10 @@ from app.utils.email import send_email
 @admin_required
 def admin_dashboard():
     
-    user_growth = db.session.query(
-        func.date(User.created_at).label('date'),
-        func.count(User.id).label('count')
-    ).group_by(func.date(User.created_at)).order_by('date').all()
+    user_growth_labels, user_growth_data = get_cached_daily_series('signups', cast=int)
+    revenue_labels, revenue_data = get_cached_daily_series('revenue')
 
-    
-    revenue_growth = db.session.query(
-        func.date(Payment.payment_date).label('date'),
-        func.sum(Payment.amount).label('revenue')
-    ).filter(Payment.status == 'completed').group_by(
-        func.date(Payment.payment_date)
-    ).order_by('date').all()
-    total_users = User.query.count()
-    total_patients = User.query.filter_by(role='patient').count()
-    total_doctors = User.query.filter_by(role='doctor').count()
-    doctors_count = total_doctors
-    patients_count = total_patients
-    admins_count = User.query.filter_by(role='admin').count()
-    user_growth_labels = [datetime.strptime(row.date, '%Y-%m-%d').strftime('%b %d') if isinstance(row.date, str) else row.date.strftime('%b %d') for row in user_growth]
-    user_growth_data = [row.count for row in user_growth]
-
-    revenue_labels = [datetime.strptime(row.date, '%Y-%m-%d').strftime('%b %d') if isinstance(row.date, str) else row.date.strftime('%b %d') for row in revenue_growth]
-    revenue_data = [float(row.revenue) for row in revenue_growth]
-
-    
-    total_appointments = Appointment.query.count()
-    today_appointments = Appointment.query.filter_by(
-        appointment_date=datetime.now().date()
-    ).count()
-    
-    
-    total_payments = Payment.query.filter_by(status='completed').count()
-    PLATFORM_FEE = 2.99
-    TAX_AMOUNT = 1.50
-    TOTAL_PLATFORM_EARNING_PER_CONSULTATION = PLATFORM_FEE + TAX_AMOUNT  
-
-    
-    consultation_count = Payment.query.filter_by(
-        payment_type='consultation',
-        status='completed'
-    ).count()
-
-    
-    consultation_revenue = consultation_count * TOTAL_PLATFORM_EARNING_PER_CONSULTATION
-
-    
-    subscription_revenue = db.session.query(
-        func.sum(Payment.amount)
-    ).filter(
-        Payment.payment_type == 'subscription',
-        Payment.status == 'completed'
-    ).scalar() or 0
-
-    
-    total_revenue = round(consultation_revenue + subscription_revenue, 2)
-
-    
-    this_month_start = datetime.now().replace(day=1)
-    this_month_users = User.query.filter(
-        User.created_at >= this_month_start
-    ).count()
-    
-    consultation_this_month_count = Payment.query.filter(
-        Payment.payment_type == 'consultation',
-        Payment.status == 'completed',
-        Payment.payment_date >= this_month_start
-    ).count()
-
-    
-    consultation_revenue_this_month = consultation_this_month_count * TOTAL_PLATFORM_EARNING_PER_CONSULTATION
-
-    
-    subscription_revenue_this_month = db.session.query(
-        func.sum(Payment.amount)
-    ).filter(
-        Payment.payment_type == 'subscription',
-        Payment.status == 'completed',
-        Payment.payment_date >= this_month_start
-    ).scalar() or 0
-
-    
-    revenue_this_month = round(consultation_revenue_this_month + subscription_revenue_this_month, 2)
+    platform_stats = get_platform_stats()
 
     
     recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
@@ -107,89 +33,25 @@ def admin_dashboard():
     recent_payments = Payment.query.filter_by(
         status='completed'
     ).order_by(Payment.payment_date.desc()).limit(5).all()
-    
-    
-    total_files = MedicalFile.query.count()
-    total_messages = Message.query.count()
-    unresolved_issues = 0  
-    
-    active_subscriptions = db.session.query(Payment.user_id).filter(
-        Payment.payment_type == 'subscription',
-        Payment.status == 'completed'
-    ).distinct().count()
-
-    
-    subscription_conversion_rate = round((active_subscriptions / total_users) * 100, 2) if total_users > 0 else 0
-
-    from collections import namedtuple
-
-    Activity = namedtuple('Activity', ['timestamp', 'user', 'action_type', 'description'])
-
-    recent_activities = []
-
-    
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    for user in recent_users:
-        recent_activities.append(Activity(
-            timestamp=user.created_at,
-            user=user,
-            action_type='register',
-            description=f"{user.name} ({user.role}) registered."
-        ))
-
-    
-    recent_payments = Payment.query.filter_by(status='completed').order_by(Payment.payment_date.desc()).limit(5).all()
-    for payment in recent_payments:
-        recent_activities.append(Activity(
-            timestamp=payment.payment_date,
-            user=payment.user,
-            action_type='payment',
-            description=f"{payment.user.name} paid {payment.amount} for {payment.payment_type}."
-        ))
-
-    
-    recent_appts = Appointment.query.order_by(Appointment.created_at.desc()).limit(5).all()
-    for appt in recent_appts:
-        recent_activities.append(Activity(
-            timestamp=appt.created_at,
-            user=appt.patient,
-            action_type='appointment',
-            description=f"{appt.patient.name} booked with Dr. {appt.doctor.name} ({appt.status})."
-        ))
-
-    
-    recent_activities.sort(key=lambda x: x.timestamp, reverse=True)
 
-    
-    recent_activities = recent_activities[:10]
-    
-    top_doctors = db.session.query(
-        User.id,
-        User.name,
-        User.specialization,
-        func.count(Appointment.id).label('total_appointments')
-    ).join(Appointment, Appointment.doctor_id == User.id
-    ).filter(User.role == 'doctor'
-    ).group_by(User.id, User.name, User.specialization
-    ).order_by(func.count(Appointment.id).desc()
-    ).limit(5).all()
+    recent_activities = get_recent_activities()
 
     stats = {
-        'total_users': total_users,
-        'total_patients': total_patients,
-        'total_doctors': total_doctors,
-        'total_appointments': total_appointments,
-        'today_appointments': today_appointments,
-        'total_payments': total_payments,
-        'total_revenue': float(total_revenue),
-        'this_month_users': this_month_users,
-        'this_month_revenue': float(revenue_this_month),
-        'total_files': total_files,
-        'total_messages': total_messages,
-        'unresolved_issues': unresolved_issues,
-        'doctors_count': doctors_count,
-        'patients_count': patients_count,
-        'admins_count': admins_count,
+        'total_users': platform_stats['total_users'],
+        'total_patients': platform_stats['total_patients'],
+        'total_doctors': platform_stats['total_doctors'],
+        'total_appointments': platform_stats['total_appointments'],
+        'today_appointments': platform_stats['today_appointments'],
+        'total_payments': platform_stats['total_payments'],
+        'total_revenue': platform_stats['platform_revenue'],
+        'this_month_users': platform_stats['this_month_users'],
+        'this_month_revenue': platform_stats['platform_revenue_this_month'],
+        'total_files': platform_stats['total_files'],
+        'total_messages': platform_stats['total_messages'],
+        'unresolved_issues': 0,
+        'doctors_count': platform_stats['total_doctors'],
+        'patients_count': platform_stats['total_patients'],
+        'admins_count': platform_stats['admins_count'],
         'user_growth_labels': user_growth_labels,
         'user_growth_data': user_growth_data,
         'revenue_labels': revenue_labels,
@@ -204,18 +66,18 @@ def admin_dashboard():
                          recent_users=recent_users,
                          recent_appointments=recent_appointments,
                          recent_payments=recent_payments,
-                         doctors_count=doctors_count,
-                         patients_count=patients_count,
-                         admins_count=admins_count,
-                         total_users=total_users,
+                         doctors_count=platform_stats['total_doctors'],
+                         patients_count=platform_stats['total_patients'],
+                         admins_count=platform_stats['admins_count'],
+                         total_users=platform_stats['total_users'],
                          user_growth_labels=user_growth_labels,
                          user_growth_data=user_growth_data,
                          revenue_labels=revenue_labels,
                          revenue_data=revenue_data,
-                         active_subscriptions=active_subscriptions,
-                         subscription_conversion_rate=subscription_conversion_rate,
+                         active_subscriptions=platform_stats['active_subscriptions'],
+                         subscription_conversion_rate=platform_stats['subscription_conversion_rate'],
                          recent_activities=recent_activities,
-                         top_doctors=top_doctors)
+                         top_doctors=platform_stats['top_doctors'][:5])
 
 @bp.route('/users')
 @login_required
@@ -468,11 +330,13 @@ def manage_files():
     
     total_files = MedicalFile.query.count()
     total_size = db.session.query(func.sum(MedicalFile.file_size)).scalar() or 0
+    cache_stats = analysis_cache.stats()
     
     return render_template('admin/manage_files.html',
                          files=files,
                          total_files=total_files,
                          total_size=total_size,
+                         cache_stats=cache_stats,
                          type_filter=type_filter)
 
 @bp.route('/referrals')
@@ -573,38 +437,16 @@ def send_announcement():
 @admin_required
 def api_stats():
     
-    
-    total_users = User.query.count()
-    active_users = User.query.filter_by(is_active=True).count()
-    new_users_today = User.query.filter(
-        User.created_at >= datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    ).count()
-    
-    
-    total_appointments = Appointment.query.count()
-    today_appointments = Appointment.query.filter_by(
-        appointment_date=datetime.now().date()
-    ).count()
-    
-    
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(
-        status='completed'
-    ).scalar() or 0
-    
-    this_month_start = datetime.now().replace(day=1)
-    this_month_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= this_month_start
-    ).scalar() or 0
+    platform_stats = get_platform_stats()
     
     return jsonify({
-        'total_users': total_users,
-        'active_users': active_users,
-        'new_users_today': new_users_today,
-        'total_appointments': total_appointments,
-        'today_appointments': today_appointments,
-        'total_revenue': float(total_revenue),
-        'this_month_revenue': float(this_month_revenue)
+        'total_users': platform_stats['total_users'],
+        'active_users': platform_stats['active_users'],
+        'new_users_today': platform_stats['new_users_today'],
+        'total_appointments': platform_stats['total_appointments'],
+        'today_appointments': platform_stats['today_appointments'],
+        'total_revenue': platform_stats['gross_revenue'],
+        'this_month_revenue': platform_stats['gross_revenue_this_month']
     })
 
 from sqlalchemy import text
@@ -633,71 +475,10 @@ def get_file_storage_usage_percent():
 @admin_required
 def system_reports():
     
+    user_registration_labels, user_registration_data = get_cached_daily_series('signups', cast=int)
+    revenue_labels, revenue_data = get_cached_daily_series('revenue')
 
-    from sqlalchemy import text
-
-    
-    user_growth = db.session.query(
-        func.date(User.created_at).label('date'),
-        func.count(User.id).label('count')
-    ).group_by(func.date(User.created_at)).order_by('date').all()
-
-    user_registration_labels = [
-        datetime.strptime(row.date, '%Y-%m-%d').strftime('%b %d') if isinstance(row.date, str) else row.date.strftime('%b %d')
-        for row in user_growth
-    ]
-    user_registration_data = [row.count for row in user_growth]
-
-    
-    revenue_growth = db.session.query(
-        func.date(Payment.payment_date).label('date'),
-        func.sum(Payment.amount).label('revenue')
-    ).filter_by(status='completed').group_by(func.date(Payment.payment_date)).order_by('date').all()
-
-    revenue_labels = [
-        datetime.strptime(row.date, '%Y-%m-%d').strftime('%b %d') if isinstance(row.date, str) else row.date.strftime('%b %d')
-        for row in revenue_growth
-    ]
-    revenue_data = [float(row.revenue) for row in revenue_growth]
-
-    
-    total_users = User.query.count()
-    new_users_this_month = User.query.filter(User.created_at >= datetime.now().replace(day=1)).count()
-
-    total_appointments = Appointment.query.count()
-    completed_appointments = Appointment.query.filter_by(status='completed').count()
-
-    total_revenue = db.session.query(func.sum(Payment.amount)).filter_by(status='completed').scalar() or 0
-    monthly_revenue = db.session.query(func.sum(Payment.amount)).filter(
-        Payment.status == 'completed',
-        Payment.payment_date >= datetime.now().replace(day=1)
-    ).scalar() or 0
-
-    active_subscriptions = db.session.query(Payment.user_id).filter_by(
-        status='completed',
-        payment_type='subscription'
-    ).distinct().count()
-    subscription_conversion = round((active_subscriptions / total_users) * 100, 2) if total_users else 0
-
-    
-    pending_appointments = Appointment.query.filter_by(status='pending').count()
-    confirmed_appointments = Appointment.query.filter_by(status='confirmed').count()
-    cancelled_appointments = Appointment.query.filter_by(status='cancelled').count()
-
-    
-    doctor_count = User.query.filter_by(role='doctor').count()
-    patient_count = User.query.filter_by(role='patient').count()
-    admin_count = User.query.filter_by(role='admin').count()
-
-    
-    top_doctors = db.session.query(
-        User.id,
-        User.name,
-        User.specialization,
-        func.count(Appointment.id).label('appointment_count')
-    ).join(Appointment, User.id == Appointment.doctor_id
-    ).group_by(User.id, User.name, User.specialization
-    ).order_by(text('appointment_count desc')).limit(10).all()
+    platform_stats = get_platform_stats()
 
     
     database_health = 100
@@ -705,66 +486,25 @@ def system_reports():
     email_delivery_rate = 100
     api_uptime = 100
 
-    
-    from collections import namedtuple
-
-    Activity = namedtuple('Activity', ['timestamp', 'user', 'action_type', 'description'])
-
-    recent_activities = []
-
-    
-    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
-    for user in recent_users:
-        recent_activities.append(Activity(
-            timestamp=user.created_at,
-            user=user,
-            action_type='register',
-            description=f"{user.name} ({user.role}) registered."
-        ))
-
-    
-    recent_payments = Payment.query.filter_by(status='completed').order_by(Payment.payment_date.desc()).limit(5).all()
-    for payment in recent_payments:
-        recent_activities.append(Activity(
-            timestamp=payment.payment_date,
-            user=payment.user,
-            action_type='payment',
-            description=f"{payment.user.name} paid {payment.amount} for {payment.payment_type}."
-        ))
-
-    
-    recent_appts = Appointment.query.order_by(Appointment.created_at.desc()).limit(5).all()
-    for appt in recent_appts:
-        recent_activities.append(Activity(
-            timestamp=appt.created_at,
-            user=appt.patient,
-            action_type='appointment',
-            description=f"{appt.patient.name} booked with Dr. {appt.doctor.name} ({appt.status})."
-        ))
-
-    
-    recent_activities.sort(key=lambda x: x.timestamp, reverse=True)
-
-    
-    recent_activities = recent_activities[:10]
+    recent_activities = get_recent_activities()
 
     return render_template('admin/reports.html',
-        total_users=total_users,
-        new_users_this_month=new_users_this_month,
-        total_appointments=total_appointments,
-        completed_appointments=completed_appointments,
-        total_revenue=round(total_revenue, 2),
-        monthly_revenue=round(monthly_revenue, 2),
-        active_subscriptions=active_subscriptions,
-        subscription_conversion=subscription_conversion,
-
-        doctor_count=doctor_count,
-        patient_count=patient_count,
-        admin_count=admin_count,
-
-        pending_appointments=pending_appointments,
-        confirmed_appointments=confirmed_appointments,
-        cancelled_appointments=cancelled_appointments,
+        total_users=platform_stats['total_users'],
+        new_users_this_month=platform_stats['this_month_users'],
+        total_appointments=platform_stats['total_appointments'],
+        completed_appointments=platform_stats['completed_appointments'],
+        total_revenue=round(platform_stats['gross_revenue'], 2),
+        monthly_revenue=round(platform_stats['gross_revenue_this_month'], 2),
+        active_subscriptions=platform_stats['active_subscriptions'],
+        subscription_conversion=platform_stats['subscription_conversion_rate'],
+
+        doctor_count=platform_stats['total_doctors'],
+        patient_count=platform_stats['total_patients'],
+        admin_count=platform_stats['admins_count'],
+
+        pending_appointments=platform_stats['pending_appointments'],
+        confirmed_appointments=platform_stats['confirmed_appointments'],
+        cancelled_appointments=platform_stats['cancelled_appointments'],
 
         user_registration_labels=user_registration_labels,
         user_registration_data=user_registration_data,
@@ -772,7 +512,7 @@ def system_reports():
         revenue_labels=revenue_labels,
         revenue_data=revenue_data,
 
-        top_doctors=top_doctors,
+        top_doctors=platform_stats['top_doctors'],
         recent_activities=recent_activities,
 
         database_health=database_health,
@@ -841,4 +581,6 @@ def system_settings():
     form.smtp_port.data = settings['smtp_port']
     form.email_notifications.data = settings['email_notifications']
 
-    return render_template('admin/system_settings.html', form=form, settings=settings,db_size=get_database_size(), total_users=User.query.count(), total_appointments=Appointment.query.count())
+    platform_stats = get_platform_stats()
+
+    return render_template('admin/system_settings.html', form=form, settings=settings,db_size=get_database_size(), total_users=platform_stats['total_users'], total_appointments=platform_stats['total_appointments'], cache_stats=stats_cache.stats(), gemini_stats=gemini_client.stats())
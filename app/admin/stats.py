@@ -0,0 +1,193 @@
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import func, case, select, distinct, inspect
+from app import db
+from app.models import User, Appointment, Payment, MedicalFile, Message
+from app.utils.cache import stats_cache
+from app.utils.metrics import get_daily_series
+from app.utils.transactions import register_transaction_hooks
+
+PLATFORM_FEE = 2.99
+TAX_AMOUNT = 1.50
+TOTAL_PLATFORM_EARNING_PER_CONSULTATION = PLATFORM_FEE + TAX_AMOUNT
+
+Activity = namedtuple('Activity', ['timestamp', 'user', 'action_type', 'description'])
+
+PLATFORM_STATS_KEY = 'admin:platform_stats'
+DAILY_SERIES_KEY = 'admin:daily_series:{}'
+
+# attributes that feed the cached aggregates; edits to anything else (last_login, notes, ...) keep the cache
+WATCHED_ATTRIBUTES = {
+    User: ('role', 'is_active', 'created_at'),
+    Appointment: ('status', 'appointment_date'),
+    Payment: ('status', 'amount', 'payment_type', 'payment_date', 'user_id'),
+}
+
+INVALIDATED_KEYS = {
+    User: (PLATFORM_STATS_KEY, DAILY_SERIES_KEY.format('signups')),
+    Appointment: (PLATFORM_STATS_KEY,),
+    Payment: (PLATFORM_STATS_KEY, DAILY_SERIES_KEY.format('revenue')),
+}
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _sum_if(condition, column):
+    return func.coalesce(func.sum(case((condition, column), else_=0)), 0)
+
+
+def compute_platform_stats():
+    now = datetime.now()
+    today = now.date()
+    today_start = datetime.combine(today, datetime.min.time())
+    month_start = today_start.replace(day=1)
+
+    user_agg = select(
+        func.count(User.id).label('total_users'),
+        _count_if(User.role == 'patient').label('total_patients'),
+        _count_if(User.role == 'doctor').label('total_doctors'),
+        _count_if(User.role == 'admin').label('admins_count'),
+        _count_if(User.is_active.is_(True)).label('active_users'),
+        _count_if(User.created_at >= month_start).label('this_month_users'),
+        _count_if(User.created_at >= today_start).label('new_users_today'),
+    ).subquery()
+
+    appointment_agg = select(
+        func.count(Appointment.id).label('total_appointments'),
+        _count_if(Appointment.appointment_date == today).label('today_appointments'),
+        _count_if(Appointment.status == 'pending').label('pending_appointments'),
+        _count_if(Appointment.status == 'confirmed').label('confirmed_appointments'),
+        _count_if(Appointment.status == 'completed').label('completed_appointments'),
+        _count_if(Appointment.status == 'cancelled').label('cancelled_appointments'),
+    ).subquery()
+
+    completed = Payment.status == 'completed'
+    consultation = completed & (Payment.payment_type == 'consultation')
+    subscription = completed & (Payment.payment_type == 'subscription')
+    this_month = Payment.payment_date >= month_start
+
+    payment_agg = select(
+        _count_if(completed).label('total_payments'),
+        _sum_if(completed, Payment.amount).label('gross_revenue'),
+        _sum_if(completed & this_month, Payment.amount).label('gross_revenue_this_month'),
+        _count_if(consultation).label('consultation_count'),
+        _count_if(consultation & this_month).label('consultation_count_this_month'),
+        _sum_if(subscription, Payment.amount).label('subscription_revenue'),
+        _sum_if(subscription & this_month, Payment.amount).label('subscription_revenue_this_month'),
+        func.count(distinct(case((subscription, Payment.user_id)))).label('active_subscriptions'),
+    ).subquery()
+
+    row = db.session.execute(select(
+        user_agg,
+        appointment_agg,
+        payment_agg,
+        select(func.count(MedicalFile.id)).scalar_subquery().label('total_files'),
+        select(func.count(Message.id)).scalar_subquery().label('total_messages'),
+    )).one()
+
+    stats = dict(row._mapping)
+
+    consultation_revenue = stats['consultation_count'] * TOTAL_PLATFORM_EARNING_PER_CONSULTATION
+    consultation_revenue_this_month = stats['consultation_count_this_month'] * TOTAL_PLATFORM_EARNING_PER_CONSULTATION
+
+    stats['gross_revenue'] = float(stats['gross_revenue'])
+    stats['gross_revenue_this_month'] = float(stats['gross_revenue_this_month'])
+    stats['platform_revenue'] = round(consultation_revenue + float(stats['subscription_revenue']), 2)
+    stats['platform_revenue_this_month'] = round(consultation_revenue_this_month + float(stats['subscription_revenue_this_month']), 2)
+    stats['subscription_conversion_rate'] = round((stats['active_subscriptions'] / stats['total_users']) * 100, 2) if stats['total_users'] else 0
+    stats['top_doctors'] = [dict(row._mapping) for row in get_top_doctors()]
+
+    return stats
+
+
+def get_platform_stats():
+    return stats_cache.get_or_set(PLATFORM_STATS_KEY, compute_platform_stats)
+
+
+def get_cached_daily_series(metric, cast=float):
+    return stats_cache.get_or_set(DAILY_SERIES_KEY.format(metric), lambda: get_daily_series(metric, cast=cast))
+
+
+def _stale_keys(obj, is_new):
+    model = type(obj)
+    if model not in INVALIDATED_KEYS:
+        return ()
+    if not is_new:
+        attrs = inspect(obj).attrs
+        if not any(attrs[attr].history.has_changes() for attr in WATCHED_ATTRIBUTES[model]):
+            return ()
+    return INVALIDATED_KEYS[model]
+
+
+def _collect_stale_keys(session, flush_context):
+    stale = session.info.setdefault('stale_stats_keys', set())
+    for obj in session.new:
+        stale.update(_stale_keys(obj, True))
+    for obj in session.dirty:
+        stale.update(_stale_keys(obj, False))
+    for obj in session.deleted:
+        stale.update(_stale_keys(obj, True))
+
+
+def _invalidate_after_commit(session):
+    stale = session.info.pop('stale_stats_keys', None)
+    if stale:
+        stats_cache.invalidate(*stale)
+
+
+def _discard_after_rollback(session):
+    session.info.pop('stale_stats_keys', None)
+
+
+def register_stats_invalidation():
+    register_transaction_hooks(_collect_stale_keys, _invalidate_after_commit, _discard_after_rollback)
+
+
+def get_top_doctors(limit=10):
+    appointment_count = func.count(Appointment.id).label('appointment_count')
+    return db.session.query(
+        User.id,
+        User.name,
+        User.specialization,
+        appointment_count
+    ).join(Appointment, Appointment.doctor_id == User.id
+    ).filter(User.role == 'doctor'
+    ).group_by(User.id, User.name, User.specialization
+    ).order_by(appointment_count.desc()
+    ).limit(limit).all()
+
+
+def get_recent_activities(limit=10):
+    recent_activities = []
+
+    recent_users = User.query.order_by(User.created_at.desc()).limit(5).all()
+    for user in recent_users:
+        recent_activities.append(Activity(
+            timestamp=user.created_at,
+            user=user,
+            action_type='register',
+            description=f"{user.name} ({user.role}) registered."
+        ))
+
+    recent_payments = Payment.query.filter_by(status='completed').order_by(Payment.payment_date.desc()).limit(5).all()
+    for payment in recent_payments:
+        recent_activities.append(Activity(
+            timestamp=payment.payment_date,
+            user=payment.user,
+            action_type='payment',
+            description=f"{payment.user.name} paid {payment.amount} for {payment.payment_type}."
+        ))
+
+    recent_appts = Appointment.query.order_by(Appointment.created_at.desc()).limit(5).all()
+    for appt in recent_appts:
+        recent_activities.append(Activity(
+            timestamp=appt.created_at,
+            user=appt.patient,
+            action_type='appointment',
+            description=f"{appt.patient.name} booked with Dr. {appt.doctor.name} ({appt.status})."
+        ))
+
+    recent_activities.sort(key=lambda x: x.timestamp, reverse=True)
+    return recent_activities[:limit]
@@ -8,8 +8,9 @@ from flask_login import current_user, login_required
 
 from app import db
 from app.ai_assistant import bp
+from app.appointments.reservations import reserve_slot, SlotUnavailableError
 from app.models import Appointment, ChatbotMessage, DoctorReferral, MedicalFile, User
-from app.utils.gemini_client import GeminiClient
+from app.utils.gemini_client import gemini_client
 from app.utils.helpers import create_notification
 
 SESSION_MEMORY: Dict[str, List[Dict[str, Any]]] = {}
@@ -283,8 +284,12 @@ def _handle_book_appointment(args: Dict[str, Any]) -> Dict[str, Any]:
         reason=args.get("reason"),
         status="pending"
     )
-    db.session.add(appointment)
-    db.session.commit()
+    try:
+        reserve_slot(appointment)
+        db.session.commit()
+    except SlotUnavailableError as exc:
+        db.session.rollback()
+        return {"ok": False, "retryable": True, "message": exc.message}
 
     create_notification(patient_id, "Appointment Created", f"Your appointment request with Dr. {doctor.name} is pending.", "appointment")
     create_notification(doctor.id, "New Appointment", f"New appointment request from user {patient_id}.", "appointment")
@@ -308,7 +313,12 @@ def _handle_reschedule_appointment(args: Dict[str, Any]) -> Dict[str, Any]:
     if args.get("notes"):
         appointment.notes = (appointment.notes or "") + f"\nReschedule note: {args['notes']}"
     appointment.status = "pending"
-    db.session.commit()
+    try:
+        reserve_slot(appointment)
+        db.session.commit()
+    except SlotUnavailableError as exc:
+        db.session.rollback()
+        return {"ok": False, "retryable": True, "message": exc.message}
     create_notification(appointment.patient_id, "Appointment Rescheduled", "We updated your appointment timing.", "appointment")
     create_notification(appointment.doctor_id, "Appointment Rescheduled", "Patient updated appointment timing.", "appointment")
     return {"ok": True, "appointment": appointment.to_dict()}
@@ -533,11 +543,10 @@ def assistant():
     memory = SESSION_MEMORY.get(session_id, [])
     conversation = (memory + incoming_messages)[-MEMORY_LIMIT:]
 
-    try:
-        client = GeminiClient()
-    except RuntimeError as exc:
-        current_app.logger.error(exc)
+    if not gemini_client.configured:
+        current_app.logger.error('GEMINI_API_KEY is required to call Gemini')
         return jsonify({'error': 'GEMINI_API_KEY is missing. Set it in the environment.'}), 500
+    client = gemini_client
 
     translation = client.detect_and_translate(user_text, target_language='en')
     detected_language = translation.get('language') or 'en'
@@ -8,7 +8,7 @@ from flask_login import current_user, login_required
 from app import db
 from app.ai_automation import bp
 from app.models import AutomationMessage
-from app.utils.gemini_client import GeminiClient
+from app.utils.gemini_client import gemini_client
 from app.ai_assistant.routes import _tool_schemas, _dispatch_tool, _extract_tool_calls
 
 SESSION_MEMORY: Dict[str, List[Dict[str, Any]]] = {}
@@ -79,10 +79,9 @@ def assistant():
     memory = SESSION_MEMORY.get(session_id, [])
     conversation = (memory + incoming_messages)[-MEMORY_LIMIT:]
 
-    try:
-        client = GeminiClient()
-    except RuntimeError as exc:
-        return jsonify({'error': str(exc)}), 500
+    if not gemini_client.configured:
+        return jsonify({'error': 'GEMINI_API_KEY is required to call Gemini'}), 500
+    client = gemini_client
 
     # Keep prompt lean: translate if needed but avoid large preambles.
     translation = client.detect_and_translate(user_text, target_language='en')
@@ -0,0 +1,81 @@
+from flask import current_app
+from sqlalchemy import func, inspect
+from app import db
+from app.models import User
+from app.utils.cache import stats_cache
+from app.utils.transactions import register_transaction_hooks
+
+DOCTOR_FACETS_KEY = 'appointments:doctor_facets'
+
+# doctor attributes the facets are built from; other profile edits keep the cache
+WATCHED_ATTRIBUTES = ('role', 'is_active', 'specialization', 'consultation_fee')
+
+
+def _fee(value):
+    return float(value) if value is not None else None
+
+
+def compute_doctor_facets():
+    """Active doctors per specialization with their fee range, in one grouped query."""
+    rows = db.session.query(
+        User.specialization,
+        func.count(User.id),
+        func.min(User.consultation_fee),
+        func.max(User.consultation_fee)
+    ).filter(
+        User.role == 'doctor',
+        User.is_active == True,
+        User.specialization.isnot(None),
+        User.specialization != ''
+    ).group_by(User.specialization).order_by(User.specialization).all()
+
+    specializations = [
+        {'name': name, 'doctors': doctors, 'min_fee': _fee(min_fee), 'max_fee': _fee(max_fee)}
+        for name, doctors, min_fee, max_fee in rows
+    ]
+    fees = [fee for facet in specializations for fee in (facet['min_fee'], facet['max_fee']) if fee is not None]
+    return {
+        'specializations': specializations,
+        'total_doctors': sum(facet['doctors'] for facet in specializations),
+        'fee_range': {'min': min(fees), 'max': max(fees)} if fees else None
+    }
+
+
+def get_doctor_facets():
+    return stats_cache.get_or_set(
+        DOCTOR_FACETS_KEY, compute_doctor_facets, ttl=current_app.config.get('DOCTOR_FACETS_TTL')
+    )
+
+
+def _affects_facets(obj, is_new):
+    if not isinstance(obj, User):
+        return False
+    if is_new:
+        return obj.role == 'doctor'
+    attrs = inspect(obj).attrs
+    # role changes count both ways: a doctor leaving the role drops out of the counts
+    if attrs.role.history.has_changes():
+        return True
+    return obj.role == 'doctor' and any(attrs[attr].history.has_changes() for attr in WATCHED_ATTRIBUTES)
+
+
+def _collect_facet_changes(session, flush_context):
+    if session.info.get('doctor_facets_stale'):
+        return
+    if (any(_affects_facets(obj, True) for obj in session.new)
+            or any(_affects_facets(obj, False) for obj in session.dirty)
+            or any(_affects_facets(obj, True) for obj in session.deleted)):
+        session.info['doctor_facets_stale'] = True
+
+
+def _invalidate_after_commit(session):
+    if session.info.pop('doctor_facets_stale', False):
+        stats_cache.invalidate(DOCTOR_FACETS_KEY)
+
+
+def _discard_after_rollback(session):
+    session.info.pop('doctor_facets_stale', None)
+
+
+def register_facet_invalidation():
+    register_transaction_hooks(_collect_facet_changes, _invalidate_after_commit, _discard_after_rollback)
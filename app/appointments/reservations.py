@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Appointment
+
+# statuses that occupy a slot; mirrors the partial index uq_appointment_active_slot
+ACTIVE_STATUSES = ('pending', 'confirmed')
+SLOT_INDEX = 'uq_appointment_active_slot'
+
+
+class SlotUnavailableError(Exception):
+    """The slot was taken by another booking; the caller can retry with a different slot."""
+    retryable = True
+
+    def __init__(self, message='This time slot has just been booked. Please choose another time.'):
+        super().__init__(message)
+        self.message = message
+
+
+def _is_slot_conflict(exc):
+    detail = str(exc.orig)
+    # PostgreSQL names the index, SQLite lists the indexed columns
+    return SLOT_INDEX in detail or 'appointment.doctor_id, appointment.appointment_date, appointment.appointment_time' in detail
+
+
+def hold_deadline(now=None):
+    return (now or datetime.utcnow()) + timedelta(minutes=current_app.config.get('APPOINTMENT_HOLD_MINUTES', 15))
+
+
+def release_expired_holds(now=None, keep=None):
+    """Expire unpaid checkouts whose hold ran out so their slots can be booked again.
+
+    ``keep`` is an appointment the caller is about to write; its row is left
+    alone because the bulk update would not reach the loaded object, which
+    would then be saved as a pending booking on an expired row.
+    """
+    query = Appointment.query.filter(
+        Appointment.status == 'pending',
+        Appointment.hold_expires_at.isnot(None),
+        Appointment.hold_expires_at <= (now or datetime.utcnow())
+    )
+    if keep is not None and keep.id is not None:
+        query = query.filter(Appointment.id != keep.id)
+    # no autoflush: a rescheduled appointment must only be flushed inside reserve_slot's savepoint
+    with db.session.no_autoflush:
+        return query.update({'status': 'expired', 'hold_expires_at': None}, synchronize_session=False)
+
+
+def reserve_slot(appointment, hold=False):
+    """Write a new or moved appointment into its slot.
+
+    The unique index decides races: the loser's savepoint is rolled back and
+    SlotUnavailableError is raised, leaving the rest of the transaction usable.
+    With ``hold`` the slot is only kept until APPOINTMENT_HOLD_MINUTES pass
+    without payment.
+    """
+    now = datetime.utcnow()
+    # a reschedule whose own hold ran out renews it below instead of expiring it
+    release_expired_holds(now, keep=appointment)
+    appointment.hold_expires_at = hold_deadline(now) if hold else None
+
+    try:
+        with db.session.begin_nested():
+            db.session.add(appointment)
+    except IntegrityError as exc:
+        if not _is_slot_conflict(exc):
+            raise
+        raise SlotUnavailableError() from exc
+    return appointment
+
+
+def renew_hold(appointment):
+    if appointment.status == 'pending' and appointment.hold_expires_at:
+        appointment.hold_expires_at = hold_deadline()
+
+
+def confirm_reservation(appointment):
+    appointment.status = 'confirmed'
+    appointment.hold_expires_at = None
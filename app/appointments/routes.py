@@ -1,25 +1,40 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from app import db
+from sqlalchemy import case
 from app.appointments import bp
 from app.appointments.forms import BookAppointmentForm, RescheduleAppointmentForm, SearchDoctorsForm
 from app.models import User, Appointment, Payment
 from app.utils.decorators import patient_required, doctor_required
 from app.utils.helpers import get_available_time_slots, create_notification
+from app.appointments.reservations import reserve_slot, SlotUnavailableError
+from app.appointments.search import doctor_search
+from app.appointments.facets import get_doctor_facets
+from app.appointments.slots import build_calendars, next_available, encode_calendar, earliest_slot, free_slot_count
 from app.utils.email import send_appointment_confirmation
 import stripe
 from flask import current_app
 from datetime import datetime, timedelta, time, date
 
-def generate_time_slots(start_time, end_time, interval_minutes=30):
-    slots = []
-    current = datetime.combine(datetime.today(), start_time)
-    end = datetime.combine(datetime.today(), end_time)
+def doctor_search_query(args):
+    doctors_query = User.query.filter_by(role='doctor', is_active=True)
+    
+    if args.get('specialization'):
+        doctors_query = doctors_query.filter(User.specialization == args.get('specialization'))
+
+    if args.get('search'):
+        ranked_ids = doctor_search.search(args.get('search'))
+        doctors_query = doctors_query.filter(User.id.in_(ranked_ids))
+        if ranked_ids:
+            doctors_query = doctors_query.order_by(case(
+                {doctor_id: position for position, doctor_id in enumerate(ranked_ids)}, value=User.id
+            ))
 
-    while current <= end:
-        slots.append(current.strftime('%H:%M'))
-        current += timedelta(minutes=interval_minutes)
-    return slots
+    max_fee = args.get('max_fee', type=float)
+    if max_fee is not None:
+        doctors_query = doctors_query.filter(User.consultation_fee <= max_fee)
+
+    return doctors_query
 
 @bp.route('/book')
 @login_required
@@ -29,21 +44,11 @@ def book_appointment():
     search_form = SearchDoctorsForm()
     
     
-    specializations = db.session.query(User.specialization).filter_by(role='doctor').distinct().all()
-    search_form.specialization.choices += [(spec[0], spec[0]) for spec in specializations if spec[0]]
-    
+    facets = get_doctor_facets()
+    search_form.specialization.choices += [(facet['name'], facet['name']) for facet in facets['specializations']]
     
-    doctors_query = User.query.filter_by(role='doctor', is_active=True)
     
-    if request.args.get('specialization'):
-        doctors_query = doctors_query.filter(User.specialization == request.args.get('specialization'))
-
-    if request.args.get('search'):
-        search_term = request.args.get('search')
-        doctors_query = doctors_query.filter(
-            (User.name.ilike(f"%{search_term}%")) |
-            (User.specialization.ilike(f"%{search_term}%"))
-        )
+    doctors_query = doctor_search_query(request.args)
 
     page = request.args.get('page', 1, type=int)
     per_page = 6  
@@ -54,7 +59,9 @@ def book_appointment():
     return render_template('appointments/book_appointment.html', 
                          doctors=doctors, 
                          search_form=search_form, 
-                         booking_form=booking_form)
+                         booking_form=booking_form,
+                         specializations=facets['specializations'],
+                         fee_range=facets['fee_range'])
 
 @bp.route('/book/<int:doctor_id>', methods=['GET', 'POST'])
 @login_required
@@ -67,18 +74,6 @@ def book_appointment_with_doctor(doctor_id):
     
     if form.validate_on_submit():
         
-        existing_appointment = Appointment.query.filter_by(
-            doctor_id=doctor_id,
-            appointment_date=form.appointment_date.data,
-            appointment_time=datetime.strptime(form.appointment_time.data, '%H:%M').time(),
-            status='confirmed'
-        ).first()
-        
-        if existing_appointment:
-            flash('This time slot is no longer available. Please choose another time.', 'warning')
-            return redirect(url_for('appointments.book_appointment_with_doctor', doctor_id=doctor_id))
-        
-        
         from sqlalchemy import extract
 
         now = datetime.utcnow()
@@ -133,12 +128,19 @@ def book_appointment_with_doctor(doctor_id):
             status='pending'  
         )
         
-        db.session.add(appointment)
-        db.session.commit()
+        pays_online = form.appointment_type.data == 'teleconsultation' or payment_method == 'online'
+        needs_checkout = bool(pays_online and doctor.consultation_fee and doctor.consultation_fee > 0)
+        try:
+            reserve_slot(appointment, hold=needs_checkout)
+            db.session.commit()
+        except SlotUnavailableError as exc:
+            db.session.rollback()
+            flash(exc.message, 'warning')
+            return redirect(url_for('appointments.book_appointment_with_doctor', doctor_id=doctor_id))
         
         
-        if form.appointment_type.data == 'teleconsultation' or payment_method == 'online':
-            if doctor.consultation_fee and doctor.consultation_fee > 0:
+        if pays_online:
+            if needs_checkout:
                 return redirect(url_for('payments.checkout_appointment', appointment_id=appointment.id))
             else:
                 appointment.status = 'confirmed'
@@ -190,6 +192,77 @@ def get_available_times(doctor_id, date):
     except Exception as e:
         return jsonify({'error': str(e)})
 
+@bp.route('/api/earliest_slots')
+@login_required
+def search_earliest_slots():
+    
+    start = request.args.get('start')
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else date.today()
+    except ValueError:
+        return jsonify({'error': 'start must be formatted as YYYY-MM-DD'}), 400
+    start_date = max(start_date, date.today())
+    days = min(max(request.args.get('days', 14, type=int), 1), 60)
+    end_date = start_date + timedelta(days=days - 1)
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+
+    doctors = doctor_search_query(request.args).all()
+
+    # one Appointment query covers every candidate over the whole window
+    calendars = build_calendars(doctors, start_date, end_date)
+
+    ranked = []
+    for doctor in doctors:
+        calendar = calendars[doctor.id]
+        starts_at = earliest_slot(calendar)
+        if starts_at:
+            ranked.append((starts_at, doctor, free_slot_count(calendar)))
+    ranked.sort(key=lambda item: (item[0], item[1].consultation_fee or 0, item[1].name))
+
+    return jsonify({
+        'start': start_date.strftime('%Y-%m-%d'),
+        'end': end_date.strftime('%Y-%m-%d'),
+        'doctors': [{
+            'id': doctor.id,
+            'name': doctor.name,
+            'specialization': doctor.specialization,
+            'clinic_hospital': doctor.clinic_hospital,
+            'consultation_fee': doctor.consultation_fee,
+            'working_hours_start': doctor.working_hours_start.strftime('%H:%M'),
+            'working_hours_end': doctor.working_hours_end.strftime('%H:%M'),
+            'earliest_date': starts_at.strftime('%Y-%m-%d'),
+            'earliest_time': starts_at.strftime('%H:%M'),
+            'earliest_label': starts_at.strftime('%a %d %b, %I:%M %p'),
+            'free_slots': free_slots
+        } for starts_at, doctor, free_slots in ranked[:limit]]
+    })
+
+@bp.route('/api/availability/<int:doctor_id>')
+@login_required
+def get_doctor_availability(doctor_id):
+    
+    doctor = User.query.filter_by(id=doctor_id, role='doctor').first_or_404()
+
+    start = request.args.get('start')
+    try:
+        start_date = datetime.strptime(start, '%Y-%m-%d').date() if start else date.today()
+    except ValueError:
+        return jsonify({'error': 'start must be formatted as YYYY-MM-DD'}), 400
+    days = min(max(request.args.get('days', 14, type=int), 1), 60)
+
+    calendar = build_calendars([doctor], start_date, start_date + timedelta(days=days - 1))[doctor.id]
+    data = encode_calendar(calendar)
+
+    upcoming = next_available([doctor])
+    data['next_available'] = upcoming[0][1].strftime('%Y-%m-%d %H:%M') if upcoming else None
+    return jsonify(data)
+
+@bp.route('/api/specializations')
+@login_required
+def get_specialization_facets():
+    
+    return jsonify(get_doctor_facets())
+
 @bp.route('/my_appointments')
 @login_required
 def my_appointments():
@@ -417,7 +490,7 @@ def reschedule_appointment(appointment_id):
         flash('You do not have permission to reschedule this appointment.', 'danger')
         return redirect(url_for('appointments.my_appointments'))
     
-    if appointment.status in ['completed', 'cancelled']:
+    if appointment.status in ['completed', 'cancelled', 'expired']:
         flash('This appointment cannot be rescheduled.', 'warning')
         return redirect(url_for('appointments.view_appointment', appointment_id=appointment_id))
     
@@ -426,20 +499,17 @@ def reschedule_appointment(appointment_id):
     if form.validate_on_submit():
         
         new_time = datetime.strptime(form.appointment_time.data, '%H:%M').time()
-        existing_appointment = Appointment.query.filter_by(
-            doctor_id=appointment.doctor_id,
-            appointment_date=form.appointment_date.data,
-            appointment_time=new_time,
-            status='confirmed'
-        ).filter(Appointment.id != appointment_id).first()
-        
-        if existing_appointment:
+        appointment.appointment_date = form.appointment_date.data
+        appointment.appointment_time = new_time
+        appointment.reason = form.reason.data
+        appointment.updated_at = datetime.utcnow()
+
+        try:
+            reserve_slot(appointment, hold=appointment.hold_expires_at is not None)
+        except SlotUnavailableError:
+            db.session.rollback()
             flash('This time slot is not available. Please choose another time.', 'warning')
         else:
-            appointment.appointment_date = form.appointment_date.data
-            appointment.appointment_time = new_time
-            appointment.reason = form.reason.data
-            appointment.updated_at = datetime.utcnow()
             
             
             other_user_id = appointment.doctor_id if current_user.role == 'patient' else appointment.patient_id
@@ -0,0 +1,221 @@
+import re
+import sqlite3
+import threading
+import time
+from sqlalchemy import inspect, text
+from app import db
+from app.models import User
+from app.utils.transactions import register_transaction_hooks
+
+FTS_TABLE = 'doctor_search_fts'
+INDEXED_FIELDS = ('name', 'specialization', 'clinic_hospital')
+WATCHED_ATTRIBUTES = INDEXED_FIELDS + ('role',)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def _tokens(value):
+    return _TOKEN.findall((value or '').lower())
+
+
+def trigrams(value):
+    grams = set()
+    for token in _tokens(value):
+        padded = f'  {token} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _sqlite_has_fts5():
+    try:
+        connection = sqlite3.connect(':memory:')
+        connection.execute('CREATE VIRTUAL TABLE probe USING fts5(body)')
+        connection.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+class TrigramIndex:
+    """In-process inverted index of name/specialization/clinic trigrams.
+
+    Scores are the share of the query's trigrams a doctor contains, so partial
+    words and small typos still match. Other workers' edits show up after
+    ``max_age`` seconds when the index is rebuilt from the database.
+    """
+
+    def __init__(self, max_age=300, min_score=0.5):
+        self.max_age = max_age
+        self.min_score = min_score
+        self._postings = {}
+        self._documents = {}
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    def _add(self, doctor_id, grams):
+        self._documents[doctor_id] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(doctor_id)
+
+    def _remove(self, doctor_id):
+        for gram in self._documents.pop(doctor_id, ()):
+            ids = self._postings.get(gram)
+            if ids:
+                ids.discard(doctor_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def rebuild(self, rows):
+        with self._lock:
+            self._postings, self._documents = {}, {}
+            for row in rows:
+                self._add(row.id, trigrams(' '.join(getattr(row, field) or '' for field in INDEXED_FIELDS)))
+            self._built_at = time.monotonic()
+
+    def stale(self):
+        return self._built_at is None or time.monotonic() - self._built_at > self.max_age
+
+    def update(self, doctor_id, values):
+        with self._lock:
+            self._remove(doctor_id)
+            if values is not None:
+                self._add(doctor_id, trigrams(' '.join(values.get(field) or '' for field in INDEXED_FIELDS)))
+
+    def __len__(self):
+        return len(self._documents)
+
+    def search(self, term, limit):
+        query = trigrams(term)
+        if not query:
+            return []
+        scores = {}
+        with self._lock:
+            for gram in query:
+                for doctor_id in self._postings.get(gram, ()):
+                    scores[doctor_id] = scores.get(doctor_id, 0) + 1
+        ranked = sorted(
+            ((count / len(query), doctor_id) for doctor_id, count in scores.items() if count / len(query) >= self.min_score),
+            key=lambda item: (-item[0], item[1])
+        )
+        return [doctor_id for _, doctor_id in ranked[:limit]]
+
+
+class DoctorSearchIndex:
+    def __init__(self):
+        self.fallback = TrigramIndex()
+        self._fts_ready = False
+        self._fts_supported = None
+
+    def uses_fts(self):
+        if self._fts_supported is None:
+            self._fts_supported = db.engine.dialect.name == 'sqlite' and _sqlite_has_fts5()
+        return self._fts_supported
+
+    def ensure_index(self):
+        """Create and fill the FTS table; called once at startup next to db.create_all()."""
+        if not self.uses_fts():
+            return
+        with db.engine.begin() as connection:
+            connection.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                "name, specialization, clinic_hospital, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+            ))
+            if connection.execute(text(f'SELECT COUNT(*) FROM {FTS_TABLE}')).scalar() == 0:
+                self._fill_fts(connection)
+        self._fts_ready = True
+
+    def _fill_fts(self, connection):
+        connection.execute(text(f'DELETE FROM {FTS_TABLE}'))
+        connection.execute(text(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, specialization, clinic_hospital) '
+            "SELECT id, COALESCE(name, ''), COALESCE(specialization, ''), COALESCE(clinic_hospital, '') "
+            "FROM user WHERE role = 'doctor'"
+        ))
+
+    def _doctor_rows(self):
+        return db.session.query(User.id, User.name, User.specialization, User.clinic_hospital).filter(
+            User.role == 'doctor'
+        ).all()
+
+    def rebuild(self):
+        if self._fts_ready:
+            self._fill_fts(db.session.connection())
+        self.fallback.rebuild(self._doctor_rows())
+        db.session.commit()
+        return len(self.fallback)
+
+    def _fts_search(self, term, limit):
+        tokens = _tokens(term)
+        if not tokens:
+            return []
+        connection = db.session.connection()
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # bm25 weights: name matches outrank specialization, which outranks clinic
+        rows = connection.execute(text(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match '
+            f'ORDER BY bm25({FTS_TABLE}, 10.0, 5.0, 1.0) LIMIT :limit'
+        ), {'match': match, 'limit': limit}).fetchall()
+        return [row[0] for row in rows]
+
+    def search(self, term, limit=500):
+        """Doctor ids matching ``term``, best match first."""
+        if self._fts_ready:
+            ids = self._fts_search(term, limit)
+            if ids:
+                return ids
+        # no exact or prefix hit (or no FTS5): fall back to fuzzy trigram matching
+        if self.fallback.stale():
+            self.fallback.rebuild(self._doctor_rows())
+        return self.fallback.search(term, limit)
+
+    def apply(self, connection, changes):
+        if self._fts_ready:
+            for doctor_id, values in changes:
+                connection.execute(text(f'DELETE FROM {FTS_TABLE} WHERE rowid = :id'), {'id': doctor_id})
+                if values is not None:
+                    connection.execute(text(
+                        f'INSERT INTO {FTS_TABLE} (rowid, name, specialization, clinic_hospital) '
+                        'VALUES (:id, :name, :specialization, :clinic_hospital)'
+                    ), {'id': doctor_id, **{field: values.get(field) or '' for field in INDEXED_FIELDS}})
+
+
+doctor_search = DoctorSearchIndex()
+
+
+def _changed_doctors(session):
+    for obj in session.new:
+        if isinstance(obj, User) and obj.role == 'doctor':
+            yield obj.id, {field: getattr(obj, field) for field in INDEXED_FIELDS}
+    for obj in session.dirty:
+        if not isinstance(obj, User):
+            continue
+        attrs = inspect(obj).attrs
+        if not any(attrs[attr].history.has_changes() for attr in WATCHED_ATTRIBUTES):
+            continue
+        values = {field: getattr(obj, field) for field in INDEXED_FIELDS} if obj.role == 'doctor' else None
+        yield obj.id, values
+    for obj in session.deleted:
+        if isinstance(obj, User) and obj.role == 'doctor':
+            yield obj.id, None
+
+
+def _sync_after_flush(session, flush_context):
+    changes = list(_changed_doctors(session))
+    if not changes:
+        return
+    # FTS rows are written in the same transaction, the in-process index after commit
+    doctor_search.apply(session.connection(), changes)
+    session.info.setdefault('doctor_search_changes', []).extend(changes)
+
+
+def _sync_after_commit(session):
+    for doctor_id, values in session.info.pop('doctor_search_changes', ()):
+        doctor_search.fallback.update(doctor_id, values)
+
+
+def _discard_after_rollback(session):
+    session.info.pop('doctor_search_changes', None)
+
+
+def register_search_sync():
+    register_transaction_hooks(_sync_after_flush, _sync_after_commit, _discard_after_rollback)
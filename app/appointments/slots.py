@@ -0,0 +1,191 @@
+from collections import namedtuple
+from datetime import datetime, time, timedelta
+from app import db
+from app.models import Appointment
+from app.appointments.reservations import ACTIVE_STATUSES
+
+SLOT_MINUTES = 30
+MINUTES_PER_DAY = 24 * 60
+
+WORKING_DAY_PRESETS = {
+    'mon-fri': frozenset(range(5)),
+    'mon-sat': frozenset(range(6)),
+    'all-days': frozenset(range(7)),
+}
+WEEKDAY_NAMES = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+DoctorCalendar = namedtuple('DoctorCalendar', ['doctor_id', 'start_time', 'slot_count', 'days'])
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def working_weekdays(doctor):
+    value = (doctor.working_days or '').strip().lower()
+    if value in WORKING_DAY_PRESETS:
+        return WORKING_DAY_PRESETS[value]
+    names = [part.strip()[:3] for part in value.split(',') if part.strip()]
+    weekdays = frozenset(i for i, name in enumerate(WEEKDAY_NAMES) if name[:3] in names)
+    # unknown or missing values keep the old behaviour of booking any day
+    return weekdays or WORKING_DAY_PRESETS['all-days']
+
+
+def slot_count(doctor):
+    if not doctor.working_hours_start or not doctor.working_hours_end:
+        return 0
+    start = _minutes(doctor.working_hours_start)
+    end = _minutes(doctor.working_hours_end)
+    if end <= start:
+        end += MINUTES_PER_DAY
+    return (end - start) // SLOT_MINUTES
+
+
+def slot_time(start_time, index):
+    minutes = (_minutes(start_time) + index * SLOT_MINUTES) % MINUTES_PER_DAY
+    return time(minutes // 60, minutes % 60)
+
+
+def slot_times(calendar, bitmap):
+    times = []
+    index = 0
+    while bitmap:
+        if bitmap & 1:
+            times.append(slot_time(calendar.start_time, index))
+        bitmap >>= 1
+        index += 1
+    return times
+
+
+def _blocked_mask(start_time, count, booked_time):
+    # a booking occupies [t, t + SLOT_MINUTES) and clears every slot it overlaps
+    offset = (_minutes(booked_time) - _minutes(start_time)) % MINUTES_PER_DAY
+    first = max(offset - SLOT_MINUTES, -1) // SLOT_MINUTES + 1
+    last = min((offset + SLOT_MINUTES - 1) // SLOT_MINUTES, count - 1)
+    if first > last:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+
+def _elapsed_mask(start_time, count, day, now):
+    # slots that have already started today
+    if day != now.date():
+        return 0
+    elapsed = _minutes(now.time()) - _minutes(start_time)
+    if elapsed < 0:
+        return 0
+    started = min(elapsed // SLOT_MINUTES + 1, count)
+    return (1 << started) - 1
+
+
+def booked_times(doctor_ids, start_date, end_date):
+    rows = db.session.query(
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time
+    ).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date >= start_date,
+        Appointment.appointment_date <= end_date,
+        Appointment.status.in_(ACTIVE_STATUSES),
+        # lapsed checkout holds are released on the next reservation
+        db.or_(Appointment.hold_expires_at.is_(None), Appointment.hold_expires_at > datetime.utcnow())
+    ).all()
+
+    booked = {}
+    for doctor_id, day, booked_time in rows:
+        booked.setdefault((doctor_id, day), []).append(booked_time)
+    return booked
+
+
+def build_calendars(doctors, start_date, end_date, now=None):
+    """Bitmaps of free slots per doctor and day, with bit i meaning the slot at
+    working_hours_start + i * SLOT_MINUTES. All bookings come from one query.
+    """
+    now = now or datetime.now()
+    start_date = max(start_date, now.date())
+    calendars = {doctor.id: DoctorCalendar(doctor.id, doctor.working_hours_start, 0, {}) for doctor in doctors}
+    bookable = [doctor for doctor in doctors if slot_count(doctor)]
+    if not bookable or end_date < start_date:
+        return calendars
+
+    booked = booked_times([doctor.id for doctor in bookable], start_date, end_date)
+    span = (end_date - start_date).days + 1
+
+    for doctor in bookable:
+        count = slot_count(doctor)
+        full = (1 << count) - 1
+        weekdays = working_weekdays(doctor)
+        days = {}
+        for offset in range(span):
+            day = start_date + timedelta(days=offset)
+            if day.weekday() not in weekdays:
+                days[day] = 0
+                continue
+            bitmap = full & ~_elapsed_mask(doctor.working_hours_start, count, day, now)
+            for booked_time in booked.get((doctor.id, day), ()):
+                bitmap &= ~_blocked_mask(doctor.working_hours_start, count, booked_time)
+            days[day] = bitmap
+        calendars[doctor.id] = DoctorCalendar(doctor.id, doctor.working_hours_start, count, days)
+    return calendars
+
+
+def available_slots(doctor, day, now=None):
+    calendar = build_calendars([doctor], day, day, now=now).get(doctor.id)
+    if not calendar or not calendar.days.get(day):
+        return []
+    return slot_times(calendar, calendar.days[day])
+
+
+def is_slot_available(doctor, day, slot):
+    return slot in available_slots(doctor, day)
+
+
+def earliest_slot(calendar):
+    for day in sorted(calendar.days):
+        bitmap = calendar.days[day]
+        if bitmap:
+            index = (bitmap & -bitmap).bit_length() - 1
+            return datetime.combine(day, calendar.start_time) + timedelta(minutes=index * SLOT_MINUTES)
+    return None
+
+
+def free_slot_count(calendar):
+    return sum(bin(bitmap).count('1') for bitmap in calendar.days.values())
+
+
+def next_available(doctors, start_date=None, horizon_days=60, now=None):
+    """Earliest free slot for each doctor within the horizon, soonest first.
+
+    Searches in windows that double in size, so doctors with free slots this
+    week never pay for loading the whole horizon.
+    """
+    now = now or datetime.now()
+    start_date = max(start_date or now.date(), now.date())
+    last_date = start_date + timedelta(days=horizon_days - 1)
+
+    pending = {doctor.id: doctor for doctor in doctors if slot_count(doctor)}
+    found = []
+    window_start, window_days = start_date, 7
+    while pending and window_start <= last_date:
+        window_end = min(window_start + timedelta(days=window_days - 1), last_date)
+        calendars = build_calendars(pending.values(), window_start, window_end, now=now)
+        for doctor_id, calendar in calendars.items():
+            starts_at = earliest_slot(calendar)
+            if starts_at:
+                found.append((pending.pop(doctor_id), starts_at))
+        window_start = window_end + timedelta(days=1)
+        window_days *= 2
+
+    found.sort(key=lambda item: item[1])
+    return found
+
+
+def encode_calendar(calendar):
+    return {
+        'doctor_id': calendar.doctor_id,
+        'start_time': calendar.start_time.strftime('%H:%M') if calendar.start_time else None,
+        'slot_minutes': SLOT_MINUTES,
+        'slot_count': calendar.slot_count,
+        'days': {day.strftime('%Y-%m-%d'): format(bitmap, 'x') for day, bitmap in sorted(calendar.days.items())}
+    }
@@ -5,6 +5,12 @@ from app.chat import bp
 from app.models import User, Message, Appointment
 from app.utils.decorators import verified_required
 from app.utils.helpers import create_notification
+from app.utils.events import event_broker
+from app.utils.video_rooms import video_rooms
+from app.chat.utils import (get_contact_list, get_conversation, get_or_create_conversation, record_message,
+                            mark_conversation_read, reset_conversation, get_message_page, get_read_watermark,
+                            MESSAGE_FORMATS)
+from app.utils.serializers import rows_to_dicts
 from datetime import datetime
 from flask_wtf.csrf import generate_csrf
 from flask import make_response
@@ -14,54 +20,7 @@ from flask import make_response
 @verified_required
 def chat_index():
     
-    if current_user.role == 'patient':
-        doctor_ids = [id[0] for id in db.session.query(Appointment.doctor_id).filter(
-            Appointment.patient_id == current_user.id,
-            Appointment.status.in_(['pending', 'confirmed'])
-        ).distinct()]
-
-        contacts = User.query.filter(
-            User.id.in_(doctor_ids),
-            User.role == 'doctor'
-        ).all()
-        
-    elif current_user.role == 'doctor':
-        patient_ids = [id[0] for id in db.session.query(Appointment.patient_id).filter(
-            Appointment.doctor_id == current_user.id,
-            Appointment.status.in_(['pending', 'confirmed'])
-        ).distinct()]
-     
-        contacts = User.query.filter(
-            User.id.in_(patient_ids),
-            User.role == 'patient'
-        ).all()
-    
-    else:
-        contacts = []
-    
-    
-    contact_data = []
-    for contact in contacts:
-        unread_count = Message.query.filter_by(
-            sender_id=contact.id,
-            receiver_id=current_user.id,
-            is_read=False
-        ).count()
-        
-        
-        last_message = Message.query.filter(
-            ((Message.sender_id == current_user.id) & (Message.receiver_id == contact.id)) |
-            ((Message.sender_id == contact.id) & (Message.receiver_id == current_user.id))
-        ).order_by(Message.timestamp.desc()).first()
-        
-        contact_data.append({
-            'user': contact,
-            'unread_count': unread_count,
-            'last_message': last_message
-        })
-    
-    
-    contact_data.sort(key=lambda x: x['last_message'].timestamp if x['last_message'] else datetime.min, reverse=True)
+    contact_data = get_contact_list(current_user)
     
     return render_template('chat/chat.html', contacts=contact_data, selected_user=None)
 
@@ -91,10 +50,7 @@ def chat_with_user(user_id):
         return redirect(url_for('chat.chat_index'))
     
     
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == contact.id)) |
-        ((Message.sender_id == contact.id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.timestamp.asc()).all()
+    messages, has_more_messages = get_message_page(current_user.id, contact.id)
     
     
     unread_messages = Message.query.filter_by(
@@ -105,38 +61,17 @@ def chat_with_user(user_id):
     
     for message in unread_messages:
         message.is_read = True
+    mark_conversation_read(get_conversation(current_user, contact), current_user.id)
 
     
-    if current_user.role == 'patient':
-        ids = [id[0] for id in db.session.query(Appointment.doctor_id).filter(
-            Appointment.patient_id == current_user.id,
-            Appointment.status.in_(['pending', 'confirmed'])
-        ).distinct()]
-        contacts = User.query.filter(User.id.in_(ids), User.role == 'doctor').all()
-    elif current_user.role == 'doctor':
-        ids = [id[0] for id in db.session.query(Appointment.patient_id).filter(
-            Appointment.doctor_id == current_user.id,
-            Appointment.status.in_(['pending', 'confirmed'])
-        ).distinct()]
-        contacts = User.query.filter(User.id.in_(ids), User.role == 'patient').all()
-    else:
-        contacts = []
-
-    contact_data = []
-    for c in contacts:
-        unread = Message.query.filter_by(sender_id=c.id, receiver_id=current_user.id, is_read=False).count()
-        last = Message.query.filter(
-            ((Message.sender_id == current_user.id) & (Message.receiver_id == c.id)) |
-            ((Message.sender_id == c.id) & (Message.receiver_id == current_user.id))
-        ).order_by(Message.timestamp.desc()).first()
-        contact_data.append({'user': c, 'unread_count': unread, 'last_message': last})
-    contact_data.sort(key=lambda x: x['last_message'].timestamp if x['last_message'] else datetime.min, reverse=True)
+    contact_data = get_contact_list(current_user)
         
     db.session.commit()
     
     response = make_response(render_template(
         'chat/chat.html',
         messages=messages,
+        has_more_messages=has_more_messages,
         selected_user=contact,
         contacts=contact_data,
         current_user_id=current_user.id
@@ -185,6 +120,8 @@ def send_message():
     )
     
     db.session.add(message)
+    db.session.flush()
+    record_message(get_or_create_conversation(current_user, receiver), message)
     db.session.commit()
     
     
@@ -206,12 +143,49 @@ def send_message():
 @verified_required
 def get_messages(user_id):
     
-    messages = Message.query.filter(
-        ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
-        ((Message.sender_id == user_id) & (Message.receiver_id == current_user.id))
-    ).order_by(Message.timestamp.asc()).all()
-    
-    return jsonify([message.to_dict() for message in messages])
+    contact = User.query.get_or_404(user_id)
+
+    after_id = request.args.get('after_id', type=int)
+    before_id = request.args.get('before_id', type=int)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    since = request.args.get('since')
+    if since:
+        try:
+            since = datetime.strptime(since, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return jsonify({'error': 'since must be formatted as YYYY-MM-DD HH:MM:SS'}), 400
+    else:
+        since = None
+
+    
+    conversation = get_conversation(current_user, contact)
+    etag = None
+    if conversation:
+        other_unread = conversation.patient_unread_count if current_user.id == conversation.doctor_id else conversation.doctor_unread_count
+        etag = '-'.join(str(part) for part in (
+            current_user.id, user_id, conversation.last_message_id, other_unread,
+            after_id, before_id, request.args.get('since'), limit
+        ))
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+    messages, has_more = get_message_page(
+        current_user.id, user_id,
+        after_id=after_id, before_id=before_id, since=since, limit=limit, projected=True
+    )
+
+    response = jsonify({
+        'messages': rows_to_dicts(messages, MESSAGE_FORMATS),
+        'has_more': has_more,
+        'read_up_to': get_read_watermark(current_user.id, user_id)
+    })
+    if etag:
+        response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 @bp.route('/api/mark_read/<int:sender_id>', methods=['POST'])
 @login_required
@@ -225,6 +199,10 @@ def mark_messages_read(sender_id):
     
     for message in messages:
         message.is_read = True
+
+    sender = User.query.get(sender_id)
+    if sender:
+        mark_conversation_read(get_conversation(current_user, sender), current_user.id)
     
     db.session.commit()
     
@@ -234,7 +212,6 @@ def mark_messages_read(sender_id):
 
 from flask import jsonify, current_app
 from sqlalchemy import func
-active_video_rooms = {} 
 
 from sqlalchemy import func, or_
 
@@ -257,10 +234,7 @@ def start_video_call(patient_id):
 
     
     room_name = f"healthconnect_d{current_user.id}_p{patient_id}"
-    active_video_rooms[(current_user.id, patient_id)] = {
-        'room_name': room_name,
-        'started_at': datetime.utcnow()
-    }
+    video_rooms.open(current_user.id, patient_id, room_name)
     
     call_message = Message(
         sender_id=current_user.id,
@@ -268,6 +242,8 @@ def start_video_call(patient_id):
         content="📞 Doctor has started a video call."
     )
     db.session.add(call_message)
+    db.session.flush()
+    record_message(get_or_create_conversation(current_user, appointment.patient), call_message)
     db.session.commit()
 
     
@@ -278,6 +254,7 @@ def start_video_call(patient_id):
         'video_call',
         url_for('chat.chat_with_user', user_id=current_user.id)
     )
+    event_broker.publish(patient_id, 'video_call', {'doctor_id': current_user.id, 'room_name': room_name})
 
     return jsonify({'room_name': room_name})
 
@@ -299,18 +276,19 @@ def join_video_call(doctor_id):
     if not appointment:
         return jsonify({'error': 'No appointment found with this doctor'}), 403
 
-    room_data = active_video_rooms.get((doctor_id, current_user.id))
+    room = video_rooms.get(doctor_id, current_user.id)
 
-    if not room_data:
+    if not room:
         return jsonify({'error': 'Doctor has not started the call yet'}), 404
 
     
-    if datetime.utcnow() - room_data['started_at'] > timedelta(minutes=3):
+    if room.expires_at <= datetime.utcnow():
         
-        active_video_rooms.pop((doctor_id, current_user.id), None)
+        video_rooms.close(doctor_id, current_user.id)
+        db.session.commit()
         return jsonify({'error': 'Video call session has expired.'}), 410
 
-    return jsonify({'room_name': room_data['room_name']})
+    return jsonify({'room_name': room.room_name})
 
 @bp.route('/api/delete_conversation/<int:user_id>', methods=['DELETE'])
 @login_required
@@ -333,6 +311,9 @@ def delete_conversation(user_id):
     if not appointment:
         return jsonify({'error': 'No valid relationship found'}), 403
 
+    other_user = appointment.doctor if current_user.role == 'patient' else appointment.patient
+    reset_conversation(get_conversation(current_user, other_user))
+    db.session.flush()
     
     Message.query.filter(
         ((Message.sender_id == current_user.id) & (Message.receiver_id == user_id)) |
@@ -0,0 +1,196 @@
+from sqlalchemy import select, func, case, and_, or_, delete, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased, joinedload
+from app import db
+from app.models import User, Message, Appointment, Conversation
+
+
+def contact_ids_query(user):
+    if user.role == 'patient':
+        return select(Appointment.doctor_id).where(
+            Appointment.patient_id == user.id,
+            Appointment.status.in_(['pending', 'confirmed'])
+        ).distinct()
+    if user.role == 'doctor':
+        return select(Appointment.patient_id).where(
+            Appointment.doctor_id == user.id,
+            Appointment.status.in_(['pending', 'confirmed'])
+        ).distinct()
+    return None
+
+
+def conversation_key(user, other):
+    if user.role == 'doctor' and other.role == 'patient':
+        return user.id, other.id
+    if user.role == 'patient' and other.role == 'doctor':
+        return other.id, user.id
+    return None
+
+
+def get_conversation(user, other):
+    key = conversation_key(user, other)
+    if key is None:
+        return None
+    return Conversation.query.filter_by(doctor_id=key[0], patient_id=key[1]).first()
+
+
+def get_or_create_conversation(user, other):
+    key = conversation_key(user, other)
+    if key is None:
+        return None
+
+    conversation = Conversation.query.filter_by(doctor_id=key[0], patient_id=key[1]).first()
+    if conversation:
+        return conversation
+
+    try:
+        with db.session.begin_nested():
+            conversation = Conversation(doctor_id=key[0], patient_id=key[1])
+            db.session.add(conversation)
+    except IntegrityError:
+        conversation = Conversation.query.filter_by(doctor_id=key[0], patient_id=key[1]).one()
+    return conversation
+
+
+def record_message(conversation, message):
+    if conversation is None:
+        return
+    conversation.last_message = message
+    conversation.last_message_at = message.timestamp
+    if message.receiver_id == conversation.doctor_id:
+        conversation.doctor_unread_count = Conversation.doctor_unread_count + 1
+    else:
+        conversation.patient_unread_count = Conversation.patient_unread_count + 1
+
+
+def mark_conversation_read(conversation, reader_id):
+    if conversation is None:
+        return
+    if reader_id == conversation.doctor_id:
+        conversation.doctor_unread_count = 0
+    else:
+        conversation.patient_unread_count = 0
+
+
+def reset_conversation(conversation):
+    if conversation is None:
+        return
+    conversation.last_message_id = None
+    conversation.last_message_at = None
+    conversation.doctor_unread_count = 0
+    conversation.patient_unread_count = 0
+
+
+def conversation_filter(user_id, contact_id):
+    return or_(
+        and_(Message.sender_id == user_id, Message.receiver_id == contact_id),
+        and_(Message.sender_id == contact_id, Message.receiver_id == user_id)
+    )
+
+
+MESSAGE_FORMATS = {'timestamp': '%Y-%m-%d %H:%M:%S'}
+
+
+def message_rows():
+    # same keys as Message.to_dict, resolved with two joins instead of a lazy load per row
+    sender = aliased(User)
+    receiver = aliased(User)
+    return db.session.query(
+        Message.id,
+        Message.sender_id,
+        sender.name.label('sender_name'),
+        sender.role.label('sender_role'),
+        Message.receiver_id,
+        receiver.name.label('receiver_name'),
+        Message.content,
+        Message.timestamp,
+        Message.is_read
+    ).join(sender, sender.id == Message.sender_id
+    ).join(receiver, receiver.id == Message.receiver_id)
+
+
+def get_message_page(user_id, contact_id, after_id=None, before_id=None, since=None, limit=50, projected=False):
+    query = message_rows() if projected else Message.query
+    query = query.filter(conversation_filter(user_id, contact_id))
+
+    if after_id is not None or since is not None:
+        if after_id is not None:
+            query = query.filter(Message.id > after_id)
+        if since is not None:
+            query = query.filter(Message.timestamp > since)
+        messages = query.order_by(Message.id.asc()).limit(limit + 1).all()
+        has_more = len(messages) > limit
+        return messages[:limit], has_more
+
+    if before_id is not None:
+        query = query.filter(Message.id < before_id)
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    has_more = len(messages) > limit
+    return list(reversed(messages[:limit])), has_more
+
+
+def get_read_watermark(user_id, contact_id):
+    return db.session.query(func.max(Message.id)).filter(
+        Message.sender_id == user_id,
+        Message.receiver_id == contact_id,
+        Message.is_read.is_(True)
+    ).scalar()
+
+
+def get_contact_list(user):
+    contact_ids = contact_ids_query(user)
+    if contact_ids is None:
+        return []
+
+    if user.role == 'patient':
+        contact_role = 'doctor'
+        pair = and_(Conversation.doctor_id == User.id, Conversation.patient_id == user.id)
+        unread_column = 'patient_unread_count'
+    else:
+        contact_role = 'patient'
+        pair = and_(Conversation.patient_id == User.id, Conversation.doctor_id == user.id)
+        unread_column = 'doctor_unread_count'
+
+    rows = db.session.query(User, Conversation).outerjoin(
+        Conversation, pair
+    ).options(
+        joinedload(Conversation.last_message)
+    ).filter(
+        User.id.in_(contact_ids),
+        User.role == contact_role
+    ).order_by(
+        Conversation.last_message_at.desc().nulls_last(),
+        User.name.asc()
+    ).all()
+
+    return [{
+        'user': contact,
+        'unread_count': getattr(conversation, unread_column) if conversation else 0,
+        'last_message': conversation.last_message if conversation else None
+    } for contact, conversation in rows]
+
+
+def rebuild_conversations():
+    sender = aliased(User)
+    sent_by_doctor = sender.role == 'doctor'
+    doctor_id = case((sent_by_doctor, Message.sender_id), else_=Message.receiver_id)
+    patient_id = case((sent_by_doctor, Message.receiver_id), else_=Message.sender_id)
+    unread = Message.is_read.is_(False)
+
+    summaries = select(
+        doctor_id.label('doctor_id'),
+        patient_id.label('patient_id'),
+        func.max(Message.id).label('last_message_id'),
+        func.max(Message.timestamp).label('last_message_at'),
+        func.sum(case((and_(unread, Message.receiver_id == doctor_id), 1), else_=0)).label('doctor_unread_count'),
+        func.sum(case((and_(unread, Message.receiver_id == patient_id), 1), else_=0)).label('patient_unread_count'),
+        func.min(Message.timestamp).label('created_at')
+    ).join(sender, sender.id == Message.sender_id).group_by(doctor_id, patient_id)
+
+    columns = ['doctor_id', 'patient_id', 'last_message_id', 'last_message_at',
+               'doctor_unread_count', 'patient_unread_count', 'created_at']
+    db.session.execute(delete(Conversation.__table__))
+    db.session.execute(insert(Conversation.__table__).from_select(columns, summaries))
+    db.session.commit()
+
+    return Conversation.query.count()
@@ -9,6 +9,9 @@ from app.models import User, Appointment, MedicalFile, Payment, Message, Notific
 from sqlalchemy import func
 from app.utils.decorators import patient_required, doctor_required
 from app.utils.helpers import create_notification
+from app.uploads.pipeline import store_upload, patient_upload_quota, StorageQuotaExceeded
+from app.uploads.delivery import deliver_path, can_access_file
+from app.uploads.observations import patient_analytes, lab_series
 from datetime import datetime, timedelta
 from sqlalchemy import or_
 from werkzeug.utils import secure_filename
@@ -241,16 +244,37 @@ def view_patient_profile(patient_id):
                            patient=patient,
                            appointments=appointments,
                            medical_files=medical_files,
-                           treatments=treatments)
+                           treatments=treatments,
+                           lab_analytes=patient_analytes(patient.id))
 
-def get_patient_storage_used(patient_id):
-    
-    total_size = db.session.query(db.func.sum(MedicalFile.file_size)).filter_by(patient_id=patient_id).scalar() or 0
-    return total_size / (1024 * 1024)  
+def _lab_patient(patient_id):
+    patient = User.query.filter_by(unique_patient_id=patient_id, role='patient').first_or_404()
+    if current_user.role != 'doctor' and current_user.id != patient.id:
+        abort(403)
+    return patient
+
+@bp.route('/patient/profile/<string:patient_id>/labs')
+@login_required
+def lab_analytes(patient_id):
+    patient = _lab_patient(patient_id)
+    return jsonify({'analytes': patient_analytes(patient.id)})
+
+@bp.route('/patient/profile/<string:patient_id>/labs/<string:analyte_code>')
+@login_required
+def lab_trend(patient_id, analyte_code):
+    patient = _lab_patient(patient_id)
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1) if request.args.get('end') else None
+    except ValueError:
+        return jsonify({'error': 'Dates must be formatted as YYYY-MM-DD.'}), 400
+    points = min(max(request.args.get('points', 200, type=int), 10), 1000)
+    return jsonify(lab_series(patient.id, analyte_code, start=start, end=end, points=points))
 
 @bp.route('/patient/add_treatment/<string:patient_id>', methods=['GET', 'POST'])
 @login_required
 @doctor_required
+@patient_upload_quota(lambda patient_id: User.query.filter_by(unique_patient_id=patient_id, role='patient').first())
 def add_treatment(patient_id):
     patient = User.query.filter_by(unique_patient_id=patient_id, role='patient').first()
     if not patient:
@@ -293,36 +317,16 @@ def add_treatment(patient_id):
                         return redirect(url_for('dashboard.view_patient_profile', patient_id=patient.unique_patient_id))
 
                 
-                filename = secure_filename(file.filename)
-                folder = os.path.join(current_app.config['UPLOAD_FOLDER'], 'treatments')
-                os.makedirs(folder, exist_ok=True)
-                filepath = os.path.join(folder, filename)
-
-                file.seek(0, os.SEEK_END)
-                file_size = file.tell()
-                file.seek(0)
-
-                used_mb = get_patient_storage_used(patient.id)
-                file_size_mb = file_size / (1024 * 1024)
-
-                limits = {
-                    'free': 100,
-                    'basic': 1024,
-                    'premium': 10240,
-                    'enterprise': float('inf')
-                }
-                plan_key = subscription_tier.strip().lower()
-                if plan_key not in limits:
-                    plan_key = 'free'
-                allowed_mb = limits[plan_key]
-
-                if used_mb + file_size_mb > allowed_mb:
-                    flash(f'Storage limit exceeded. This patient\'s subscription allows up to {allowed_mb}MB of storage.', 'danger')
+                try:
+                    stored = store_upload(file, patient, 'treatments', reuse_records=False)
+                except StorageQuotaExceeded as exc:
+                    flash(exc.message, 'danger')
                     return redirect(url_for('dashboard.view_patient_profile', patient_id=patient.unique_patient_id))
 
                 
-                file.save(filepath)
+                filename = f'{patient.id}/{stored.filename}'
                 appointment.attached_file = filename
+                appointment.attached_file_name = secure_filename(file.filename)
 
             
             create_notification(
@@ -376,6 +380,26 @@ def treatment_history():
         flash('An error occurred while loading your treatment history. Please try again.', 'error')
         return redirect(url_for('dashboard.patient_dashboard'))
 
+@bp.route('/treatment/<int:appointment_id>/attachment')
+@login_required
+def treatment_attachment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    if not appointment.attached_file:
+        abort(404)
+    if not can_access_file(current_user, appointment):
+        abort(403)
+
+    # stored as <patient id>/<sha256><ext>; older records kept the uploaded name
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'treatments', appointment.attached_file)
+    try:
+        return deliver_path(
+            path,
+            as_attachment=True,
+            download_name=appointment.attached_file_name or os.path.basename(appointment.attached_file)
+        )
+    except FileNotFoundError:
+        abort(404)
+
 @bp.route('/profile/edit', methods=['GET', 'POST'])
 @login_required
 def edit_profile():
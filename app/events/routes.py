@@ -0,0 +1,34 @@
+import queue
+import time
+from flask import Response
+from flask_login import login_required, current_user
+from app.events import bp
+from app.utils.events import event_broker, format_sse
+
+
+@bp.route('/stream')
+@login_required
+def stream():
+    user_id = current_user.id
+    subscription = event_broker.subscribe(user_id)
+    keepalive = event_broker.keepalive
+    deadline = time.monotonic() + event_broker.max_duration
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            while time.monotonic() < deadline:
+                try:
+                    event_type, data = subscription.get(timeout=keepalive)
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_sse(event_type, data)
+        finally:
+            event_broker.unsubscribe(user_id, subscription)
+
+    # the connection is closed after EVENT_STREAM_MAX_DURATION and EventSource reconnects on its own
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
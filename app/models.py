@@ -34,6 +34,7 @@ class User(UserMixin, db.Model):
     emergency_contact = db.Column(db.String(100))
     unique_patient_id = db.Column(db.String(20), unique=True)
     referral_code = db.Column(db.String(20), unique=True)
+    storage_used_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')
     
     
     specialization = db.Column(db.String(100))
@@ -131,6 +132,15 @@ class User(UserMixin, db.Model):
         }
 
 class Appointment(db.Model):
+    __table_args__ = (
+        db.Index('ix_appointment_doctor_date_status', 'doctor_id', 'appointment_date', 'status'),
+        db.Index('ix_appointment_patient_status_date', 'patient_id', 'status', 'appointment_date'),
+        # one active booking per slot; keep the status list in sync with appointments.reservations.ACTIVE_STATUSES
+        db.Index('uq_appointment_active_slot', 'doctor_id', 'appointment_date', 'appointment_time', unique=True,
+                 sqlite_where=db.text("status IN ('pending', 'confirmed')"),
+                 postgresql_where=db.text("status IN ('pending', 'confirmed')")),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -140,6 +150,7 @@ class Appointment(db.Model):
     status = db.Column(db.String(20), default='pending')  
     notes = db.Column(db.Text)
     payment_method = db.Column(db.String(20), nullable=True)
+    hold_expires_at = db.Column(db.DateTime)  # set while an online checkout is unpaid
     prescription = db.Column(db.Text)
     diagnosis = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -147,6 +158,7 @@ class Appointment(db.Model):
     reason = db.Column(db.Text)
     treatment_type = db.Column(db.String(50))
     attached_file = db.Column(db.String(200))
+    attached_file_name = db.Column(db.String(200))  # name the file was uploaded under
     
     payment = db.relationship('Payment', backref='appointment', uselist=False)
     
@@ -166,18 +178,27 @@ class Appointment(db.Model):
         }
 
 class MedicalFile(db.Model):
+    __table_args__ = (
+        db.Index('ix_medical_file_patient_upload_date', 'patient_id', 'upload_date'),
+        db.Index('ix_medical_file_doctor_upload_date', 'doctor_id', 'upload_date'),
+        db.Index('ix_medical_file_patient_sha256', 'patient_id', 'sha256'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(200), nullable=False)
     original_filename = db.Column(db.String(200), nullable=False)
     filepath = db.Column(db.String(300), nullable=False)
     file_type = db.Column(db.String(50), nullable=False)
     file_size = db.Column(db.Integer)
+    sha256 = db.Column(db.String(64))
     ai_analysis = db.Column(db.Text)
     report_type = db.Column(db.String(100))  
     description = db.Column(db.Text)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
     patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    lab_results = db.relationship('LabResult', backref='medical_file', lazy='dynamic', cascade='all, delete-orphan')
+    lab_observations = db.relationship('LabObservation', backref='medical_file', lazy='dynamic', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f'<MedicalFile {self.filename}>'
@@ -193,7 +214,84 @@ class MedicalFile(db.Model):
             'file_size': self.file_size
         }
 
+class LabResult(db.Model):
+    __table_args__ = (
+        db.Index('ix_lab_result_patient_test', 'patient_id', 'test_name'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    medical_file_id = db.Column(db.Integer, db.ForeignKey('medical_file.id', ondelete='CASCADE'), nullable=False, index=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    test_name = db.Column(db.String(120), nullable=False)
+    value = db.Column(db.Float)
+    value_text = db.Column(db.String(50), nullable=False)  # as printed, e.g. '7,800' or '<0.5'
+    unit = db.Column(db.String(30))
+    reference_range = db.Column(db.String(60))
+    page = db.Column(db.Integer)  # zero-based page of the PDF the row was read from
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<LabResult {self.test_name} {self.value_text} {self.unit or ""}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_id': self.medical_file_id,
+            'test': self.test_name,
+            'value': self.value,
+            'value_text': self.value_text,
+            'unit': self.unit,
+            'reference_range': self.reference_range,
+            'page': self.page
+        }
+
+class LabObservation(db.Model):
+    __table_args__ = (
+        db.Index('ix_lab_observation_patient_analyte_observed', 'patient_id', 'analyte_code', 'observed_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    medical_file_id = db.Column(db.Integer, db.ForeignKey('medical_file.id', ondelete='CASCADE'), nullable=False, index=True)
+    analyte_code = db.Column(db.String(40), nullable=False)  # e.g. 'hemoglobin', 'hba1c'
+    test_name = db.Column(db.String(120), nullable=False)  # as printed on the report
+    value = db.Column(db.Float, nullable=False)
+    unit = db.Column(db.String(30))
+    observed_at = db.Column(db.DateTime, nullable=False)  # sample collection date, else the upload date
+
+    def __repr__(self):
+        return f'<LabObservation {self.analyte_code} {self.value} {self.unit or ""}>'
+
+class AnalysisCacheEntry(db.Model):
+    __tablename__ = 'analysis_cache'
+    __table_args__ = (
+        db.UniqueConstraint('sha256', 'report_type', 'prompt_version', 'model_name', 'pages', 'context_hash', name='uq_analysis_cache_key'),
+        db.Index('ix_analysis_cache_last_used_at', 'last_used_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+    report_type = db.Column(db.String(100), nullable=False, default='')
+    prompt_version = db.Column(db.Integer, nullable=False)
+    model_name = db.Column(db.String(50), nullable=False)
+    pages = db.Column(db.String(100), nullable=False, default='')  # page range analyzed, '' for the whole file
+    context_hash = db.Column(db.String(64), nullable=False, default='')  # sha256 of the per-file prompt (description, doctor)
+    analysis = db.Column(db.Text, nullable=False)
+    lab_rows = db.Column(db.Text)  # JSON list of rows read from the text layer
+    size_bytes = db.Column(db.Integer, nullable=False, default=0)
+    hits = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<AnalysisCacheEntry {self.sha256[:12]} v{self.prompt_version} {self.model_name}>'
+
 class Message(db.Model):
+    __table_args__ = (
+        db.Index('ix_message_sender_receiver_read', 'sender_id', 'receiver_id', 'is_read'),
+        db.Index('ix_message_receiver_read_timestamp', 'receiver_id', 'is_read', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     receiver_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -218,6 +316,44 @@ class Message(db.Model):
         }
 
 
+class Conversation(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'patient_id', name='uq_conversation_doctor_patient'),
+        db.Index('ix_conversation_doctor_last_message_at', 'doctor_id', 'last_message_at'),
+        db.Index('ix_conversation_patient_last_message_at', 'patient_id', 'last_message_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_message_id = db.Column(db.Integer, db.ForeignKey('message.id', ondelete='SET NULL'))
+    last_message_at = db.Column(db.DateTime)
+    doctor_unread_count = db.Column(db.Integer, nullable=False, default=0)
+    patient_unread_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    last_message = db.relationship('Message', foreign_keys=[last_message_id])
+
+    def __repr__(self):
+        return f'<Conversation {self.id}: doctor {self.doctor_id} / patient {self.patient_id}>'
+
+
+class VideoRoom(db.Model):
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'patient_id', name='uq_video_room_doctor_patient'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    room_name = db.Column(db.String(100), nullable=False)
+    started_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<VideoRoom {self.room_name}>'
+
+
 class ChatbotMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -301,6 +437,10 @@ class PayoutRequest(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 class Notification(db.Model):
+    __table_args__ = (
+        db.Index('ix_notification_user_read_created', 'user_id', 'is_read', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -363,6 +503,57 @@ class DoctorReferral(db.Model):
             'referral_date': self.referral_date.strftime('%Y-%m-%d %H:%M')
         }
 
+class DailyMetric(db.Model):
+    __tablename__ = 'daily_metrics'
+    __table_args__ = (
+        db.UniqueConstraint('day', 'metric', 'dimension', name='uq_daily_metrics_day_metric_dimension'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    metric = db.Column(db.String(30), nullable=False)  # 'signups', 'revenue' or 'appointments'
+    dimension = db.Column(db.String(30), nullable=False)  # role, payment_type or status
+    value = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<DailyMetric {self.day} {self.metric}/{self.dimension}: {self.value}>'
+
+class Job(db.Model):
+    __table_args__ = (
+        db.Index('ix_job_status_run_after', 'status', 'run_after'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(100), index=True)  # e.g. 'report_analysis:42'; one active job per key
+    payload = db.Column(db.Text)  # JSON
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    requested_by_id = db.Column(db.Integer, db.ForeignKey('user.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_after': self.run_after.strftime('%Y-%m-%d %H:%M:%S') if self.run_after else None,
+            'error': self.last_error if self.status == 'failed' else None,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S') if self.created_at else None,
+            'finished_at': self.finished_at.strftime('%Y-%m-%d %H:%M:%S') if self.finished_at else None
+        }
+
 class Setting(db.Model):
     __tablename__ = 'settings'
     key = db.Column(db.String(100), primary_key=True)
@@ -6,6 +6,7 @@ from app.payments import bp
 from app.payments.forms import SubscriptionForm, CheckoutForm
 from app.models import User, Appointment, Payment, Referral
 from app.utils.decorators import patient_required
+from app.appointments.reservations import renew_hold, confirm_reservation
 from app.utils.helpers import create_notification
 from app.utils.email import send_payment_receipt, send_appointment_confirmation
 from datetime import datetime, timedelta
@@ -200,10 +201,17 @@ def checkout_appointment(appointment_id):
         flash('You do not have permission to pay for this appointment.', 'danger')
         return redirect(url_for('appointments.my_appointments'))
 
+    if appointment.status == 'expired':
+        flash('Your hold on this time slot expired before payment. Please book the appointment again.', 'warning')
+        return redirect(url_for('appointments.book_appointment_with_doctor', doctor_id=appointment.doctor_id))
+
     if appointment.status != 'pending':
         flash('This appointment has already been processed.', 'info')
         return redirect(url_for('appointments.view_appointment', appointment_id=appointment_id))
 
+    renew_hold(appointment)
+    db.session.commit()
+
     doctor = appointment.doctor
     consultation_fee = doctor.consultation_fee
 
@@ -251,6 +259,9 @@ def process_appointment_payment(appointment_id):
     if appointment.patient_id != current_user.id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    if appointment.status == 'expired':
+        return jsonify({'error': 'Your hold on this time slot expired. Please book again.', 'retryable': True}), 409
+
     if appointment.status != 'pending':
         return jsonify({'error': 'Appointment already processed'}), 400
     
@@ -288,7 +299,7 @@ def process_appointment_payment(appointment_id):
         
         if intent.status == 'succeeded':
             
-            appointment.status = 'confirmed'
+            confirm_reservation(appointment)
 
             if referral_discount_applied:
                 referrals = Referral.query.filter_by(referrer_id=current_user.id).order_by(Referral.date_referred).all()
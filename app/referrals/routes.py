@@ -1,5 +1,6 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 from app import db
 from app.referrals import bp
 from app.referrals.forms import DoctorReferralForm, ReferralResponseForm
@@ -14,16 +15,21 @@ from datetime import datetime
 @patient_required
 def patient_referrals():
     
-    referrals_made = Referral.query.filter_by(referrer_id=current_user.id).all()
+    referrals_made = Referral.query.options(
+        joinedload(Referral.referred_user)
+    ).filter_by(referrer_id=current_user.id).all()
     total_points = sum(ref.points_awarded for ref in referrals_made)
     
     
-    doctor_referrals = DoctorReferral.query.filter_by(patient_id=current_user.id).all()
+    doctor_referrals = DoctorReferral.query.options(
+        joinedload(DoctorReferral.from_doctor),
+        joinedload(DoctorReferral.to_doctor)
+    ).filter_by(patient_id=current_user.id).all()
 
     referral_points = total_points
     total_referrals = len(referrals_made)
     reward_value = referral_points * 0.1
-    referrals = Referral.query.filter_by(referrer_id=current_user.id).all()
+    referrals = referrals_made
     top_referrers = db.session.query(
         User.name,
         db.func.count(Referral.id).label('total_referrals')
@@ -95,13 +101,18 @@ def referral_history():
     
     if current_user.role == 'patient':
         
-        referrals = Referral.query.filter_by(
+        referrals = Referral.query.options(
+            joinedload(Referral.referred_user)
+        ).filter_by(
             referrer_id=current_user.id
         ).order_by(Referral.date_referred.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
 
-        doctor_referrals = DoctorReferral.query.filter_by(
+        doctor_referrals = DoctorReferral.query.options(
+            joinedload(DoctorReferral.from_doctor),
+            joinedload(DoctorReferral.to_doctor)
+        ).filter_by(
             patient_id=current_user.id
         ).order_by(DoctorReferral.referral_date.desc()).all()
 
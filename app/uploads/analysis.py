@@ -0,0 +1,331 @@
+import hashlib
+import json
+from collections import namedtuple
+from PIL import Image
+from flask import current_app
+from app import db
+from app.models import MedicalFile, LabResult
+from app.utils.helpers import create_notification
+from app.utils.jobs import job_handler, job_queue, PermanentJobError
+from app.uploads.pdf_pages import page_renderer, page_count, parse_page_range, pack_pages, PageRangeError, UnreadablePdf
+from app.uploads.extraction import extract_text_pages, parse_lab_rows, rows_markdown, LabRow
+from app.uploads.analysis_cache import analysis_cache, AnalysisKey
+from app.uploads.observations import record_observations, observation_rows
+
+ANALYZABLE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.pdf')
+REPORT_ANALYSIS_JOB = 'report_analysis'
+# bump whenever the prompt changes; cached analyses of other versions are discarded
+PROMPT_VERSION = 1
+
+# text layers go to the model as text; only scanned pages are rendered as images
+ReportContent = namedtuple('ReportContent', ['texts', 'images', 'total_pages'])
+
+
+def is_analyzable(filename):
+    return (filename or '').lower().endswith(ANALYZABLE_EXTENSIONS)
+
+
+def analysis_key(medical_file, model, page_spec=None):
+    """Cache key for analyzing ``medical_file`` with ``model``; None for files stored before hashing."""
+    if not medical_file.sha256:
+        return None
+    return AnalysisKey(
+        sha256=medical_file.sha256,
+        report_type=medical_file.report_type or '',
+        prompt_version=PROMPT_VERSION,
+        model_name=model.name,
+        pages=''.join((page_spec or '').split()),
+        # the prompt carries the file's description and doctor, which must not leak to other patients
+        context_hash=hashlib.sha256(report_prompt(medical_file).encode('utf-8')).hexdigest()
+    )
+
+
+def analysis_job_key(medical_file):
+    return f'{REPORT_ANALYSIS_JOB}:{medical_file.id}'
+
+
+def page_label(indexes):
+    runs = []
+    for number in (index + 1 for index in indexes):
+        if runs and number == runs[-1][1] + 1:
+            runs[-1][1] = number
+        else:
+            runs.append([number, number])
+    label = ', '.join(str(first) if first == last else f'{first}-{last}' for first, last in runs)
+    return f'Page {label}' if len(indexes) == 1 else f'Pages {label}'
+
+
+def build_prompt(medical_file, pages=None, total_pages=None, texts=None, rows=None):
+    prompt = report_prompt(medical_file)
+    if pages and total_pages and total_pages > 1:
+        prompt += (
+            f"\nYou are given {page_label(pages).lower()} of a {total_pages}-page PDF, in order. "
+            "Treat them as one document and analyze only what they show.\n"
+        )
+    if texts:
+        prompt += (
+            "\nThese pages have a text layer, which is given below instead of an image. "
+            "Any attached images are the remaining, scanned pages.\n"
+        )
+        for index, text in sorted(texts.items()):
+            prompt += f"\n### {page_label([index])}\n```\n{text}\n```\n"
+    if rows:
+        prompt += f"\nLab values read from the text layer:\n\n{rows_markdown(rows)}\n"
+    return prompt
+
+
+def report_prompt(medical_file):
+    return f"""
+You are an expert medical analyst trained in interpreting scanned medical documents — including blood tests, diagnostic scans (X-rays, MRIs, CTs), prescriptions, and handwritten notes. Your task is to extract and explain the findings clearly and professionally.
+
+Analyze the attached image in detail and generate a structured **Markdown-formatted** report. This must be clear enough for patients to understand but thorough enough for doctors to find clinical value.
+
+---
+
+
+- **Report Type:** {medical_file.report_type or 'N/A'}
+- **Description Provided:** {medical_file.description or 'N/A'}
+- **Uploaded by Doctor:** {medical_file.doctor.name if medical_file.doctor else 'Unknown'}
+
+---
+
+
+
+You MUST return your analysis in Markdown format.
+
+Organize the report with the following sections:
+
+---
+
+
+- Describe what this report is about (e.g. "Lipid Profile", "MRI of Lumbar Spine", "Prescription for Diabetes Management").
+- Mention the purpose, if evident (e.g. follow-up, diagnosis, routine checkup).
+
+---
+
+
+- Use **bullet points** for general insights.
+- If the report contains test results, display them in a **Markdown table**:
+
+Test	Value	Normal Range	Interpretation
+
+- Interpret each value. Highlight what's **low**, **high**, or **abnormal**.
+
+---
+
+
+- Clearly explain any abnormalities.
+- Mention whether they are **mild**, **moderate**, or **critical**.
+- If imaging (like X-ray/MRI), describe any visible findings or irregularities.
+- State if immediate attention or re-testing is needed.
+
+---
+
+
+- Convert the above medical findings into plain language.
+- Help the patient understand what it may mean for their health.
+- Avoid vague responses. Be specific, e.g. "Elevated liver enzymes could indicate stress on the liver."
+
+---
+
+
+- Personalized lifestyle or dietary suggestions (based on the findings).
+- Recommend relevant medical specialties if further evaluation is needed.
+- Mention if the patient should consult the uploading doctor urgently or routinely.
+
+---
+
+
+- List any required follow-up tests or repeat diagnostics (with timeframes).
+- Mention if tracking trends over time is important (e.g. sugar levels, cholesterol, etc.).
+
+---
+
+
+- Include clinically relevant insights that a physician may want to review.
+- You may use concise language and standard medical terms here.
+
+---
+
+
+- Based on this report, recommend any important health metrics the patient should track over time (e.g. blood pressure, glucose, BMI, cholesterol, vitamin levels, etc.).
+- Suggest tools or apps for regular monitoring if applicable.
+
+---
+
+
+- **Do NOT refuse to answer** even if data is partially unclear. Do your best.
+- **Always respond in Markdown**. Never use plain text or HTML.
+- If parts of the report are illegible, note it politely and explain what you could infer.
+
+This report may be part of a digital health assistant workflow. Make sure it's actionable and user-friendly.
+"""
+
+
+def load_report_content(medical_file, page_spec=None):
+    """Text layers and images to analyze for a report.
+
+    PDF pages are limited to ``page_spec`` (e.g. '1-3,5') and at most
+    PDF_ANALYSIS_MAX_PAGES pages. Pages with a text layer are read as text;
+    the rest are rendered in the page renderer's process pool.
+    """
+    if not medical_file.filename.lower().endswith('.pdf'):
+        return ReportContent({}, [(0, Image.open(medical_file.filepath))], 1)
+
+    total = page_count(medical_file.filepath)
+    if total == 0:
+        raise PermanentJobError('The PDF has no pages.')
+    pages = parse_page_range(page_spec, total)[:current_app.config.get('PDF_ANALYSIS_MAX_PAGES', 30)]
+    texts = extract_text_pages(medical_file.filepath, pages)
+    scanned = [index for index in pages if not texts[index]]
+    images = page_renderer.render(medical_file.filepath, scanned) if scanned else []
+    return ReportContent({index: text for index, text in texts.items() if text}, images, total)
+
+
+def store_lab_results(medical_file, rows, pages):
+    """Replace the lab rows previously read from ``pages`` of the file."""
+    medical_file.lab_results.filter(LabResult.page.in_(pages)).delete(synchronize_session=False)
+    for row in rows:
+        db.session.add(LabResult(
+            medical_file_id=medical_file.id,
+            patient_id=medical_file.patient_id,
+            test_name=row.test[:120],
+            value=row.value,
+            value_text=row.value_text[:50],
+            unit=(row.unit or '')[:30] or None,
+            reference_range=(row.reference_range or '')[:60] or None,
+            page=row.page
+        ))
+
+
+def save_analysis(medical_file, analysis, rows, text_pages):
+    """Write an analysis with its lab rows and observations.
+
+    Called only once the model has answered, so the job's transaction takes no
+    write lock while a model call that may last minutes is in flight.
+    """
+    if text_pages:
+        store_lab_results(medical_file, rows, text_pages)
+    medical_file.ai_analysis = analysis
+    record_observations(medical_file, observation_rows(medical_file))
+
+
+def merge_analyses(results):
+    """Join per-batch analyses under a heading for the pages each one covers."""
+    if len(results) == 1:
+        return results[0][1]
+    return '\n\n'.join(f'## {page_label(indexes)}\n\n{text.strip()}' for indexes, text in results)
+
+
+class GeminiAnalysisModel:
+    name = 'gemini-2.5-flash'
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def analyze(self, prompt, images):
+        from app.utils.gemini_client import gemini_client
+        if not gemini_client.configured:
+            # retrying cannot help until the key is set
+            raise PermanentJobError('GEMINI_API_KEY is required to analyze reports.')
+        model = gemini_client.build_model(model_name=self.name)
+        response = model.generate_content([prompt, *images], request_options={'timeout': self.timeout})
+        return response.text
+
+
+class StubAnalysisModel:
+    """Offline stand-in for development and tests; answers instantly with a fixed report."""
+
+    name = 'stub'
+
+    def analyze(self, prompt, images):
+        sizes = ', '.join(f'{image.width}x{image.height}' for image in images) or 'text only'
+        return (
+            '### Report Overview\n'
+            f'- Offline analysis of {len(images)} image(s): {sizes}; prompt of {len(prompt)} characters.\n\n'
+            '### Key Findings\n'
+            '| Test | Value | Normal Range | Interpretation |\n'
+            '|------|-------|--------------|----------------|\n'
+            '| Hemoglobin | 13.5 g/dL | 13.0 - 17.0 g/dL | Normal |\n'
+        )
+
+
+def analysis_model():
+    if current_app.config.get('AI_ANALYSIS_MODEL') == 'stub':
+        return StubAnalysisModel()
+    return GeminiAnalysisModel(current_app.config.get('AI_ANALYSIS_TIMEOUT', 120))
+
+
+def enqueue_report_analysis(medical_file, requested_by, links, pages=None):
+    """Queue analysis of ``medical_file``; ``links`` maps user ids to the page their notification opens
+    and ``pages`` optionally limits a PDF to a page range such as '1-3,5'."""
+    return job_queue.enqueue(
+        REPORT_ANALYSIS_JOB,
+        {
+            'file_id': medical_file.id,
+            'pages': pages,
+            'links': {str(user_id): link for user_id, link in links.items()}
+        },
+        key=analysis_job_key(medical_file),
+        requested_by=requested_by
+    )
+
+
+def analyze_report_content(medical_file, page_spec, model):
+    """Run the model over a report; returns ``(analysis, lab rows, text pages)``."""
+    try:
+        content = load_report_content(medical_file, page_spec)
+    except ModuleNotFoundError as exc:
+        raise PermanentJobError('PDF analysis requires pypdfium2. Please install it first.') from exc
+    except (PageRangeError, UnreadablePdf) as exc:
+        raise PermanentJobError(str(exc)) from exc
+    except FileNotFoundError as exc:
+        raise PermanentJobError('The file is missing from storage.') from exc
+
+    rows = parse_lab_rows(content.texts)
+    batches = pack_pages(
+        content.images,
+        current_app.config.get('AI_ANALYSIS_IMAGE_TOKENS', 60000),
+        current_app.config.get('AI_ANALYSIS_MAX_IMAGES_PER_CALL', 16)
+    ) or [[]]
+    results = []
+    for number, batch in enumerate(batches):
+        # the text layer travels with the first call only
+        texts = content.texts if number == 0 else {}
+        indexes = sorted(list(texts) + [index for index, image in batch])
+        prompt = build_prompt(medical_file, indexes, content.total_pages, texts, rows if texts else None)
+        results.append((indexes, model.analyze(prompt, [image for index, image in batch])))
+    return merge_analyses(results), rows, sorted(content.texts)
+
+
+@job_handler(REPORT_ANALYSIS_JOB)
+def run_report_analysis(payload):
+    medical_file = db.session.get(MedicalFile, payload['file_id'])
+    if medical_file is None:
+        raise PermanentJobError('The file was deleted before it could be analyzed.')
+
+    model = analysis_model()
+    key = analysis_key(medical_file, model, payload.get('pages'))
+    cached = analysis_cache.get(key) if key else None
+    if cached:
+        analysis = cached.analysis
+        rows = [LabRow(**row) for row in json.loads(cached.lab_rows or '[]')]
+        text_pages = sorted({row.page for row in rows})
+    else:
+        analysis, rows, text_pages = analyze_report_content(medical_file, payload.get('pages'), model)
+
+    if key:
+        analysis_cache.record(cached)
+        if not cached:
+            analysis_cache.put(key, analysis, rows)
+    save_analysis(medical_file, analysis, rows, text_pages)
+    db.session.commit()
+
+    for user_id, link in payload.get('links', {}).items():
+        create_notification(
+            int(user_id),
+            'AI Analysis Ready',
+            f'The AI analysis of {medical_file.original_filename} is ready.',
+            'analysis',
+            link
+        )
@@ -0,0 +1,126 @@
+import json
+from collections import namedtuple
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import AnalysisCacheEntry, DailyMetric
+from app.utils.metrics import record_metric
+
+CACHE_METRIC = 'analysis_cache'
+
+AnalysisKey = namedtuple('AnalysisKey', ['sha256', 'report_type', 'prompt_version', 'model_name', 'pages', 'context_hash'])
+
+
+class AnalysisCache:
+    """Finished analyses keyed by file content, report type, prompt version,
+    model, page range and a hash of the per-file prompt, so re-analyzing a file
+    or an identical upload with the same description and doctor costs neither
+    rendering nor a model call.
+
+    Entries are evicted least recently used first once there are more than
+    ``max_entries`` or they hold more than ``max_mb``. Entries written under
+    another prompt version are dropped whenever a new entry is stored.
+    """
+
+    def __init__(self, app=None):
+        self.max_entries = 5000
+        self.max_mb = 64
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('AI_ANALYSIS_CACHE_MAX_ENTRIES', 5000)
+        self.max_mb = app.config.get('AI_ANALYSIS_CACHE_MAX_MB', 64)
+        app.extensions['analysis_cache'] = self
+
+    @staticmethod
+    def _lookup(key):
+        return AnalysisCacheEntry.query.filter_by(**key._asdict())
+
+    def get(self, key):
+        """The cached entry for ``key`` or None.
+
+        Only reads: a miss is followed by a long model call, during which the
+        caller's transaction must not hold a write lock. Count the outcome with
+        ``record`` once the result is being saved.
+        """
+        return self._lookup(key).first()
+
+    def record(self, entry):
+        """Count a hit on ``entry``, or a miss when it is None, for today."""
+        record_metric(CACHE_METRIC, 'hit' if entry else 'miss')
+        if entry:
+            entry.hits += 1
+            entry.last_used_at = datetime.utcnow()
+
+    def put(self, key, analysis, lab_rows=()):
+        lab_rows = json.dumps([row._asdict() for row in lab_rows])
+        size = len(analysis.encode('utf-8')) + len(lab_rows)
+        try:
+            # a concurrent worker may store the same content first
+            with db.session.begin_nested():
+                entry = self._lookup(key).first() or AnalysisCacheEntry(**key._asdict())
+                entry.analysis = analysis
+                entry.lab_rows = lab_rows
+                entry.size_bytes = size
+                entry.last_used_at = datetime.utcnow()
+                db.session.add(entry)
+        except IntegrityError:
+            pass
+        self.evict(key.prompt_version)
+
+    def evict(self, prompt_version):
+        """Drop entries of other prompt versions, then the least recently used
+        ones beyond the limits; returns how many were removed."""
+        removed = AnalysisCacheEntry.query.filter(
+            AnalysisCacheEntry.prompt_version != prompt_version
+        ).delete(synchronize_session=False)
+
+        count, size = db.session.query(
+            func.count(AnalysisCacheEntry.id),
+            func.coalesce(func.sum(AnalysisCacheEntry.size_bytes), 0)
+        ).one()
+        excess_entries = count - self.max_entries
+        excess_bytes = size - self.max_mb * 1024 * 1024
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return removed
+
+        doomed = []
+        oldest = db.session.query(AnalysisCacheEntry.id, AnalysisCacheEntry.size_bytes).order_by(
+            AnalysisCacheEntry.last_used_at, AnalysisCacheEntry.id
+        )
+        for entry_id, entry_size in oldest.yield_per(500):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            doomed.append(entry_id)
+            excess_entries -= 1
+            excess_bytes -= entry_size
+        for start in range(0, len(doomed), 500):
+            AnalysisCacheEntry.query.filter(
+                AnalysisCacheEntry.id.in_(doomed[start:start + 500])
+            ).delete(synchronize_session=False)
+        return removed + len(doomed)
+
+    def stats(self, days=30):
+        since = datetime.utcnow().date() - timedelta(days=days - 1)
+        counts = dict(db.session.query(DailyMetric.dimension, func.sum(DailyMetric.value)).filter(
+            DailyMetric.metric == CACHE_METRIC,
+            DailyMetric.day >= since
+        ).group_by(DailyMetric.dimension).all())
+        hits, misses = int(counts.get('hit') or 0), int(counts.get('miss') or 0)
+        entries, size = db.session.query(
+            func.count(AnalysisCacheEntry.id),
+            func.coalesce(func.sum(AnalysisCacheEntry.size_bytes), 0)
+        ).one()
+        return {
+            'days': days,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+            'entries': entries,
+            'size_bytes': int(size)
+        }
+
+
+analysis_cache = AnalysisCache()
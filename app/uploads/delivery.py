@@ -0,0 +1,104 @@
+import mimetypes
+import os
+import time
+from urllib.parse import quote
+from flask import current_app, send_file, session
+from app.models import Appointment
+
+ACCESS_CACHE_KEY = 'file_access'
+
+
+def _has_care_relationship(doctor_id, patient_id):
+    return Appointment.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).first() is not None
+
+
+def can_access_file(user, medical_file):
+    """Patients see their own files; doctors see files they uploaded or belonging
+    to a patient they have an appointment with. ``medical_file`` may also be a
+    treatment Appointment, whose doctor uploaded its attachment.
+
+    Granted doctor/patient pairs are remembered in the session for
+    FILE_ACCESS_CACHE_TTL seconds, so browsing a patient's files costs one
+    appointment lookup. Denials are not cached so a new booking applies at once.
+    """
+    if user.role == 'patient':
+        return medical_file.patient_id == user.id
+    if user.role != 'doctor' or medical_file.doctor_id == user.id:
+        return True
+
+    now = time.time()
+    cache = session.get(ACCESS_CACHE_KEY)
+    if not cache or cache.get('user_id') != user.id:
+        cache = {'user_id': user.id, 'patients': {}}
+    patient_key = str(medical_file.patient_id)
+    if cache['patients'].get(patient_key, 0) > now:
+        return True
+    if not _has_care_relationship(user.id, medical_file.patient_id):
+        return False
+
+    ttl = current_app.config.get('FILE_ACCESS_CACHE_TTL', 300)
+    patients = {key: expires for key, expires in cache['patients'].items() if expires > now}
+    patients[patient_key] = now + ttl
+    # the session is a signed cookie; keep only the most recently granted patients
+    limit = current_app.config.get('FILE_ACCESS_CACHE_SIZE', 50)
+    if len(patients) > limit:
+        patients = dict(sorted(patients.items(), key=lambda item: item[1])[-limit:])
+    session[ACCESS_CACHE_KEY] = {'user_id': user.id, 'patients': patients}
+    return True
+
+
+def _offload_response(header, value, mimetype, as_attachment, download_name):
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers[header] = value
+    if as_attachment:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    response.cache_control.private = True
+    return response
+
+
+def deliver_path(path, mimetype=None, as_attachment=False, download_name=None, etag=True):
+    """Send a file from the upload folder, handing the transfer to the front-end server when configured.
+
+    FILE_DELIVERY selects the mode: 'x-accel' (nginx X-Accel-Redirect under
+    FILE_ACCEL_PREFIX), 'x-sendfile' (Apache/lighttpd) or 'direct', where the
+    worker streams the file itself with conditional and range request support.
+    Raises FileNotFoundError when the file is gone from disk.
+    """
+    path = os.path.abspath(path)
+    if not os.path.isfile(path):
+        raise FileNotFoundError(path)
+    download_name = download_name or os.path.basename(path)
+    mimetype = mimetype or mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+    mode = current_app.config.get('FILE_DELIVERY', 'direct')
+
+    if mode == 'x-accel':
+        relative = os.path.relpath(path, os.path.abspath(current_app.config['UPLOAD_FOLDER']))
+        location = current_app.config.get('FILE_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+        uri = f"{location}/{quote(relative.replace(os.sep, '/'))}"
+        return _offload_response('X-Accel-Redirect', uri, mimetype, as_attachment, download_name)
+    if mode == 'x-sendfile':
+        return _offload_response('X-Sendfile', path, mimetype, as_attachment, download_name)
+
+    response = send_file(
+        path,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=etag,
+        max_age=current_app.config.get('FILE_DELIVERY_MAX_AGE', 3600)
+    )
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
+
+
+def deliver_file(medical_file, as_attachment=False):
+    return deliver_path(
+        medical_file.filepath,
+        mimetype=medical_file.file_type,
+        as_attachment=as_attachment,
+        download_name=medical_file.original_filename,
+        # stored files are content-addressed, so the hash is a strong validator
+        etag=medical_file.sha256 or True
+    )
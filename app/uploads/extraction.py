@@ -0,0 +1,138 @@
+import re
+from collections import namedtuple
+from datetime import datetime
+
+# fewer characters than this and a page is treated as scanned
+MIN_TEXT_CHARS = 40
+MAX_ROW_LINES = 3
+
+LabRow = namedtuple('LabRow', ['test', 'value', 'value_text', 'unit', 'reference_range', 'page'])
+
+NUMBER = r'\d[\d,]*(?:\.\d+)?'
+ROW = re.compile(
+    r'^(?P<test>[A-Za-z].*?)\s+'
+    rf'(?P<value>[<>]?\s?{NUMBER})\s*'
+    r'(?P<unit>[^\s\d(][^\s(]*)?\s*'
+    r'(?:\(.*\)\s*)?'
+    rf'(?P<range>(?:[<>≤≥]\s*{NUMBER}|{NUMBER}\s*[–-]\s*{NUMBER})(?:\s*[^\s\d][^\s]*)?)\s*$'
+)
+TABLE_HEADER = re.compile(r'\b(reference|normal|biological ref)\w*\s*(range|interval|value)', re.IGNORECASE)
+BULLETS = ('•', '-', '*', '·')
+
+# most specific label first; a collection date beats the report date
+DATE_LABELS = (
+    r'(?:sample\s+)?collect(?:ion|ed)(?:\s+date|\s+on)?',
+    r'sample\s+date',
+    r'report(?:ed)?\s+(?:date|on)',
+    r'date',
+)
+DATE_FORMATS = ('%d %B %Y', '%d %b %Y', '%B %d %Y', '%b %d %Y', '%Y-%m-%d')
+DATE_VALUE = re.compile(
+    r'(\d{1,2}\s+[A-Za-z]{3,9},?\s+\d{4}|[A-Za-z]{3,9}\s+\d{1,2},?\s+\d{4}|\d{4}-\d{2}-\d{2}|\d{1,2}[/.-]\d{1,2}[/.-]\d{4})'
+)
+
+
+def extract_text_pages(filepath, pages=None):
+    """Text layer of each page as ``{index: text}``; scanned pages come back as ''."""
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        texts = {}
+        for index in (range(len(pdf)) if pages is None else pages):
+            textpage = pdf[index].get_textpage()
+            text = textpage.get_text_range().replace('\r\n', '\n').strip()
+            textpage.close()
+            texts[index] = text if len(text) >= MIN_TEXT_CHARS else ''
+        return texts
+    finally:
+        pdf.close()
+
+
+def _parse_date(text):
+    text = text.replace(',', '')
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    first, second, year = (int(part) for part in re.split(r'[/.-]', text))
+    # day first unless that cannot be right
+    day, month = (second, first) if second > 12 >= first else (first, second)
+    try:
+        return datetime(year, month, day)
+    except ValueError:
+        return None
+
+
+def report_date(texts):
+    """Sample collection (or report) date printed on the report, or None."""
+    text = '\n'.join(text for index, text in sorted(texts.items()))
+    for label in DATE_LABELS:
+        for match in re.finditer(rf'\b{label}\b[^:\n]*:\s*' + DATE_VALUE.pattern, text, re.IGNORECASE):
+            try:
+                value = _parse_date(match.group(1))
+            except ValueError:
+                value = None
+            if value:
+                return value
+    return None
+
+
+def _number(text):
+    try:
+        return float(text.lstrip('<> ').replace(',', ''))
+    except ValueError:
+        return None
+
+
+def _ends_table(line):
+    return line.startswith(BULLETS) or (line.endswith('.') and not re.search(r'\d', line))
+
+
+def parse_lab_rows(texts):
+    """Lab rows (test, value, unit, reference range) from the tables in ``texts``.
+
+    Rows are read after a header that mentions a reference or normal range, until
+    a bullet or a plain sentence ends the table. Rows wrapped over up to three
+    lines are joined, and a unit that wrapped after the range is reattached.
+    """
+    rows = []
+    for page, text in sorted(texts.items()):
+        in_table, buffer = False, []
+        for line in (line.strip() for line in text.split('\n')):
+            if not line:
+                continue
+            if TABLE_HEADER.search(line):
+                in_table, buffer = True, []
+                continue
+            if not in_table:
+                continue
+            if _ends_table(line):
+                in_table, buffer = False, []
+                continue
+            if not buffer and rows and rows[-1].page == page and re.fullmatch(r'[/%][^\s\d]*', line):
+                rows[-1] = rows[-1]._replace(reference_range=f'{rows[-1].reference_range} {line}')
+                continue
+
+            buffer.append(line)
+            match = ROW.match(' '.join(buffer))
+            if match:
+                value_text = match.group('value').replace(' ', '')
+                rows.append(LabRow(
+                    test=match.group('test').strip(' :'),
+                    value=_number(value_text),
+                    value_text=value_text,
+                    unit=match.group('unit'),
+                    reference_range=match.group('range').strip(),
+                    page=page
+                ))
+                buffer = []
+            elif len(buffer) >= MAX_ROW_LINES:
+                buffer = buffer[1:]
+    return rows
+
+
+def rows_markdown(rows):
+    lines = ['| Test | Value | Unit | Reference Range |', '|------|-------|------|-----------------|']
+    lines.extend(f'| {row.test} | {row.value_text} | {row.unit or ""} | {row.reference_range or ""} |' for row in rows)
+    return '\n'.join(lines)
@@ -0,0 +1,226 @@
+import re
+from collections import Counter
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from app import db
+from app.models import LabObservation, LabResult, MedicalFile
+from app.uploads.extraction import LabRow, extract_text_pages, report_date
+from app.uploads.pdf_pages import page_count
+
+# (code, pattern on the lower-cased test name); first match wins, so specific names come first
+ANALYTES = (
+    ('hba1c', r'\bhba1c\b|glycated|glycosylated'),
+    ('glucose_fasting', r'(fasting|fbs).*(glucose|sugar)|(glucose|sugar).*fasting|\bfbs\b'),
+    ('glucose_pp', r'(post[\s-]?prandial|\bpp\b|ppbs).*(glucose|sugar)?|\bppbs\b'),
+    ('glucose_random', r'(random|rbs).*(glucose|sugar)|\brbs\b'),
+    ('glucose', r'\bglucose\b|blood sugar'),
+    ('ldl_hdl_ratio', r'ldl\s*/\s*hdl|ldl.*hdl.*ratio'),
+    ('hdl_ldl_ratio', r'hdl\s*/\s*ldl|hdl.*ldl.*ratio'),
+    ('cholesterol_hdl_ratio', r'(cholesterol|\bchol|\btc)\s*[/:]\s*hdl|cholesterol.*hdl.*ratio'),
+    ('cholesterol_ldl', r'\bldl\b'),
+    ('cholesterol_non_hdl', r'non[\s-]?hdl'),
+    ('cholesterol_hdl', r'\bhdl\b'),
+    ('cholesterol_vldl', r'\bvldl\b'),
+    ('triglycerides', r'triglyceride'),
+    ('cholesterol_total', r'cholesterol'),
+    ('hemoglobin', r'\bh(a)?emoglobin\b|^hb\b'),
+    ('wbc', r'leukocyte|\bwbc\b|white blood|\btlc\b'),
+    ('rbc', r'\brbc\b|red blood cell|erythrocyte count'),
+    ('platelets', r'platelet'),
+    ('hematocrit', r'h(a)?ematocrit|\bpcv\b|\bhct\b'),
+    ('mcv', r'\bmcv\b'),
+    ('mchc', r'\bmchc\b'),
+    ('mch', r'\bmch\b'),
+    ('neutrophils', r'neutrophil'),
+    ('lymphocytes', r'lymphocyte'),
+    ('eosinophils', r'eosinophil'),
+    ('monocytes', r'monocyte'),
+    ('basophils', r'basophil'),
+    ('esr', r'\besr\b|sedimentation'),
+    ('crp', r'\bc[\s-]?reactive|\bcrp\b'),
+    ('tsh', r'\btsh\b|thyroid stimulating'),
+    ('t3', r'\bt3\b|triiodothyronine'),
+    ('t4', r'\bt4\b|thyroxine'),
+    ('creatinine', r'creatinine'),
+    ('urea', r'\burea\b|\bbun\b'),
+    ('uric_acid', r'uric acid'),
+    ('alt', r'\balt\b|sgpt'),
+    ('ast', r'\bast\b|sgot'),
+    ('alp', r'alkaline phosphatase|\balp\b'),
+    ('bilirubin_total', r'bilirubin'),
+    ('vitamin_d', r'vitamin\s*d|25[\s-]?oh'),
+    ('vitamin_b12', r'vitamin\s*b[\s-]?12|cobalamin'),
+    ('ferritin', r'ferritin'),
+    ('tibc', r'total iron binding|\btibc\b'),
+    ('uibc', r'unsaturated iron binding|\buibc\b'),
+    ('transferrin_saturation', r'transferrin saturation|iron saturation|\btsat\b'),
+    ('iron', r'\biron\b'),
+    ('sodium', r'\bsodium\b|\bna\+?\b'),
+    ('potassium', r'\bpotassium\b'),
+    ('calcium', r'\bcalcium\b'),
+)
+ANALYTE_PATTERNS = [(code, re.compile(pattern)) for code, pattern in ANALYTES]
+
+EPOCH = datetime(1970, 1, 1)
+MARKDOWN_VALUE = re.compile(r'^[<>]?\s?(\d[\d,]*(?:\.\d+)?)\s*([^\s\d(][^\s(]*)?')
+
+
+def analyte_code(test_name):
+    """Stable code for a test name, e.g. 'Hemoglobin (Hb)' -> 'hemoglobin'.
+
+    Tests outside the known list are identified by their slugged name, so the
+    same lab's reports still line up over time.
+    """
+    name = test_name.lower()
+    for code, pattern in ANALYTE_PATTERNS:
+        if pattern.search(name):
+            return code
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')[:40] or 'unknown'
+
+
+def parse_markdown_lab_rows(markdown):
+    """Rows of the results table the analysis prompt asks for (Test | Value | ...)."""
+    rows, columns = [], None
+    for line in (markdown or '').splitlines():
+        line = line.strip()
+        if not line.startswith('|'):
+            columns = None
+            continue
+        cells = [cell.strip().strip('*').strip() for cell in line.strip('|').split('|')]
+        lowered = [cell.lower() for cell in cells]
+        if columns is None:
+            if 'test' in lowered and any(cell in ('value', 'result') for cell in lowered):
+                columns = (lowered.index('test'), lowered.index('value') if 'value' in lowered else lowered.index('result'))
+            continue
+        if set(line) <= set('|-: '):
+            continue
+        test_index, value_index = columns
+        if max(columns) >= len(cells):
+            continue
+        match = MARKDOWN_VALUE.match(cells[value_index])
+        if not cells[test_index] or not match:
+            continue
+        value_text = match.group(1)
+        rows.append(LabRow(
+            test=cells[test_index],
+            value=float(value_text.replace(',', '')),
+            value_text=value_text,
+            unit=match.group(2),
+            reference_range=None,
+            page=None
+        ))
+    return rows
+
+
+def observed_at(medical_file):
+    """Collection date printed on a PDF's first pages, else the upload date."""
+    if medical_file.filename.lower().endswith('.pdf'):
+        try:
+            printed = report_date(extract_text_pages(medical_file.filepath, range(min(2, page_count(medical_file.filepath)))))
+        except (ImportError, OSError, RuntimeError, ValueError):
+            printed = None
+        if printed:
+            return printed
+    return medical_file.upload_date or datetime.utcnow()
+
+
+def record_observations(medical_file, rows, when=None):
+    """Replace the file's observations with ``rows`` that carry a numeric value."""
+    medical_file.lab_observations.delete(synchronize_session=False)
+    rows = [row for row in rows if row.value is not None]
+    if not rows:
+        return 0
+    when = when or observed_at(medical_file)
+    for row in rows:
+        db.session.add(LabObservation(
+            patient_id=medical_file.patient_id,
+            medical_file_id=medical_file.id,
+            analyte_code=analyte_code(row.test),
+            test_name=row.test[:120],
+            value=row.value,
+            unit=(row.unit or '')[:30] or None,
+            observed_at=when
+        ))
+    return len(rows)
+
+
+def observation_rows(medical_file):
+    """Lab rows for a file: text-layer rows when there are any, else the analysis table."""
+    results = medical_file.lab_results.order_by(LabResult.id).all()
+    if results:
+        return [LabRow(r.test_name, r.value, r.value_text, r.unit, r.reference_range, r.page) for r in results]
+    return parse_markdown_lab_rows(medical_file.ai_analysis)
+
+
+def rebuild_lab_observations():
+    """Recreate observations for every analyzed file; returns (files, observations)."""
+    files = observations = 0
+    analyzed = MedicalFile.query.filter(MedicalFile.ai_analysis.isnot(None)).order_by(MedicalFile.id)
+    for medical_file in analyzed.yield_per(100):
+        files += 1
+        observations += record_observations(medical_file, observation_rows(medical_file))
+    db.session.commit()
+    return files, observations
+
+
+def patient_analytes(patient_id):
+    rows = db.session.query(
+        LabObservation.analyte_code,
+        func.min(LabObservation.test_name),
+        func.count(LabObservation.id),
+        func.max(LabObservation.observed_at)
+    ).filter(LabObservation.patient_id == patient_id).group_by(LabObservation.analyte_code).all()
+    return sorted(
+        ({'code': code, 'name': name, 'count': count, 'last_observed_at': last.strftime('%Y-%m-%d')}
+         for code, name, count, last in rows),
+        key=lambda analyte: (-analyte['count'], analyte['name'])
+    )
+
+
+def lab_series(patient_id, code, start=None, end=None, points=200):
+    """Columnar time series of one analyte for a patient.
+
+    Observations in the patient's most common unit are returned as parallel
+    lists. Above ``points`` observations they are averaged into that many
+    equal-width time buckets, keeping each bucket's min, max and count.
+    """
+    query = db.session.query(
+        LabObservation.observed_at, LabObservation.value, LabObservation.unit
+    ).filter(LabObservation.patient_id == patient_id, LabObservation.analyte_code == code)
+    if start:
+        query = query.filter(LabObservation.observed_at >= start)
+    if end:
+        query = query.filter(LabObservation.observed_at < end)
+    rows = query.order_by(LabObservation.observed_at).all()
+
+    unit = Counter(row.unit for row in rows).most_common(1)[0][0] if rows else None
+    samples = [((row.observed_at - EPOCH).total_seconds(), row.value) for row in rows if row.unit == unit]
+    series = {
+        'analyte': code,
+        'unit': unit,
+        'skipped_other_units': len(rows) - len(samples),
+        'downsampled': len(samples) > points,
+        't': [], 'value': [], 'min': [], 'max': [], 'count': []
+    }
+    if not samples:
+        return series
+
+    if len(samples) <= points:
+        buckets = [[sample] for sample in samples]
+    else:
+        first, last = samples[0][0], samples[-1][0]
+        width = (last - first) / points or 1
+        grouped = {}
+        for sample in samples:
+            grouped.setdefault(min(int((sample[0] - first) / width), points - 1), []).append(sample)
+        buckets = [grouped[key] for key in sorted(grouped)]
+
+    for bucket in buckets:
+        values = [value for timestamp, value in bucket]
+        middle = sum(timestamp for timestamp, value in bucket) / len(bucket)
+        series['t'].append((EPOCH + timedelta(seconds=middle)).strftime('%Y-%m-%d'))
+        series['value'].append(round(sum(values) / len(values), 4))
+        series['min'].append(min(values))
+        series['max'].append(max(values))
+        series['count'].append(len(values))
+    return series
@@ -0,0 +1,161 @@
+import io
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from PIL import Image
+
+# Gemini bills an image as 258 tokens per 768x768 tile
+IMAGE_TILE = 768
+TOKENS_PER_TILE = 258
+MAX_RENDER_SCALE = 4
+# pdfium renders BGRA and PIL converts to a second buffer
+RENDER_BYTES_PER_PIXEL = 8
+
+
+class PageRangeError(ValueError):
+    pass
+
+
+class UnreadablePdf(ValueError):
+    pass
+
+
+def parse_page_range(spec, page_count):
+    """Zero-based page indexes for a spec such as '1-3,5' (pages numbered from 1).
+
+    An empty spec selects every page. Raises PageRangeError for malformed or
+    out-of-range specs.
+    """
+    if not spec or not str(spec).strip():
+        return list(range(page_count))
+    pages = []
+    for part in str(spec).split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                first, last = (int(bound) for bound in part.split('-', 1))
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise PageRangeError(f'Invalid page range "{part}".')
+        if first < 1 or last < first or last > page_count:
+            raise PageRangeError(f'Page range "{part}" is outside 1-{page_count}.')
+        pages.extend(index for index in range(first - 1, last) if index not in pages)
+    return pages
+
+
+def page_count(filepath):
+    import pypdfium2 as pdfium
+    if not os.path.exists(filepath):
+        raise FileNotFoundError(filepath)
+    try:
+        pdf = pdfium.PdfDocument(filepath)
+    except pdfium.PdfiumError as exc:
+        raise UnreadablePdf(f'The PDF could not be read: {exc}') from exc
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def render_scale(width, height, target_pixels):
+    """Scale that brings a page of ``width`` x ``height`` points to about ``target_pixels``."""
+    return min(math.sqrt(target_pixels / (width * height)), MAX_RENDER_SCALE)
+
+
+def _render_page(filepath, index, target_pixels, quality):
+    # runs in a pool process; documents cannot be pickled, so each call opens its own
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(filepath)
+    try:
+        page = pdf[index]
+        width, height = page.get_size()
+        image = page.render(scale=render_scale(width, height, target_pixels)).to_pil().convert('RGB')
+    finally:
+        pdf.close()
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return index, buffer.getvalue()
+
+
+def image_tokens(size):
+    width, height = size
+    return math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE) * TOKENS_PER_TILE
+
+
+def pack_pages(pages, token_budget, max_images):
+    """Group ``(index, image)`` pairs, in order, into as few batches as the
+    per-call token budget and image limit allow."""
+    batches, batch, used = [], [], 0
+    for index, image in pages:
+        tokens = image_tokens(image.size)
+        if batch and (used + tokens > token_budget or len(batch) >= max_images):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append((index, image))
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+class PageRenderer:
+    """Renders PDF pages in a process pool, keeping at most as many pages in
+    flight as fit in ``memory_budget_mb`` at the target resolution."""
+
+    def __init__(self, app=None):
+        self.processes = 2
+        self.target_pixels = 1500000
+        self.memory_budget_mb = 256
+        self.quality = 85
+        self._executor = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.processes = app.config.get('PDF_RENDER_PROCESSES') or min(os.cpu_count() or 1, 4)
+        self.target_pixels = app.config.get('PDF_PAGE_TARGET_PIXELS', 1500000)
+        self.memory_budget_mb = app.config.get('PDF_RENDER_MEMORY_MB', 256)
+        self.quality = app.config.get('PDF_PAGE_QUALITY', 85)
+        app.extensions['page_renderer'] = self
+
+    @property
+    def max_in_flight(self):
+        page_bytes = self.target_pixels * RENDER_BYTES_PER_PIXEL
+        return max(1, min(self.processes, self.memory_budget_mb * 1024 * 1024 // page_bytes))
+
+    def _pool(self):
+        with self._lock:
+            # created on first use; forkserver keeps the children free of the
+            # parent's threads and database connections
+            if self._executor is None:
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+            return self._executor
+
+    def render(self, filepath, pages, parallel=True):
+        """Render ``pages`` of ``filepath``; returns ``(index, image)`` pairs in page order."""
+        if not parallel or self.processes < 2 or len(pages) < 2:
+            rendered = [_render_page(filepath, index, self.target_pixels, self.quality) for index in pages]
+        else:
+            executor = self._pool()
+            rendered, queue, running = [], list(pages), set()
+            while queue or running:
+                while queue and len(running) < self.max_in_flight:
+                    running.add(executor.submit(_render_page, filepath, queue.pop(0), self.target_pixels, self.quality))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                rendered.extend(future.result() for future in done)
+        return [(index, Image.open(io.BytesIO(data))) for index, data in sorted(rendered)]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+
+page_renderer = PageRenderer()
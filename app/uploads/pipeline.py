@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+from collections import namedtuple
+from flask import Request, current_app, g
+from werkzeug.utils import secure_filename
+from app.models import MedicalFile
+from app.uploads.quota import storage_quota
+from app.uploads.renditions import remove_renditions
+
+CHUNK_SIZE = 256 * 1024
+STAGING_FOLDER = '.incoming'
+
+StoredUpload = namedtuple('StoredUpload', ['filename', 'filepath', 'sha256', 'size', 'deduplicated'])
+
+
+class StorageQuotaExceeded(Exception):
+    def __init__(self, allowed_mb):
+        self.allowed_mb = allowed_mb
+        self.message = f"Storage limit exceeded. This patient's subscription allows up to {allowed_mb}MB of storage."
+        super().__init__(self.message)
+
+
+class HashingSpool:
+    """Disk buffer for one uploaded file that hashes and counts bytes as they arrive.
+
+    Past ``budget`` bytes nothing more is written and the partial file is
+    truncated, but hashing continues so a re-upload of content the patient
+    already stores can still be deduplicated instead of rejected.
+    """
+
+    def __init__(self, directory, budget=None):
+        fd, self.path = tempfile.mkstemp(prefix='upload-', dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.size = 0
+        self.budget = budget
+        self.over_budget = False
+
+    def write(self, data):
+        self._hash.update(data)
+        self.size += len(data)
+        if self.over_budget:
+            return len(data)
+        if self.budget is not None and self.size > self.budget:
+            self.over_budget = True
+            self._file.truncate(0)
+            return len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+
+def _staging_dir():
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], STAGING_FOLDER)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _new_spool(budget=None):
+    spool = HashingSpool(_staging_dir(), budget)
+    g.setdefault('staged_uploads', []).append(spool)
+    return spool
+
+
+class UploadRequest(Request):
+    """Streams multipart file parts into hashing spools next to the upload folder,
+    so files never sit in worker memory and storing one is a rename."""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return _new_spool(self._upload_budget())
+
+    def _upload_budget(self):
+        # CSRF validation parses the form before the view runs, so the patient
+        # has to come from the URL of views marked with patient_upload_quota
+        if 'upload_budget' not in g:
+            view = current_app.view_functions.get(self.endpoint)
+            find_patient = getattr(view, 'upload_patient', None)
+            patient = find_patient(**(self.view_args or {})) if find_patient else None
+            g.upload_budget = storage_quota.remaining(patient) if patient else None
+        return g.upload_budget
+
+
+def patient_upload_quota(find_patient):
+    """Mark a view whose URL identifies the patient, so uploads stop being
+    written once that patient's remaining quota is used up.
+
+    Apply it below the route decorators; ``find_patient`` gets the view args.
+    """
+    def decorator(view):
+        view.upload_patient = find_patient
+        return view
+    return decorator
+
+
+def discard_staged_uploads(exc=None):
+    # spools that were stored have been renamed away already
+    for spool in g.pop('staged_uploads', ()):
+        try:
+            spool.close()
+            os.remove(spool.path)
+        except OSError:
+            pass
+
+
+def _spool_for(file):
+    if isinstance(file.stream, HashingSpool):
+        return file.stream
+    # files that did not come through UploadRequest are copied once, chunk by chunk
+    spool = _new_spool()
+    for chunk in iter(lambda: file.stream.read(CHUNK_SIZE), b''):
+        spool.write(chunk)
+    return spool
+
+
+def store_upload(file, patient, subfolder, reuse_records=True):
+    """Move an uploaded file into content-addressed storage under
+    ``<subfolder>/<patient id>/<sha256><ext>``.
+
+    Content the patient already stores is not written again: with
+    ``reuse_records`` the path of an existing MedicalFile with the same hash is
+    returned, otherwise an existing file at the target path. Raises
+    StorageQuotaExceeded when new content does not fit the patient's plan.
+    """
+    spool = _spool_for(file)
+    digest = spool.hexdigest()
+    _, ext = os.path.splitext(secure_filename(file.filename or ''))
+    filename = f'{digest}{ext.lower()}'
+
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder, str(patient.id))
+    filepath = os.path.join(folder, filename)
+
+    if reuse_records:
+        existing = MedicalFile.query.filter_by(patient_id=patient.id, sha256=digest).order_by(MedicalFile.id).first()
+        if existing and os.path.exists(existing.filepath):
+            return StoredUpload(existing.filename, existing.filepath, digest, spool.size, True)
+    if os.path.exists(filepath):
+        return StoredUpload(filename, filepath, digest, spool.size, True)
+
+    if spool.over_budget or not storage_quota.allows(patient, spool.size):
+        raise StorageQuotaExceeded(storage_quota.allowance_mb(patient))
+
+    os.makedirs(folder, exist_ok=True)
+    spool.flush()
+    os.fsync(spool.fileno())
+    os.replace(spool.path, filepath)
+    return StoredUpload(filename, filepath, digest, spool.size, False)
+
+
+def release_stored_file(medical_file):
+    """Remove the file from disk unless another record of the patient still points at it."""
+    shared = MedicalFile.query.filter(
+        MedicalFile.filepath == medical_file.filepath,
+        MedicalFile.id != medical_file.id
+    ).first()
+    if shared is None and os.path.exists(medical_file.filepath):
+        os.remove(medical_file.filepath)
+        remove_renditions(medical_file)
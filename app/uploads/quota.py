@@ -0,0 +1,136 @@
+import os
+from sqlalchemy import event, func, select, update
+from app import db
+from app.models import User, MedicalFile
+
+users = User.__table__
+medical_files = MedicalFile.__table__
+
+DEFAULT_STORAGE_QUOTA_MB = {
+    'free': 100,
+    'basic': 1024,
+    'premium': 10240,
+    'enterprise': float('inf')
+}
+
+
+class StorageQuotaPolicy:
+    """Storage allowance per subscription tier, checked against the patient's
+    storage_used_bytes counter. Unknown tiers get the default tier's allowance."""
+
+    def __init__(self, limits_mb=None, default_tier='free'):
+        self.limits_mb = dict(limits_mb or DEFAULT_STORAGE_QUOTA_MB)
+        self.default_tier = default_tier
+
+    def init_app(self, app):
+        self.limits_mb = dict(app.config.get('STORAGE_QUOTA_MB') or DEFAULT_STORAGE_QUOTA_MB)
+        app.extensions['storage_quota'] = self
+
+    def tier(self, patient):
+        tier = (patient.subscription_tier or self.default_tier).strip().lower()
+        return tier if tier in self.limits_mb else self.default_tier
+
+    def allowance_mb(self, patient):
+        return self.limits_mb[self.tier(patient)]
+
+    def remaining(self, patient):
+        return self.allowance_mb(patient) * 1024 * 1024 - (patient.storage_used_bytes or 0)
+
+    def allows(self, patient, size):
+        return size <= self.remaining(patient)
+
+
+storage_quota = StorageQuotaPolicy()
+
+
+def _content_copies(connection, patient_id, sha256):
+    return connection.execute(
+        select(func.count()).select_from(medical_files).where(
+            medical_files.c.patient_id == patient_id,
+            medical_files.c.sha256 == sha256
+        )
+    ).scalar()
+
+
+def _group(objects):
+    deltas, hashed = {}, {}
+    for obj in objects:
+        if not isinstance(obj, MedicalFile):
+            continue
+        if obj.sha256 is None:
+            deltas[obj.patient_id] = deltas.get(obj.patient_id, 0) + (obj.file_size or 0)
+        else:
+            hashed.setdefault((obj.patient_id, obj.sha256), obj.file_size or 0)
+    return deltas, hashed
+
+
+def _after_flush(session, flush_context):
+    added, added_hashed = _group(session.new)
+    removed, removed_hashed = _group(session.deleted)
+    if not (added or added_hashed or removed or removed_hashed):
+        return
+
+    connection = session.connection()
+    deltas = dict(added)
+    for patient_id, size in removed.items():
+        deltas[patient_id] = deltas.get(patient_id, 0) - size
+
+    new_copies = {}
+    for obj in session.new:
+        if isinstance(obj, MedicalFile) and obj.sha256 is not None:
+            key = (obj.patient_id, obj.sha256)
+            new_copies[key] = new_copies.get(key, 0) + 1
+    # deduplicated content takes space once: count it when the first copy
+    # arrives and release it when the last copy is deleted
+    for (patient_id, sha256), size in added_hashed.items():
+        if _content_copies(connection, patient_id, sha256) == new_copies[(patient_id, sha256)]:
+            deltas[patient_id] = deltas.get(patient_id, 0) + size
+    for (patient_id, sha256), size in removed_hashed.items():
+        if _content_copies(connection, patient_id, sha256) == 0:
+            deltas[patient_id] = deltas.get(patient_id, 0) - size
+
+    for patient_id, delta in deltas.items():
+        if delta:
+            connection.execute(
+                update(users).where(users.c.id == patient_id).values(
+                    storage_used_bytes=users.c.storage_used_bytes + delta
+                )
+            )
+
+
+def register_storage_counter():
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+def reconcile_storage_usage():
+    """Recompute every patient's storage_used_bytes from the files on disk.
+
+    Records whose size on disk differs are corrected as well, so later deletes
+    subtract the right amount. Files missing from disk keep counting with their
+    recorded size until the record is deleted. Returns (patients, corrected, missing paths).
+    """
+    usage, seen, missing = {}, set(), []
+    for medical_file in MedicalFile.query.order_by(MedicalFile.id):
+        try:
+            size = os.path.getsize(medical_file.filepath)
+        except OSError:
+            size = medical_file.file_size or 0
+            missing.append(medical_file.filepath)
+        if medical_file.file_size != size:
+            medical_file.file_size = size
+
+        key = (medical_file.patient_id, medical_file.sha256 or medical_file.filepath)
+        if key not in seen:
+            seen.add(key)
+            usage[medical_file.patient_id] = usage.get(medical_file.patient_id, 0) + size
+
+    corrected = 0
+    patients = db.session.query(User.id, User.storage_used_bytes).filter(User.role == 'patient').all()
+    for patient_id, used in patients:
+        actual = usage.get(patient_id, 0)
+        if used != actual:
+            db.session.execute(update(users).where(users.c.id == patient_id).values(storage_used_bytes=actual))
+            corrected += 1
+    db.session.commit()
+    return len(patients), corrected, missing
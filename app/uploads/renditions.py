@@ -0,0 +1,167 @@
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+from app.models import MedicalFile
+from app.utils.transactions import register_transaction_hooks
+
+# longest side in pixels; the preview keeps a scale=2 render of an A4 page intact
+RENDITION_SIZES = {
+    'thumb': 320,
+    'preview': 2048,
+}
+RENDITION_QUALITY = {
+    'thumb': 75,
+    'preview': 88,
+}
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+RENDERABLE_EXTENSIONS = IMAGE_EXTENSIONS + ('.pdf',)
+PDF_RENDER_SCALE = 2
+
+RenditionSource = namedtuple('RenditionSource', ['filepath', 'key'])
+
+
+class RenditionUnavailable(Exception):
+    def __init__(self, message='No preview is available for this file.'):
+        super().__init__(message)
+        self.message = message
+
+
+def is_renderable(filename):
+    return (filename or '').lower().endswith(RENDERABLE_EXTENSIONS)
+
+
+def rendition_source(medical_file):
+    # content-addressed files share renditions with their duplicates
+    key = medical_file.sha256 or os.path.splitext(medical_file.filename)[0]
+    return RenditionSource(medical_file.filepath, key)
+
+
+def rendition_path(source, kind):
+    return os.path.join(os.path.dirname(source.filepath), f'{source.key}.{kind}.webp')
+
+
+def _first_page(filepath):
+    if filepath.lower().endswith('.pdf'):
+        try:
+            import pypdfium2 as pdfium
+        except ModuleNotFoundError:
+            raise RenditionUnavailable('PDF previews require pypdfium2. Please install it first.')
+        pdf = pdfium.PdfDocument(filepath)
+        try:
+            if len(pdf) == 0:
+                raise RenditionUnavailable('The PDF has no pages.')
+            return pdf[0].render(scale=PDF_RENDER_SCALE).to_pil().convert('RGB')
+        finally:
+            pdf.close()
+
+    image = ImageOps.exif_transpose(Image.open(filepath))
+    has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _save_webp(image, path, quality):
+    partial = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    image.save(partial, format='WEBP', quality=quality, method=4)
+    os.replace(partial, path)
+
+
+def generate_renditions(source):
+    """Write every rendition of ``source`` that is missing; returns their paths by kind."""
+    paths = {kind: rendition_path(source, kind) for kind in RENDITION_SIZES}
+    missing = [kind for kind, path in paths.items() if not os.path.exists(path)]
+    if not missing:
+        return paths
+    if not is_renderable(source.filepath):
+        raise RenditionUnavailable()
+
+    try:
+        image = _first_page(source.filepath)
+    except (OSError, ValueError) as exc:
+        raise RenditionUnavailable('The file could not be read for a preview.') from exc
+    # largest first, so each smaller size is resampled from the previous one
+    for kind in sorted(missing, key=RENDITION_SIZES.get, reverse=True):
+        size = RENDITION_SIZES[kind]
+        image.thumbnail((size, size), Image.LANCZOS)
+        _save_webp(image, paths[kind], RENDITION_QUALITY[kind])
+    return paths
+
+
+def ensure_rendition(medical_file, kind):
+    """Path of a rendition, generating it now if the background worker has not yet."""
+    source = rendition_source(medical_file)
+    path = rendition_path(source, kind)
+    if os.path.exists(path):
+        return path
+    return generate_renditions(source)[kind]
+
+
+def remove_renditions(medical_file):
+    source = rendition_source(medical_file)
+    for kind in RENDITION_SIZES:
+        try:
+            os.remove(rendition_path(source, kind))
+        except OSError:
+            pass
+
+
+class RenditionWorker:
+    """Thread pool that renders previews of new uploads after their commit."""
+
+    def __init__(self, app=None):
+        self.max_workers = 2
+        self._app = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_workers = app.config.get('RENDITION_WORKERS', 2)
+        self._app = app
+        app.extensions['rendition_worker'] = self
+
+    def submit(self, source):
+        with self._lock:
+            if source.key in self._pending:
+                return
+            self._pending.add(source.key)
+            # created on first use so CLI commands and pre-fork masters never start threads
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='renditions')
+        self._executor.submit(self._render, source)
+
+    def _render(self, source):
+        try:
+            generate_renditions(source)
+        except RenditionUnavailable as exc:
+            self._app.logger.info('No rendition for %s: %s', source.filepath, exc.message)
+        except Exception:
+            self._app.logger.exception('Rendition failed for %s', source.filepath)
+        finally:
+            with self._lock:
+                self._pending.discard(source.key)
+
+
+rendition_worker = RenditionWorker()
+
+
+def _collect_renditions(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, MedicalFile) and is_renderable(obj.filename):
+            session.info.setdefault('pending_renditions', []).append(rendition_source(obj))
+
+
+def _render_after_commit(session):
+    for source in session.info.pop('pending_renditions', ()):
+        rendition_worker.submit(source)
+
+
+def _discard_after_rollback(session):
+    session.info.pop('pending_renditions', None)
+
+
+def register_rendition_jobs():
+    register_transaction_hooks(_collect_renditions, _render_after_commit, _discard_after_rollback)
@@ -1,21 +1,21 @@
-import os
-from flask import render_template, redirect, url_for, flash, request, send_file, current_app, jsonify, abort
-from markupsafe import Markup
+from flask import render_template, redirect, url_for, flash, request, current_app, jsonify, abort
 from flask_login import login_required, current_user
 from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
 from app import db
 from app.uploads import bp
 from app.uploads.forms import UploadReportForm, QuickUploadForm
-from app.models import User, MedicalFile, Appointment
+from app.models import User, MedicalFile, Appointment, Job
 from app.utils.decorators import doctor_required, patient_required
-from app.utils.helpers import save_picture, allowed_file, generate_unique_filename, get_file_size, format_file_size, create_notification
+from app.utils.helpers import save_picture, allowed_file, get_file_size, format_file_size, create_notification
+from app.uploads.pipeline import store_upload, release_stored_file, patient_upload_quota, StorageQuotaExceeded
+from app.uploads.delivery import deliver_file, deliver_path, can_access_file
+from app.uploads.renditions import ensure_rendition, rendition_source, RenditionUnavailable
+from app.uploads.analysis import is_analyzable, analysis_job_key, enqueue_report_analysis
+from app.uploads.pdf_pages import page_count, parse_page_range, PageRangeError, UnreadablePdf
+from app.utils.jobs import latest_job, ACTIVE_STATUSES
 from datetime import datetime
 
-def get_patient_storage_used(patient_id):
-    
-    total_size = db.session.query(db.func.sum(MedicalFile.file_size)).filter_by(patient_id=patient_id).scalar() or 0
-    return total_size / (1024 * 1024)  
-
 @bp.route('/upload', methods=['GET', 'POST'])
 @login_required
 @doctor_required
@@ -46,54 +46,20 @@ def upload_report():
         file = form.file.data
         if file and allowed_file(file.filename):
             
-            original_filename = secure_filename(file.filename)
-            unique_filename = generate_unique_filename(original_filename)
-            
-            
-            subfolder = form.report_type.data
-            folder_path = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
-            os.makedirs(folder_path, exist_ok=True)
-            
-            
-            file_path = os.path.join(folder_path, unique_filename)
-
-            
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-
-            
-            file_size_mb = file_size / (1024 * 1024)
-
-            
-            used_mb = get_patient_storage_used(patient.id)
-
-            
-            limits = {
-                'free': 100,
-                'basic': 1024,
-                'premium': 10240,
-                'enterprise': float('inf')
-            }
-            plan = subscription_tier.strip().lower()
-            if plan not in limits:
-                plan = 'free'
-            allowed_mb = limits[plan]
-
-            if used_mb + file_size_mb > allowed_mb:
-                flash(f'Storage limit exceeded. This patient\'s subscription allows up to {allowed_mb}MB of storage.', 'danger')
+            try:
+                stored = store_upload(file, patient, form.report_type.data)
+            except StorageQuotaExceeded as exc:
+                flash(exc.message, 'danger')
                 return redirect(url_for('uploads.upload_report'))
 
             
-            file.save(file_path)
-
-            
             medical_file = MedicalFile(
-                filename=unique_filename,
-                original_filename=original_filename,
-                filepath=file_path,
+                filename=stored.filename,
+                original_filename=secure_filename(file.filename),
+                filepath=stored.filepath,
                 file_type=file.content_type or 'application/octet-stream',
-                file_size=file_size,
+                file_size=stored.size,
+                sha256=stored.sha256,
                 report_type=form.report_type.data,
                 description=form.description.data,
                 patient_id=patient.id,
@@ -141,6 +107,7 @@ def api_search_patient(patient_id):
 @bp.route('/quick_upload/<int:patient_id>', methods=['GET', 'POST'])
 @login_required
 @doctor_required
+@patient_upload_quota(lambda patient_id: User.query.filter_by(id=patient_id, role='patient').first())
 def quick_upload(patient_id):
     patient = User.query.filter_by(id=patient_id, role='patient').first_or_404()
     subscription_tier = patient.subscription_tier or 'free'
@@ -160,53 +127,20 @@ def quick_upload(patient_id):
         file = form.file.data
         if file and allowed_file(file.filename):
             
-            original_filename = secure_filename(file.filename)
-            unique_filename = generate_unique_filename(original_filename)
-            
-            
-            subfolder = form.report_type.data
-            folder_path = os.path.join(current_app.config['UPLOAD_FOLDER'], subfolder)
-            os.makedirs(folder_path, exist_ok=True)
-            
-            
-            file_path = os.path.join(folder_path, unique_filename)
-
-            
-            file.seek(0, os.SEEK_END)
-            file_size = file.tell()
-            file.seek(0)
-
-            
-            file_size_mb = file_size / (1024 * 1024)
-
-            
-            used_mb = get_patient_storage_used(patient.id)
-
-            limits = {
-                'free': 100,
-                'basic': 1024,
-                'premium': 10240,
-                'enterprise': float('inf')
-            }
-            plan_key = subscription_tier.strip().lower()
-            if plan_key not in limits:
-                plan_key = 'free'
-            allowed_mb = limits[plan_key]
-
-            if used_mb + file_size_mb > allowed_mb:
-                flash(f'Storage limit exceeded. This patient\'s subscription allows up to {allowed_mb}MB of storage.', 'danger')
+            try:
+                stored = store_upload(file, patient, form.report_type.data)
+            except StorageQuotaExceeded as exc:
+                flash(exc.message, 'danger')
                 return redirect(url_for('uploads.quick_upload', patient_id=patient.id))
 
             
-            file.save(file_path)
-
-            
             medical_file = MedicalFile(
-                filename=unique_filename,
-                original_filename=original_filename,
-                filepath=file_path,
+                filename=stored.filename,
+                original_filename=secure_filename(file.filename),
+                filepath=stored.filepath,
                 file_type=file.content_type or 'application/octet-stream',
-                file_size=file_size,
+                file_size=stored.size,
+                sha256=stored.sha256,
                 report_type=form.report_type.data,
                 description=form.description.data,
                 patient_id=patient.id,
@@ -243,165 +177,79 @@ def view_reports():
     page = request.args.get('page', 1, type=int)
     per_page = 10
     
-    files = MedicalFile.query.filter_by(
+    files = MedicalFile.query.options(
+        joinedload(MedicalFile.doctor)
+    ).filter_by(
         patient_id=current_user.id
     ).order_by(MedicalFile.upload_date.desc()).paginate(
         page=page, per_page=per_page, error_out=False
     )
     from app.models import Appointment
 
-    return render_template('uploads/view_reports.html', medical_files=files)
+    pending_analyses = {
+        int(key.split(':', 1)[1])
+        for (key,) in db.session.query(Job.key).filter(
+            Job.key.in_([analysis_job_key(file) for file in files.items]),
+            Job.status.in_(ACTIVE_STATUSES)
+        )
+    }
+
+    return render_template('uploads/view_reports.html', medical_files=files, pending_analyses=pending_analyses)
 
 @bp.route('/analyze_report/<int:file_id>', methods=['POST'])
 @login_required
 def analyze_report(file_id):
-    import google.generativeai as genai
-    try:
-        import pypdfium2 as pdfium
-    except ModuleNotFoundError:
-        flash("AI analysis requires pypdfium2. Please install it first.", "danger")
-        return redirect(url_for('uploads.view_reports'))
-    from PIL import Image
-    import io
-
     file = MedicalFile.query.get_or_404(file_id)
 
     if current_user.id != file.patient_id and current_user.role != 'doctor':
         abort(403)
 
-    file_path = file.filepath
-    filename = file.filename.lower()
-
     
-    if not filename.endswith((".png", ".jpg", ".jpeg", ".pdf")):
+    if not is_analyzable(file.filename):
+        if request.is_json:
+            return jsonify({'error': 'Only PNG, JPG, JPEG, or PDF files are supported for AI analysis.'}), 400
         flash("Only PNG, JPG, JPEG, or PDF files are supported for AI analysis.", "warning")
         return redirect(url_for('uploads.view_reports'))
 
-    try:
-        
-        if filename.endswith(".pdf"):
-            pdf_doc = pdfium.PdfDocument(file_path)
-            if len(pdf_doc) == 0:
-                raise Exception("Empty PDF file.")
-            page = pdf_doc[0]
-            pil_image = page.render(scale=2).to_pil()
-            image = pil_image.convert("RGB")
-        
-        
-        else:
-            with open(file_path, "rb") as f:
-                image_bytes = f.read()
-            image = Image.open(io.BytesIO(image_bytes))
-
-    except Exception as e:
-        flash("Failed to process the file.", "danger")
-        return redirect(url_for('uploads.view_reports'))
-
-    
-    prompt_text = f"""
-You are an expert medical analyst trained in interpreting scanned medical documents — including blood tests, diagnostic scans (X-rays, MRIs, CTs), prescriptions, and handwritten notes. Your task is to extract and explain the findings clearly and professionally.
-
-Analyze the attached image in detail and generate a structured **Markdown-formatted** report. This must be clear enough for patients to understand but thorough enough for doctors to find clinical value.
-
----
-
-
-- **Report Type:** {file.report_type or 'N/A'}
-- **Description Provided:** {file.description or 'N/A'}
-- **Uploaded by Doctor:** {file.doctor.name if file.doctor else 'Unknown'}
-
----
-
-
-
-You MUST return your analysis in Markdown format.
-
-Organize the report with the following sections:
-
----
-
-
-- Describe what this report is about (e.g. "Lipid Profile", "MRI of Lumbar Spine", "Prescription for Diabetes Management").
-- Mention the purpose, if evident (e.g. follow-up, diagnosis, routine checkup).
-
----
-
-
-- Use **bullet points** for general insights.
-- If the report contains test results, display them in a **Markdown table**:
-
-Test	Value	Normal Range	Interpretation
-
-- Interpret each value. Highlight what's **low**, **high**, or **abnormal**.
-
----
-
-
-- Clearly explain any abnormalities.
-- Mention whether they are **mild**, **moderate**, or **critical**.
-- If imaging (like X-ray/MRI), describe any visible findings or irregularities.
-- State if immediate attention or re-testing is needed.
-
----
-
-
-- Convert the above medical findings into plain language.
-- Help the patient understand what it may mean for their health.
-- Avoid vague responses. Be specific, e.g. "Elevated liver enzymes could indicate stress on the liver."
-
----
-
-
-- Personalized lifestyle or dietary suggestions (based on the findings).
-- Recommend relevant medical specialties if further evaluation is needed.
-- Mention if the patient should consult the uploading doctor urgently or routinely.
-
----
-
-
-- List any required follow-up tests or repeat diagnostics (with timeframes).
-- Mention if tracking trends over time is important (e.g. sugar levels, cholesterol, etc.).
-
----
-
-
-- Include clinically relevant insights that a physician may want to review.
-- You may use concise language and standard medical terms here.
-
----
-
-
-- Based on this report, recommend any important health metrics the patient should track over time (e.g. blood pressure, glucose, BMI, cholesterol, vitamin levels, etc.).
-- Suggest tools or apps for regular monitoring if applicable.
-
----
-
-
-- **Do NOT refuse to answer** even if data is partially unclear. Do your best.
-- **Always respond in Markdown**. Never use plain text or HTML.
-- If parts of the report are illegible, note it politely and explain what you could infer.
-
-This report may be part of a digital health assistant workflow. Make sure it's actionable and user-friendly.
-"""
-
-    try:
-        genai.configure(api_key="")
-        model = genai.GenerativeModel('gemini-2.5-flash') 
-
-        response = model.generate_content([prompt_text, image])
-        result = response.text
-
-        
-        file.ai_analysis = result
-        db.session.commit()
+    pages = (request.get_json(silent=True) or {}).get('pages') if request.is_json else request.form.get('pages')
+    if pages and file.filename.lower().endswith('.pdf'):
+        try:
+            parse_page_range(pages, page_count(file.filepath))
+        except (PageRangeError, UnreadablePdf, FileNotFoundError, ModuleNotFoundError) as e:
+            message = str(e) if isinstance(e, PageRangeError) else "The PDF could not be read."
+            if request.is_json:
+                return jsonify({'error': message}), 400
+            flash(message, "warning")
+            return redirect(url_for('uploads.view_reports'))
+
+    links = {file.patient_id: url_for('uploads.view_reports')}
+    if current_user.id != file.patient_id:
+        links[current_user.id] = url_for('dashboard.view_patient_profile', patient_id=file.patient.unique_patient_id)
+    job = enqueue_report_analysis(file, current_user, links, pages=pages or None)
+    db.session.commit()
+
+    if request.is_json:
+        return jsonify({
+            'job': job.to_dict(),
+            'status_url': url_for('uploads.analysis_status', file_id=file.id)
+        }), 202
+    flash("AI analysis has started. You will get a notification when it is ready.", "info")
+    return redirect(url_for('uploads.view_reports'))
 
-        flash(Markup(f"<strong>AI Analysis:</strong><br><pre>{result}</pre>"), "info")
+@bp.route('/analysis_status/<int:file_id>')
+@login_required
+def analysis_status(file_id):
+    file = MedicalFile.query.get_or_404(file_id)
 
-    except Exception as e:
-        current_app.logger.error(f"Gemini API error: {str(e)}")
-        flash("AI analysis failed. Please try again.", "danger")
+    if current_user.id != file.patient_id and current_user.role != 'doctor':
+        abort(403)
 
-    return redirect(url_for('uploads.view_reports'))
+    job = latest_job(analysis_job_key(file))
+    return jsonify({
+        'file_id': file.id,
+        'has_analysis': bool(file.ai_analysis),
+        'job': job.to_dict() if job else None
+    })
 
 @bp.route('/doctor_uploads')
 @login_required
@@ -410,7 +258,9 @@ def doctor_uploads():
     page = request.args.get('page', 1, type=int)
     per_page = 10
 
-    files = MedicalFile.query.filter_by(
+    files = MedicalFile.query.options(
+        joinedload(MedicalFile.patient)
+    ).filter_by(
         doctor_id=current_user.id
     ).order_by(MedicalFile.upload_date.desc()).paginate(
         page=page, per_page=per_page, error_out=False
@@ -429,28 +279,12 @@ def download_file(file_id):
     medical_file = MedicalFile.query.get_or_404(file_id)
     
     
-    if current_user.role == 'patient' and medical_file.patient_id != current_user.id:
+    if not can_access_file(current_user, medical_file):
         flash('You do not have permission to access this file.', 'danger')
-        return redirect(url_for('uploads.view_reports'))
-    
-    if current_user.role == 'doctor' and medical_file.doctor_id != current_user.id:
-        
-        from app.models import Appointment
-        has_appointment = Appointment.query.filter_by(
-            doctor_id=current_user.id,
-            patient_id=medical_file.patient_id
-        ).first()
-        
-        if not has_appointment:
-            flash('You do not have permission to access this file.', 'danger')
-            return redirect(url_for('uploads.doctor_uploads'))
+        return redirect(url_for('uploads.view_reports') if current_user.role == 'patient' else url_for('uploads.doctor_uploads'))
     
     try:
-        return send_file(
-            medical_file.filepath,
-            as_attachment=True,
-            download_name=medical_file.original_filename
-        )
+        return deliver_file(medical_file, as_attachment=True)
     except FileNotFoundError:
         flash('File not found on server.', 'danger')
         return redirect(url_for('uploads.view_reports') if current_user.role == 'patient' else url_for('uploads.doctor_uploads'))
@@ -461,22 +295,29 @@ def preview_file(file_id):
     medical_file = MedicalFile.query.get_or_404(file_id)
 
     
-    if current_user.role == 'patient' and medical_file.patient_id != current_user.id:
+    if not can_access_file(current_user, medical_file):
         abort(403)
-    if current_user.role == 'doctor' and medical_file.doctor_id != current_user.id:
-        from app.models import Appointment
-        has_appointment = Appointment.query.filter_by(
-            doctor_id=current_user.id,
-            patient_id=medical_file.patient_id
-        ).first()
-        if not has_appointment:
-            abort(403)
 
     try:
-        return send_file(medical_file.filepath)
+        return deliver_file(medical_file)
     except FileNotFoundError:
         abort(404)
 
+@bp.route('/preview/<int:file_id>/<any(thumb, preview):kind>')
+@login_required
+def preview_rendition(file_id, kind):
+    medical_file = MedicalFile.query.get_or_404(file_id)
+
+    
+    if not can_access_file(current_user, medical_file):
+        abort(403)
+
+    try:
+        path = ensure_rendition(medical_file, kind)
+        return deliver_path(path, mimetype='image/webp', etag=f'{rendition_source(medical_file).key}-{kind}')
+    except (RenditionUnavailable, FileNotFoundError):
+        abort(404)
+
 @bp.route('/delete/<int:file_id>', methods=['POST'])
 @login_required
 def delete_file(file_id):
@@ -488,8 +329,7 @@ def delete_file(file_id):
     
     try:
         
-        if os.path.exists(medical_file.filepath):
-            os.remove(medical_file.filepath)
+        release_stored_file(medical_file)
         
         
         db.session.delete(medical_file)
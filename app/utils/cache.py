@@ -0,0 +1,133 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+
+class MemoryCacheBackend:
+    name = 'memory'
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            now = time.monotonic()
+            return sum(1 for expires_at, _ in self._entries.values() if expires_at > now)
+
+
+class RedisCacheBackend:
+    name = 'redis'
+
+    def __init__(self, url, prefix='healnex:cache:'):
+        try:
+            import redis
+        except ModuleNotFoundError:
+            raise RuntimeError("STATS_CACHE_REDIS_URL is set but the redis package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.evictions = 0
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.setex(self.prefix + key, max(int(ttl), 1), pickle.dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*[self.prefix + key for key in keys])
+
+    def clear(self):
+        keys = list(self._client.scan_iter(self.prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+    def __len__(self):
+        return sum(1 for _ in self._client.scan_iter(self.prefix + '*'))
+
+
+class StatsCache:
+    def __init__(self, app=None):
+        self.backend = MemoryCacheBackend()
+        self.default_ttl = 60
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.default_ttl = app.config.get('STATS_CACHE_TTL', 60)
+        redis_url = app.config.get('STATS_CACHE_REDIS_URL')
+        if redis_url:
+            self.backend = RedisCacheBackend(redis_url)
+        else:
+            self.backend = MemoryCacheBackend(app.config.get('STATS_CACHE_MAX_ENTRIES', 256))
+        app.extensions['stats_cache'] = self
+
+    def get_or_set(self, key, factory, ttl=None):
+        value = self.backend.get(key)
+        if value is not None:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        value = factory()
+        self.backend.set(key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'ttl': self.default_ttl,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'hit_rate': round((self.hits / lookups) * 100, 2) if lookups else 0
+        }
+
+
+stats_cache = StatsCache()
@@ -0,0 +1,152 @@
+import json
+import queue
+import threading
+from sqlalchemy import inspect
+from app.models import Message, Notification
+from app.utils.transactions import register_transaction_hooks
+
+
+class LocalFanout:
+    name = 'local'
+
+    def __init__(self):
+        self._deliver = None
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, payload):
+        self._deliver(payload)
+
+
+class RedisFanout:
+    name = 'redis'
+
+    def __init__(self, url, channel='healnex:events'):
+        try:
+            import redis
+        except ModuleNotFoundError:
+            raise RuntimeError("EVENT_STREAM_REDIS_URL is set but the redis package is not installed")
+        self._client = redis.Redis.from_url(url)
+        self.channel = channel
+        self._deliver = None
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def _ensure_listener(self):
+        with self._lock:
+            if self._listener and self._listener.is_alive():
+                return
+            pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(self.channel)
+            self._listener = threading.Thread(target=self._listen, args=(pubsub,), daemon=True)
+            self._listener.start()
+
+    def _listen(self, pubsub):
+        for message in pubsub.listen():
+            try:
+                self._deliver(json.loads(message['data']))
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def publish(self, payload):
+        self._client.publish(self.channel, json.dumps(payload))
+
+
+class EventBroker:
+    def __init__(self, app=None):
+        self.fanout = LocalFanout()
+        self.fanout.start(self._deliver)
+        self.queue_size = 100
+        self.keepalive = 15
+        self.max_duration = 300
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.queue_size = app.config.get('EVENT_STREAM_QUEUE_SIZE', 100)
+        self.keepalive = app.config.get('EVENT_STREAM_KEEPALIVE', 15)
+        self.max_duration = app.config.get('EVENT_STREAM_MAX_DURATION', 300)
+        redis_url = app.config.get('EVENT_STREAM_REDIS_URL')
+        self.fanout = RedisFanout(redis_url) if redis_url else LocalFanout()
+        self.fanout.start(self._deliver)
+        app.extensions['event_broker'] = self
+
+    def subscribe(self, user_id):
+        if isinstance(self.fanout, RedisFanout):
+            self.fanout._ensure_listener()
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event_type, data):
+        self.fanout.publish({'user_id': user_id, 'event': event_type, 'data': data})
+
+    def _deliver(self, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(payload['user_id'], ()))
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((payload['event'], payload['data']))
+            except queue.Full:
+                # a stalled tab re-syncs through the regular endpoints when it reconnects
+                continue
+
+    def connected_users(self):
+        with self._lock:
+            return len(self._subscribers)
+
+
+event_broker = EventBroker()
+
+
+def format_sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def _collect_events(session, flush_context):
+    pending = session.info.setdefault('pending_stream_events', [])
+    for obj in session.new:
+        if isinstance(obj, Message):
+            data = {'id': obj.id, 'sender_id': obj.sender_id, 'receiver_id': obj.receiver_id}
+            pending.append((obj.receiver_id, 'chat_message', data))
+            pending.append((obj.sender_id, 'chat_message', data))
+        elif isinstance(obj, Notification):
+            pending.append((obj.user_id, 'notification', obj.to_dict()))
+
+    # read receipts: tell each sender how far the reader has now read
+    read_up_to = {}
+    for obj in session.dirty:
+        if isinstance(obj, Message) and obj.is_read and inspect(obj).attrs.is_read.history.has_changes():
+            pair = (obj.sender_id, obj.receiver_id)
+            read_up_to[pair] = max(read_up_to.get(pair, 0), obj.id)
+    for (sender_id, reader_id), message_id in read_up_to.items():
+        pending.append((sender_id, 'chat_read', {'reader_id': reader_id, 'read_up_to': message_id}))
+
+
+def _publish_after_commit(session):
+    pending = session.info.pop('pending_stream_events', None)
+    for user_id, event_type, data in pending or ():
+        event_broker.publish(user_id, event_type, data)
+
+
+def _discard_after_rollback(session):
+    session.info.pop('pending_stream_events', None)
+
+
+def register_event_publishers():
+    register_transaction_hooks(_collect_events, _publish_after_commit, _discard_after_rollback)
@@ -1,24 +1,77 @@
 import json
-import os
+import threading
+from collections import OrderedDict
 from typing import Any, Dict, List, Optional
 
 import google.generativeai as genai
 
 
 class GeminiClient:
-    def __init__(self, model_name: str = "gemini-2.5-flash") -> None:
-        api_key = ""
-        if not api_key:
-            raise RuntimeError("GEMINI_API_KEY is required to call Gemini")
-        genai.configure(api_key=api_key)
+    """Gemini access shared by every request thread of a process.
+
+    The API key is configured once in ``init_app`` and ``GenerativeModel``
+    instances are kept per (model, tools, system instruction) signature, so a
+    chat turn only pays for its network calls. The least recently used model
+    is dropped beyond ``max_models``.
+    """
+
+    def __init__(self, app=None, model_name: str = "gemini-2.5-flash") -> None:
         self.model_name = model_name
+        self.api_key = ""
+        self.max_models = 32
+        self.models_built = 0
+        self.model_hits = 0
+        self._models: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
 
-    def build_model(self, tools: Optional[List[Dict[str, Any]]] = None, system_instruction: Optional[str] = None):
-        return genai.GenerativeModel(
-            model_name=self.model_name,
-            tools=tools or None,
-            system_instruction=system_instruction
-        )
+    def init_app(self, app) -> None:
+        self.api_key = app.config.get('GEMINI_API_KEY') or ""
+        self.max_models = app.config.get('GEMINI_MAX_CACHED_MODELS', 32)
+        if self.api_key:
+            genai.configure(api_key=self.api_key)
+        with self._lock:
+            self._models.clear()
+        app.extensions['gemini_client'] = self
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def build_model(self, tools: Optional[List[Dict[str, Any]]] = None, system_instruction: Optional[str] = None,
+                    model_name: Optional[str] = None):
+        if not self.configured:
+            raise RuntimeError("GEMINI_API_KEY is required to call Gemini")
+        model_name = model_name or self.model_name
+        key = (model_name, json.dumps(tools or None, sort_keys=True, default=str), system_instruction)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.model_hits += 1
+                return model
+            model = genai.GenerativeModel(
+                model_name=model_name,
+                tools=tools or None,
+                system_instruction=system_instruction
+            )
+            self._models[key] = model
+            self.models_built += 1
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            return model
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.models_built + self.model_hits
+            return {
+                'configured': self.configured,
+                'cached_models': len(self._models),
+                'built': self.models_built,
+                'hits': self.model_hits,
+                'hit_rate': round((self.model_hits / lookups) * 100, 2) if lookups else 0
+            }
 
     def detect_and_translate(self, text: str, target_language: str = "en") -> Dict[str, str]:
         prompt = (
@@ -52,3 +105,6 @@ class GeminiClient:
     def generate(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, **kwargs):
         model = self.build_model(tools=tools, system_instruction=kwargs.pop("system_instruction", None))
         return model.generate_content(messages, tools=tools, **kwargs)
+
+
+gemini_client = GeminiClient()
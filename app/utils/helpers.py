@@ -60,21 +60,9 @@ def generate_unique_filename(original_filename):
 
 def is_doctor_available(doctor, appointment_date, appointment_time):
     
-    from app.models import Appointment
+    from app.appointments.slots import is_slot_available
     
-    
-    if not (doctor.working_hours_start <= appointment_time <= doctor.working_hours_end):
-        return False
-    
-    
-    existing_appointment = Appointment.query.filter_by(
-        doctor_id=doctor.id,
-        appointment_date=appointment_date,
-        appointment_time=appointment_time,
-        status='confirmed'
-    ).first()
-    
-    return existing_appointment is None
+    return is_slot_available(doctor, appointment_date, appointment_time)
 
 def calculate_age(birth_date):
     
@@ -83,38 +71,9 @@ def calculate_age(birth_date):
 
 def get_available_time_slots(doctor, date):
     
-    from app.models import Appointment
-
-    
-    if not doctor.working_hours_start or not doctor.working_hours_end:
-        return []
-
-    start_time = datetime.combine(date, doctor.working_hours_start)
-    end_time = datetime.combine(date, doctor.working_hours_end)
-
-    if end_time <= start_time:
-        end_time += timedelta(days=1)
-
-    
-    booked_times = set(
-        appt.appointment_time.strftime('%H:%M')
-        for appt in Appointment.query.filter_by(
-            doctor_id=doctor.id,
-            appointment_date=date,
-            status='confirmed'
-        ).all()
-    )
-
-    
-    slots = []
-    current_time = start_time
-    while current_time + timedelta(minutes=30) <= end_time:
-        time_str = current_time.strftime('%H:%M')
-        if time_str not in booked_times:
-            slots.append(current_time.time())
-        current_time += timedelta(minutes=30)
+    from app.appointments.slots import available_slots
 
-    return slots
+    return available_slots(doctor, date)
 
 def create_notification(user_id, title, message, notification_type, link=None):
     
@@ -0,0 +1,222 @@
+import json
+import os
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import and_, or_
+from app import db
+from app.models import Job
+from app.utils.transactions import register_transaction_hooks
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+JOB_HANDLERS = {}
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help, e.g. the input file is gone."""
+
+
+def job_handler(kind):
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def active_job(key):
+    return Job.query.filter(Job.key == key, Job.status.in_(ACTIVE_STATUSES)).order_by(Job.id.desc()).first()
+
+
+def latest_job(key):
+    return Job.query.filter_by(key=key).order_by(Job.id.desc()).first()
+
+
+class JobQueue:
+    """Jobs are rows in the job table; workers claim them with a conditional
+    UPDATE, so any number of threads and processes can share one database.
+
+    A job left 'running' longer than ``lease_seconds`` (its worker died) is
+    claimed again. Failures are retried after ``backoff_base * 2 ** n`` seconds
+    with jitter until ``max_attempts`` is reached.
+    """
+
+    def __init__(self, app=None):
+        self.max_attempts = 3
+        self.backoff_base = 30
+        self.lease_seconds = 600
+        self.poll_interval = 2
+        self.embedded_workers = 0
+        self._app = None
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+        self.backoff_base = app.config.get('JOB_BACKOFF_SECONDS', 30)
+        self.lease_seconds = app.config.get('JOB_LEASE_SECONDS', 600)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 2)
+        self.embedded_workers = app.config.get('JOB_EMBEDDED_WORKERS', 0)
+        self._app = app
+        app.extensions['job_queue'] = self
+
+    def enqueue(self, kind, payload, key=None, requested_by=None):
+        """Add a job to the session, or return the queued/running job with the same key.
+
+        The caller commits; workers are woken once the commit lands.
+        """
+        if key:
+            existing = active_job(key)
+            if existing:
+                return existing
+        job = Job(
+            kind=kind,
+            key=key,
+            payload=json.dumps(payload),
+            status='queued',
+            max_attempts=self.max_attempts,
+            run_after=datetime.utcnow(),
+            requested_by_id=requested_by.id if requested_by else None
+        )
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def _claimable(self, now):
+        return or_(
+            and_(Job.status == 'queued', Job.run_after <= now),
+            and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=self.lease_seconds))
+        )
+
+    def claim(self, worker_name):
+        now = datetime.utcnow()
+        candidates = db.session.query(Job.id).filter(self._claimable(now)).order_by(Job.run_after).limit(10).all()
+        for (job_id,) in candidates:
+            claimed = Job.query.filter(Job.id == job_id, self._claimable(now)).update({
+                'status': 'running',
+                'locked_by': worker_name,
+                'locked_at': now,
+                'attempts': Job.attempts + 1
+            }, synchronize_session=False)
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def backoff(self, attempts):
+        delay = self.backoff_base * (2 ** max(attempts - 1, 0))
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def run_once(self, worker_name):
+        """Run one claimable job; returns False when there was nothing to do."""
+        job = self.claim(worker_name)
+        if job is None:
+            return False
+
+        job_id = job.id
+        handler = JOB_HANDLERS.get(job.kind)
+        try:
+            if handler is None:
+                raise PermanentJobError(f'No handler registered for {job.kind!r} jobs')
+            handler(json.loads(job.payload or '{}'))
+        except Exception as exc:
+            db.session.rollback()
+            job = db.session.get(Job, job_id)
+            job.last_error = f'{type(exc).__name__}: {exc}'[:2000]
+            job.locked_by = job.locked_at = None
+            if isinstance(exc, PermanentJobError) or job.attempts >= job.max_attempts:
+                job.status = 'failed'
+                job.finished_at = datetime.utcnow()
+                self._app.logger.warning('Job %s (%s) failed: %s', job_id, job.kind, job.last_error)
+            else:
+                job.status = 'queued'
+                job.run_after = datetime.utcnow() + self.backoff(job.attempts)
+                self._app.logger.info('Job %s (%s) will retry: %s', job_id, job.kind, job.last_error)
+        else:
+            job = db.session.get(Job, job_id)
+            job.status = 'succeeded'
+            job.last_error = None
+            job.locked_by = job.locked_at = None
+            job.finished_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    def work(self, worker_name, stop=None):
+        """Process jobs until ``stop`` is set, sleeping between empty polls."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            with self._app.app_context():
+                try:
+                    busy = self.run_once(worker_name)
+                except Exception:
+                    db.session.rollback()
+                    self._app.logger.exception('Job worker %s crashed while polling', worker_name)
+                    busy = False
+                finally:
+                    db.session.remove()
+            if not busy:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def wake(self):
+        self._wakeup.set()
+        self._ensure_embedded_workers()
+
+    def _ensure_embedded_workers(self):
+        # started on first use rather than in create_app so CLI commands and
+        # pre-fork masters never run them
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for index in range(len(self._threads), self.embedded_workers):
+                name = f'{socket.gethostname()}:{os.getpid()}:embedded-{index}'
+                thread = threading.Thread(target=self.work, args=(name,), daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+
+job_queue = JobQueue()
+
+
+def _wake_after_commit(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake()
+
+
+def _discard_after_rollback(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+def register_job_wakeups():
+    register_transaction_hooks(on_commit=_wake_after_commit, on_rollback=_discard_after_rollback)
+
+
+def _worker_process(config_name, index):
+    from app import create_app
+    # creating the app imports the blueprints, which register the job handlers
+    create_app(config_name)
+    job_queue.work(f'{socket.gethostname()}:{os.getpid()}:worker-{index}')
+
+
+def run_worker_pool(config_name, processes=2):
+    """Run ``processes`` worker processes in the foreground until interrupted."""
+    import multiprocessing
+    workers = [
+        multiprocessing.Process(target=_worker_process, args=(config_name, index), daemon=True)
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
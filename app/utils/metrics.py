@@ -0,0 +1,144 @@
+from datetime import datetime
+from sqlalchemy import event, func, insert, update, delete, select, literal, inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db
+from app.models import User, Appointment, Payment, DailyMetric
+
+daily_metrics = DailyMetric.__table__
+REBUILT_METRICS = ('signups', 'revenue', 'appointments')
+
+
+def _day(value):
+    if value is None:
+        return None
+    return value.date() if isinstance(value, datetime) else value
+
+
+def _contributions(obj, state):
+    if isinstance(obj, User):
+        return [(_day(state('created_at')), 'signups', state('role'), 1)]
+    if isinstance(obj, Payment):
+        if state('status') != 'completed':
+            return []
+        return [(_day(state('payment_date')), 'revenue', state('payment_type'), state('amount') or 0)]
+    if isinstance(obj, Appointment):
+        return [(_day(state('created_at')), 'appointments', state('status'), 1)]
+    return []
+
+
+def _current_state(obj):
+    return lambda attr: getattr(obj, attr)
+
+
+def _previous_state(obj):
+    attrs = inspect(obj).attrs
+
+    def state(attr):
+        history = attrs[attr].history
+        if history.deleted:
+            return history.deleted[0]
+        return getattr(obj, attr)
+    return state
+
+
+def _apply(connection, day, metric, dimension, delta):
+    if day is None or not delta:
+        return
+    values = {'day': day, 'metric': metric, 'dimension': dimension or 'unknown', 'value': delta}
+    dialect = connection.dialect.name
+
+    if dialect in ('sqlite', 'postgresql'):
+        upsert = sqlite_insert if dialect == 'sqlite' else pg_insert
+        stmt = upsert(daily_metrics).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['day', 'metric', 'dimension'],
+            set_={'value': daily_metrics.c.value + stmt.excluded.value}
+        )
+        connection.execute(stmt)
+        return
+
+    result = connection.execute(
+        update(daily_metrics).where(
+            daily_metrics.c.day == values['day'],
+            daily_metrics.c.metric == values['metric'],
+            daily_metrics.c.dimension == values['dimension']
+        ).values(value=daily_metrics.c.value + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(insert(daily_metrics).values(**values))
+
+
+def _after_flush(session, flush_context):
+    deltas = {}
+
+    def add(rows, sign):
+        for day, metric, dimension, value in rows:
+            key = (day, metric, dimension)
+            deltas[key] = deltas.get(key, 0) + sign * value
+
+    for obj in session.new:
+        add(_contributions(obj, _current_state(obj)), 1)
+    for obj in session.dirty:
+        if isinstance(obj, (User, Payment, Appointment)) and session.is_modified(obj):
+            add(_contributions(obj, _previous_state(obj)), -1)
+            add(_contributions(obj, _current_state(obj)), 1)
+    for obj in session.deleted:
+        add(_contributions(obj, _previous_state(obj)), -1)
+
+    if not deltas:
+        return
+
+    connection = session.connection()
+    for (day, metric, dimension), delta in deltas.items():
+        _apply(connection, day, metric, dimension, delta)
+
+
+def record_metric(metric, dimension, delta=1):
+    """Add ``delta`` to today's counter as part of the current transaction."""
+    _apply(db.session.connection(), datetime.utcnow().date(), metric, dimension, delta)
+
+
+def register_metric_listeners():
+    if not event.contains(db.session, 'after_flush', _after_flush):
+        event.listen(db.session, 'after_flush', _after_flush)
+
+
+def rebuild_daily_metrics():
+    day = func.date(User.created_at)
+    signups = select(
+        day, literal('signups'), User.role, func.count(User.id)
+    ).where(User.created_at.isnot(None)).group_by(day, User.role)
+
+    day = func.date(Payment.payment_date)
+    revenue = select(
+        day, literal('revenue'), Payment.payment_type, func.sum(Payment.amount)
+    ).where(Payment.status == 'completed', Payment.payment_date.isnot(None)).group_by(day, Payment.payment_type)
+
+    day = func.date(Appointment.created_at)
+    appointments = select(
+        day, literal('appointments'), func.coalesce(Appointment.status, 'unknown'), func.count(Appointment.id)
+    ).where(Appointment.created_at.isnot(None)).group_by(day, Appointment.status)
+
+    columns = ['day', 'metric', 'dimension', 'value']
+    # other metrics are only counted as they happen and cannot be rebuilt
+    db.session.execute(delete(daily_metrics).where(daily_metrics.c.metric.in_(REBUILT_METRICS)))
+    for query in (signups, revenue, appointments):
+        db.session.execute(insert(daily_metrics).from_select(columns, query))
+    db.session.commit()
+
+    return db.session.query(func.count(DailyMetric.id)).scalar()
+
+
+def get_daily_series(metric, cast=float):
+    total = func.sum(DailyMetric.value)
+    rows = db.session.query(
+        DailyMetric.day,
+        total.label('value')
+    ).filter(DailyMetric.metric == metric).group_by(
+        DailyMetric.day
+    ).having(total != 0).order_by(DailyMetric.day).all()
+
+    labels = [row.day.strftime('%b %d') for row in rows]
+    data = [cast(row.value) for row in rows]
+    return labels, data
@@ -0,0 +1,15 @@
+def row_to_dict(row, formats=None):
+    """Turn a projected result row into a dict without loading ORM objects.
+
+    ``formats`` maps column labels to strftime patterns so the output matches
+    the model's ``to_dict``.
+    """
+    data = dict(row._mapping)
+    for key, pattern in (formats or {}).items():
+        if data.get(key) is not None:
+            data[key] = data[key].strftime(pattern)
+    return data
+
+
+def rows_to_dicts(rows, formats=None):
+    return [row_to_dict(row, formats) for row in rows]
@@ -0,0 +1,38 @@
+from sqlalchemy import event
+from app import db
+
+_commit_hooks = []
+_rollback_hooks = []
+
+
+def _after_commit(session):
+    # releasing a savepoint fires after_commit too; only the outermost commit is durable
+    if session.in_nested_transaction():
+        return
+    for hook in _commit_hooks:
+        hook(session)
+
+
+def _after_rollback(session):
+    # a savepoint rollback leaves the outer transaction, and what it collected, alive
+    if session.in_nested_transaction():
+        return
+    for hook in _rollback_hooks:
+        hook(session)
+
+
+def register_transaction_hooks(on_flush=None, on_commit=None, on_rollback=None):
+    """Listen on ``db.session``: ``on_flush`` after every flush, ``on_commit`` and
+    ``on_rollback`` only when the outermost transaction ends, never at a savepoint.
+
+    Hooks collect work into ``session.info`` on flush, act on it after commit and
+    drop it after rollback. Registering the same hooks again is a no-op.
+    """
+    if on_flush is not None and not event.contains(db.session, 'after_flush', on_flush):
+        event.listen(db.session, 'after_flush', on_flush)
+    for hooks, hook in ((_commit_hooks, on_commit), (_rollback_hooks, on_rollback)):
+        if hook is not None and hook not in hooks:
+            hooks.append(hook)
+    for name, listener in (('after_commit', _after_commit), ('after_rollback', _after_rollback)):
+        if not event.contains(db.session, name, listener):
+            event.listen(db.session, name, listener)
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import VideoRoom
+
+RoomEntry = namedtuple('RoomEntry', ['room_name', 'started_at', 'expires_at'])
+
+
+class MemoryRoomStore:
+    name = 'memory'
+
+    def __init__(self):
+        self._rooms = {}
+        self._lock = threading.Lock()
+
+    def save(self, doctor_id, patient_id, entry):
+        with self._lock:
+            self._rooms[(doctor_id, patient_id)] = entry
+
+    def load(self, doctor_id, patient_id):
+        with self._lock:
+            return self._rooms.get((doctor_id, patient_id))
+
+    def delete(self, doctor_id, patient_id):
+        with self._lock:
+            self._rooms.pop((doctor_id, patient_id), None)
+
+    def delete_expired(self, now):
+        with self._lock:
+            expired = [key for key, entry in self._rooms.items() if entry.expires_at <= now]
+            for key in expired:
+                del self._rooms[key]
+        return len(expired)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._rooms)
+
+
+class DatabaseRoomStore:
+    """Rooms live in the video_room table so every worker sees the same calls.
+
+    Writes join the caller's transaction; only the sweeper commits on its own.
+    """
+    name = 'database'
+
+    def save(self, doctor_id, patient_id, entry):
+        values = entry._asdict()
+        room = VideoRoom.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).first()
+        if room is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(VideoRoom(doctor_id=doctor_id, patient_id=patient_id, **values))
+                return
+            except IntegrityError:
+                room = VideoRoom.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).one()
+        for field, value in values.items():
+            setattr(room, field, value)
+
+    def load(self, doctor_id, patient_id):
+        room = VideoRoom.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).first()
+        if room is None:
+            return None
+        return RoomEntry(room.room_name, room.started_at, room.expires_at)
+
+    def delete(self, doctor_id, patient_id):
+        VideoRoom.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).delete()
+
+    def delete_expired(self, now):
+        removed = VideoRoom.query.filter(VideoRoom.expires_at <= now).delete()
+        db.session.commit()
+        return removed
+
+    def __len__(self):
+        return VideoRoom.query.count()
+
+
+class VideoRoomRegistry:
+    def __init__(self, app=None):
+        self.store = MemoryRoomStore()
+        self.ttl = 180
+        self.sweep_interval = 60
+        self._sweeper = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('VIDEO_ROOM_TTL', 180)
+        self.sweep_interval = app.config.get('VIDEO_ROOM_SWEEP_INTERVAL', 60)
+        if app.config.get('VIDEO_ROOM_BACKEND', 'database') == 'memory':
+            self.store = MemoryRoomStore()
+        else:
+            self.store = DatabaseRoomStore()
+        app.extensions['video_rooms'] = self
+
+    def open(self, doctor_id, patient_id, room_name):
+        now = datetime.utcnow()
+        entry = RoomEntry(room_name, now, now + timedelta(seconds=self.ttl))
+        self.store.save(doctor_id, patient_id, entry)
+        self._ensure_sweeper(current_app._get_current_object())
+        return entry
+
+    def get(self, doctor_id, patient_id):
+        """Return the room entry, including an expired one the sweeper has not removed yet."""
+        return self.store.load(doctor_id, patient_id)
+
+    def close(self, doctor_id, patient_id):
+        self.store.delete(doctor_id, patient_id)
+
+    def sweep(self):
+        return self.store.delete_expired(datetime.utcnow())
+
+    def _ensure_sweeper(self, app):
+        # started on the first call rather than in create_app so CLI commands and
+        # pre-fork masters never run it
+        with self._lock:
+            if self._sweeper and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, args=(app,), daemon=True)
+            self._sweeper.start()
+
+    def _sweep_forever(self, app):
+        while True:
+            time.sleep(self.sweep_interval)
+            with app.app_context():
+                try:
+                    removed = self.sweep()
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Video room sweep failed')
+                    continue
+                if removed:
+                    app.logger.info('Swept %s expired video rooms', removed)
+
+
+video_rooms = VideoRoomRegistry()
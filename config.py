@@ -30,15 +30,66 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH') or 16 * 1024 * 1024)  
     UPLOAD_FOLDER = os.path.join(basedir, 'app', 'static', 'uploads')
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif', 'doc', 'docx'}
+    FILE_DELIVERY = os.environ.get('FILE_DELIVERY') or 'direct'
+    FILE_ACCEL_PREFIX = os.environ.get('FILE_ACCEL_PREFIX') or '/protected-uploads'
+    FILE_DELIVERY_MAX_AGE = int(os.environ.get('FILE_DELIVERY_MAX_AGE') or 3600)
+    FILE_ACCESS_CACHE_TTL = int(os.environ.get('FILE_ACCESS_CACHE_TTL') or 300)
+    RENDITION_WORKERS = int(os.environ.get('RENDITION_WORKERS') or 2)
+    STORAGE_QUOTA_MB = {
+        'free': int(os.environ.get('STORAGE_QUOTA_FREE_MB') or 100),
+        'basic': int(os.environ.get('STORAGE_QUOTA_BASIC_MB') or 1024),
+        'premium': int(os.environ.get('STORAGE_QUOTA_PREMIUM_MB') or 10240),
+        'enterprise': float('inf')
+    }
     
     
     POSTS_PER_PAGE = 10
     
     
+    STATS_CACHE_TTL = int(os.environ.get('STATS_CACHE_TTL') or 60)
+    STATS_CACHE_MAX_ENTRIES = int(os.environ.get('STATS_CACHE_MAX_ENTRIES') or 256)
+    STATS_CACHE_REDIS_URL = os.environ.get('STATS_CACHE_REDIS_URL')
+    DOCTOR_FACETS_TTL = int(os.environ.get('DOCTOR_FACETS_TTL') or 600)
+    
+    
+    EVENT_STREAM_KEEPALIVE = int(os.environ.get('EVENT_STREAM_KEEPALIVE') or 15)
+    EVENT_STREAM_MAX_DURATION = int(os.environ.get('EVENT_STREAM_MAX_DURATION') or 300)
+    EVENT_STREAM_QUEUE_SIZE = int(os.environ.get('EVENT_STREAM_QUEUE_SIZE') or 100)
+    EVENT_STREAM_REDIS_URL = os.environ.get('EVENT_STREAM_REDIS_URL')
+    
+    
+    VIDEO_ROOM_BACKEND = os.environ.get('VIDEO_ROOM_BACKEND') or 'database'
+    VIDEO_ROOM_TTL = int(os.environ.get('VIDEO_ROOM_TTL') or 180)
+    VIDEO_ROOM_SWEEP_INTERVAL = int(os.environ.get('VIDEO_ROOM_SWEEP_INTERVAL') or 60)
+    
+    
+    APPOINTMENT_HOLD_MINUTES = int(os.environ.get('APPOINTMENT_HOLD_MINUTES') or 15)
+    
+    
+    JOB_POLL_INTERVAL = int(os.environ.get('JOB_POLL_INTERVAL') or 2)
+    JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS') or 600)
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS') or 3)
+    JOB_BACKOFF_SECONDS = int(os.environ.get('JOB_BACKOFF_SECONDS') or 30)
+    JOB_EMBEDDED_WORKERS = int(os.environ.get('JOB_EMBEDDED_WORKERS') or 0)
+    AI_ANALYSIS_MODEL = os.environ.get('AI_ANALYSIS_MODEL') or 'gemini'
+    AI_ANALYSIS_TIMEOUT = int(os.environ.get('AI_ANALYSIS_TIMEOUT') or 120)
+    GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    GEMINI_MAX_CACHED_MODELS = int(os.environ.get('GEMINI_MAX_CACHED_MODELS') or 32)
+    AI_ANALYSIS_IMAGE_TOKENS = int(os.environ.get('AI_ANALYSIS_IMAGE_TOKENS') or 60000)
+    AI_ANALYSIS_MAX_IMAGES_PER_CALL = int(os.environ.get('AI_ANALYSIS_MAX_IMAGES_PER_CALL') or 16)
+    AI_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get('AI_ANALYSIS_CACHE_MAX_ENTRIES') or 5000)
+    AI_ANALYSIS_CACHE_MAX_MB = int(os.environ.get('AI_ANALYSIS_CACHE_MAX_MB') or 64)
+    PDF_ANALYSIS_MAX_PAGES = int(os.environ.get('PDF_ANALYSIS_MAX_PAGES') or 30)
+    PDF_PAGE_TARGET_PIXELS = int(os.environ.get('PDF_PAGE_TARGET_PIXELS') or 1500000)
+    PDF_RENDER_PROCESSES = int(os.environ.get('PDF_RENDER_PROCESSES') or 0)  # 0: one per CPU, up to 4
+    PDF_RENDER_MEMORY_MB = int(os.environ.get('PDF_RENDER_MEMORY_MB') or 256)
+    
+    
     OTP_EXPIRY_MINUTES = 10
 
 class DevelopmentConfig(Config):
     DEBUG = True
+    JOB_EMBEDDED_WORKERS = int(os.environ.get('JOB_EMBEDDED_WORKERS') or 1)
 
 class ProductionConfig(Config):
     DEBUG = False
@@ -47,6 +98,8 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    VIDEO_ROOM_BACKEND = 'memory'
+    AI_ANALYSIS_MODEL = 'stub'
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,29 @@
+"""add content hash to medical files for per-patient deduplication
+
+Revision ID: 2b7e4d9f6a18
+Revises: f19c6d3e8a52
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b7e4d9f6a18'
+down_revision = 'f19c6d3e8a52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('medical_file')}
+    if 'sha256' not in columns:
+        op.add_column('medical_file', sa.Column('sha256', sa.String(length=64), nullable=True))
+    op.create_index('ix_medical_file_patient_sha256', 'medical_file', ['patient_id', 'sha256'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_medical_file_patient_sha256', table_name='medical_file', if_exists=True)
+    with op.batch_alter_table('medical_file') as batch_op:
+        batch_op.drop_column('sha256')
@@ -0,0 +1,38 @@
+"""add composite indexes for hot query shapes
+
+Revision ID: 3f1a9c2d7b10
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1a9c2d7b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_appointment_doctor_date_status', 'appointment', ['doctor_id', 'appointment_date', 'status']),
+    ('ix_appointment_patient_status_date', 'appointment', ['patient_id', 'status', 'appointment_date']),
+    ('ix_medical_file_patient_upload_date', 'medical_file', ['patient_id', 'upload_date']),
+    ('ix_medical_file_doctor_upload_date', 'medical_file', ['doctor_id', 'upload_date']),
+    ('ix_message_sender_receiver_read', 'message', ['sender_id', 'receiver_id', 'is_read']),
+    ('ix_message_receiver_read_timestamp', 'message', ['receiver_id', 'is_read', 'timestamp']),
+    ('ix_notification_user_read_created', 'notification', ['user_id', 'is_read', 'created_at']),
+]
+
+
+def upgrade():
+    # db.create_all() in create_app may already have built these from the models
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,44 @@
+"""add lab_result table for lab values read from report text layers
+
+Revision ID: 3f6b9d2e7a41
+Revises: 8d2f5a7c1e63
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f6b9d2e7a41'
+down_revision = '8d2f5a7c1e63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'lab_result',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('medical_file_id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('test_name', sa.String(length=120), nullable=False),
+        sa.Column('value', sa.Float(), nullable=True),
+        sa.Column('value_text', sa.String(length=50), nullable=False),
+        sa.Column('unit', sa.String(length=30), nullable=True),
+        sa.Column('reference_range', sa.String(length=60), nullable=True),
+        sa.Column('page', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['medical_file_id'], ['medical_file.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['patient_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_lab_result_medical_file_id', 'lab_result', ['medical_file_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_lab_result_patient_test', 'lab_result', ['patient_id', 'test_name'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_lab_result_patient_test', table_name='lab_result', if_exists=True)
+    op.drop_index('ix_lab_result_medical_file_id', table_name='lab_result', if_exists=True)
+    op.drop_table('lab_result', if_exists=True)
@@ -0,0 +1,35 @@
+"""add per-patient storage usage counter
+
+Revision ID: 5c8a1e3b7d94
+Revises: 2b7e4d9f6a18
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c8a1e3b7d94'
+down_revision = '2b7e4d9f6a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'storage_used_bytes' not in columns:
+        op.add_column('user', sa.Column('storage_used_bytes', sa.BigInteger(), nullable=False, server_default='0'))
+
+    # identical content stored twice for a patient (same sha256) counts once
+    op.execute(
+        'UPDATE "user" SET storage_used_bytes = COALESCE(('
+        'SELECT SUM(m.file_size) FROM medical_file m WHERE m.patient_id = "user".id AND ('
+        'm.sha256 IS NULL OR m.id = (SELECT MIN(d.id) FROM medical_file d '
+        'WHERE d.patient_id = m.patient_id AND d.sha256 = m.sha256))), 0)'
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('storage_used_bytes')
@@ -0,0 +1,35 @@
+"""add daily_metrics rollup table
+
+Revision ID: 8b4e2f6a1c37
+Revises: 3f1a9c2d7b10
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e2f6a1c37'
+down_revision = '3f1a9c2d7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'daily_metrics',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('metric', sa.String(length=30), nullable=False),
+        sa.Column('dimension', sa.String(length=30), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('day', 'metric', 'dimension', name='uq_daily_metrics_day_metric_dimension'),
+        if_not_exists=True
+    )
+    # populate with `flask rebuild-metrics` after upgrading
+
+
+def downgrade():
+    op.drop_table('daily_metrics', if_exists=True)
@@ -0,0 +1,47 @@
+"""add job table for background work such as AI report analysis
+
+Revision ID: 8d2f5a7c1e63
+Revises: 5c8a1e3b7d94
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f5a7c1e63'
+down_revision = '5c8a1e3b7d94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=50), nullable=False),
+        sa.Column('key', sa.String(length=100), nullable=True),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_after', sa.DateTime(), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('requested_by_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['requested_by_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_job_key', 'job', ['key'], unique=False, if_not_exists=True)
+    op.create_index('ix_job_status_run_after', 'job', ['status', 'run_after'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_job_status_run_after', table_name='job', if_exists=True)
+    op.drop_index('ix_job_key', table_name='job', if_exists=True)
+    op.drop_table('job', if_exists=True)
@@ -0,0 +1,43 @@
+"""add analysis_cache table for reusing AI report analyses
+
+Revision ID: a4c7e2f8b913
+Revises: 3f6b9d2e7a41
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7e2f8b913'
+down_revision = '3f6b9d2e7a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'analysis_cache',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('report_type', sa.String(length=100), nullable=False),
+        sa.Column('prompt_version', sa.Integer(), nullable=False),
+        sa.Column('model_name', sa.String(length=50), nullable=False),
+        sa.Column('pages', sa.String(length=100), nullable=False),
+        sa.Column('analysis', sa.Text(), nullable=False),
+        sa.Column('lab_rows', sa.Text(), nullable=True),
+        sa.Column('size_bytes', sa.Integer(), nullable=False),
+        sa.Column('hits', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('last_used_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256', 'report_type', 'prompt_version', 'model_name', 'pages', name='uq_analysis_cache_key'),
+        if_not_exists=True
+    )
+    op.create_index('ix_analysis_cache_last_used_at', 'analysis_cache', ['last_used_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_analysis_cache_last_used_at', table_name='analysis_cache', if_exists=True)
+    op.drop_table('analysis_cache', if_exists=True)
@@ -0,0 +1,42 @@
+"""add lab_observation table for lab value trends
+
+Revision ID: c2d8f4a6e157
+Revises: a4c7e2f8b913
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2d8f4a6e157'
+down_revision = 'a4c7e2f8b913'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'lab_observation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('medical_file_id', sa.Integer(), nullable=False),
+        sa.Column('analyte_code', sa.String(length=40), nullable=False),
+        sa.Column('test_name', sa.String(length=120), nullable=False),
+        sa.Column('value', sa.Float(), nullable=False),
+        sa.Column('unit', sa.String(length=30), nullable=True),
+        sa.Column('observed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['medical_file_id'], ['medical_file.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['patient_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        if_not_exists=True
+    )
+    op.create_index('ix_lab_observation_medical_file_id', 'lab_observation', ['medical_file_id'], unique=False, if_not_exists=True)
+    op.create_index('ix_lab_observation_patient_analyte_observed', 'lab_observation', ['patient_id', 'analyte_code', 'observed_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_lab_observation_patient_analyte_observed', table_name='lab_observation', if_exists=True)
+    op.drop_index('ix_lab_observation_medical_file_id', table_name='lab_observation', if_exists=True)
+    op.drop_table('lab_observation', if_exists=True)
@@ -0,0 +1,45 @@
+"""add conversation table with denormalized last message and unread counters
+
+Revision ID: c52d8e1f4a90
+Revises: 8b4e2f6a1c37
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52d8e1f4a90'
+down_revision = '8b4e2f6a1c37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'conversation',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('last_message_id', sa.Integer(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('doctor_unread_count', sa.Integer(), nullable=False),
+        sa.Column('patient_unread_count', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['doctor_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['last_message_id'], ['message.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('doctor_id', 'patient_id', name='uq_conversation_doctor_patient'),
+        if_not_exists=True
+    )
+    op.create_index('ix_conversation_doctor_last_message_at', 'conversation', ['doctor_id', 'last_message_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_conversation_patient_last_message_at', 'conversation', ['patient_id', 'last_message_at'], unique=False, if_not_exists=True)
+    # populate from existing messages with `flask rebuild-conversations`
+
+
+def downgrade():
+    op.drop_index('ix_conversation_patient_last_message_at', table_name='conversation', if_exists=True)
+    op.drop_index('ix_conversation_doctor_last_message_at', table_name='conversation', if_exists=True)
+    op.drop_table('conversation', if_exists=True)
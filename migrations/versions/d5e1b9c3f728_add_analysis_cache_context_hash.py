@@ -0,0 +1,37 @@
+"""add per-file prompt hash to the analysis_cache key
+
+Revision ID: d5e1b9c3f728
+Revises: c2d8f4a6e157
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5e1b9c3f728'
+down_revision = 'c2d8f4a6e157'
+branch_labels = None
+depends_on = None
+
+KEY_COLUMNS = ['sha256', 'report_type', 'prompt_version', 'model_name', 'pages']
+
+
+def upgrade():
+    # entries keyed without the prompt hash may carry another patient's description and doctor
+    op.execute('DELETE FROM analysis_cache')
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('analysis_cache')}
+    with op.batch_alter_table('analysis_cache') as batch_op:
+        if 'context_hash' not in columns:
+            batch_op.add_column(sa.Column('context_hash', sa.String(length=64), nullable=False, server_default=''))
+        batch_op.drop_constraint('uq_analysis_cache_key', type_='unique')
+        batch_op.create_unique_constraint('uq_analysis_cache_key', KEY_COLUMNS + ['context_hash'])
+
+
+def downgrade():
+    op.execute('DELETE FROM analysis_cache')
+    with op.batch_alter_table('analysis_cache') as batch_op:
+        batch_op.drop_constraint('uq_analysis_cache_key', type_='unique')
+        batch_op.create_unique_constraint('uq_analysis_cache_key', KEY_COLUMNS)
+        batch_op.drop_column('context_hash')
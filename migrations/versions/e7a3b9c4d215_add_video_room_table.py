@@ -0,0 +1,39 @@
+"""add video_room table shared across workers
+
+Revision ID: e7a3b9c4d215
+Revises: c52d8e1f4a90
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3b9c4d215'
+down_revision = 'c52d8e1f4a90'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'video_room',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('doctor_id', sa.Integer(), nullable=False),
+        sa.Column('patient_id', sa.Integer(), nullable=False),
+        sa.Column('room_name', sa.String(length=100), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['doctor_id'], ['user.id']),
+        sa.ForeignKeyConstraint(['patient_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('doctor_id', 'patient_id', name='uq_video_room_doctor_patient'),
+        if_not_exists=True
+    )
+    op.create_index('ix_video_room_expires_at', 'video_room', ['expires_at'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_video_room_expires_at', table_name='video_room', if_exists=True)
+    op.drop_table('video_room', if_exists=True)
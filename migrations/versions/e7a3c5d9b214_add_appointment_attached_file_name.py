@@ -0,0 +1,27 @@
+"""add uploaded file name to treatment attachments
+
+Revision ID: e7a3c5d9b214
+Revises: d5e1b9c3f728
+Create Date: 2026-10-18 10:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c5d9b214'
+down_revision = 'd5e1b9c3f728'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('appointment')}
+    if 'attached_file_name' not in columns:
+        op.add_column('appointment', sa.Column('attached_file_name', sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('appointment') as batch_op:
+        batch_op.drop_column('attached_file_name')
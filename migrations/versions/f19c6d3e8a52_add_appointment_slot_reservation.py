@@ -0,0 +1,50 @@
+"""add appointment hold expiry and unique index on active slots
+
+Revision ID: f19c6d3e8a52
+Revises: e7a3b9c4d215
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f19c6d3e8a52'
+down_revision = 'e7a3b9c4d215'
+branch_labels = None
+depends_on = None
+
+ACTIVE_SLOT = sa.text("status IN ('pending', 'confirmed')")
+
+
+def upgrade():
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('appointment')}
+    if 'hold_expires_at' not in columns:
+        op.add_column('appointment', sa.Column('hold_expires_at', sa.DateTime(), nullable=True))
+
+    duplicates = bind.execute(sa.text(
+        "SELECT doctor_id, appointment_date, appointment_time, COUNT(*) FROM appointment "
+        "WHERE status IN ('pending', 'confirmed') "
+        "GROUP BY doctor_id, appointment_date, appointment_time HAVING COUNT(*) > 1"
+    )).fetchall()
+    if duplicates:
+        slots = ', '.join(f'doctor {row[0]} on {row[1]} at {row[2]}' for row in duplicates[:10])
+        raise RuntimeError(
+            f'{len(duplicates)} slots are double-booked ({slots}). '
+            'Cancel or reschedule the extra appointments, then run the upgrade again.'
+        )
+
+    op.create_index(
+        'uq_appointment_active_slot', 'appointment',
+        ['doctor_id', 'appointment_date', 'appointment_time'],
+        unique=True, if_not_exists=True,
+        sqlite_where=ACTIVE_SLOT, postgresql_where=ACTIVE_SLOT
+    )
+
+
+def downgrade():
+    op.drop_index('uq_appointment_active_slot', table_name='appointment', if_exists=True)
+    with op.batch_alter_table('appointment') as batch_op:
+        batch_op.drop_column('hold_expires_at')
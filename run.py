@@ -1,5 +1,6 @@
 
 import os
+import click
 from flask.cli import FlaskGroup
 from app import create_app, db
 from app.models import User, Appointment, Payment, MedicalFile, Message, Notification, Referral, DoctorReferral
@@ -18,6 +19,81 @@ def init_db():
     
     db.create_all()
 
+@app.cli.command()
+def rebuild_metrics():
+    
+    from app.utils.metrics import rebuild_daily_metrics
+    rows = rebuild_daily_metrics()
+    print(f'Rebuilt daily_metrics: {rows} rows.')
+
+@app.cli.command()
+def rebuild_conversations():
+    
+    from app.chat.utils import rebuild_conversations as rebuild
+    rows = rebuild()
+    print(f'Rebuilt conversations: {rows} rows.')
+
+@app.cli.command()
+def rebuild_search_index():
+    
+    from app.appointments.search import doctor_search
+    rows = doctor_search.rebuild()
+    print(f'Rebuilt doctor search index: {rows} doctors.')
+
+@app.cli.command()
+def reconcile_storage():
+    
+    from app.uploads.quota import reconcile_storage_usage
+    patients, corrected, missing = reconcile_storage_usage()
+    print(f'Reconciled storage for {patients} patients: {corrected} corrected, {len(missing)} files missing on disk.')
+    for path in missing:
+        print(f'  missing: {path}')
+
+@app.cli.command()
+def rebuild_lab_observations():
+    
+    from app.uploads.observations import rebuild_lab_observations as rebuild
+    files, observations = rebuild()
+    print(f'Rebuilt lab observations: {observations} values from {files} analyzed files.')
+
+@app.cli.command()
+@click.option('--workers', default=2, show_default=True, help='Number of worker processes.')
+def run_jobs(workers):
+    
+    from app.utils.jobs import run_worker_pool
+    print(f'Starting {workers} job workers, press Ctrl+C to stop.')
+    run_worker_pool(os.getenv('FLASK_CONFIG') or 'default', workers)
+
+@app.cli.command()
+@click.argument('paths', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--repeat', default=3, show_default=True, help='Timed runs per mode.')
+def benchmark_pdf_render(paths, repeat):
+    
+    import glob
+    import time
+    from app.uploads.pdf_pages import page_renderer, page_count, pack_pages
+    paths = paths or sorted(glob.glob(os.path.join(app.config['UPLOAD_FOLDER'], '**', '*.pdf'), recursive=True))
+    if not paths:
+        print('No PDFs found.')
+        return
+    documents = [(path, list(range(page_count(path)))) for path in paths]
+    total_pages = sum(len(pages) for path, pages in documents)
+    print(f'{len(documents)} PDFs, {total_pages} pages, {page_renderer.processes} processes, '
+          f'{page_renderer.max_in_flight} pages in flight, target {page_renderer.target_pixels} pixels per page')
+    page_renderer.render(*documents[0])  # starts the pool outside the timings
+    for label, parallel in (('serial', False), ('pool', True)):
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rendered = [page_renderer.render(path, pages, parallel=parallel) for path, pages in documents]
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        print(f'{label:>6}: {best * 1000:.0f} ms, {total_pages / best:.1f} pages/s')
+    calls = sum(len(pack_pages(pages, app.config['AI_ANALYSIS_IMAGE_TOKENS'], app.config['AI_ANALYSIS_MAX_IMAGES_PER_CALL']))
+                for pages in rendered)
+    print(f'model calls: {calls} for {total_pages} pages (one page per call would need {total_pages})')
+    page_renderer.shutdown()
+
 @app.cli.command()
 def seed_db():
     
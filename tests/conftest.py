@@ -0,0 +1,23 @@
+import pytest
+from app import create_app, db
+from app.models import User
+from config import TestingConfig
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # a file database, so threads get their own connections to the same data
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(TestingConfig, 'UPLOAD_FOLDER', str(tmp_path / 'uploads'))
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+
+def make_user(role, name, **fields):
+    user = User(name=name, email=f'{name.lower()}@example.com', role=role, is_verified=True, **fields)
+    user.password_hash = 'x'
+    db.session.add(user)
+    db.session.commit()
+    return user
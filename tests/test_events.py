@@ -0,0 +1,49 @@
+from app import db
+from app.models import Message
+from app.utils.events import event_broker
+from tests.conftest import make_user
+
+
+def drain(subscription):
+    events = []
+    while not subscription.empty():
+        events.append(subscription.get_nowait())
+    return events
+
+
+def test_marking_messages_read_sends_a_receipt_to_the_sender(app):
+    doctor = make_user('doctor', 'Doctor')
+    patient = make_user('patient', 'Patient')
+    messages = [Message(sender_id=patient.id, receiver_id=doctor.id, content=f'hello {number}') for number in range(3)]
+    db.session.add_all(messages)
+    db.session.commit()
+
+    subscription = event_broker.subscribe(patient.id)
+    try:
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(doctor.id)
+        response = client.post(f'/chat/api/mark_read/{patient.id}')
+        assert response.get_json()['marked_count'] == 3
+
+        receipts = [data for event_type, data in drain(subscription) if event_type == 'chat_read']
+        assert receipts == [{'reader_id': doctor.id, 'read_up_to': max(message.id for message in messages)}]
+    finally:
+        event_broker.unsubscribe(patient.id, subscription)
+
+
+def test_rolled_back_reads_send_no_receipt(app):
+    doctor = make_user('doctor', 'Doctor')
+    patient = make_user('patient', 'Patient')
+    message = Message(sender_id=patient.id, receiver_id=doctor.id, content='hello')
+    db.session.add(message)
+    db.session.commit()
+
+    subscription = event_broker.subscribe(patient.id)
+    try:
+        message.is_read = True
+        db.session.flush()
+        db.session.rollback()
+        assert drain(subscription) == []
+    finally:
+        event_broker.unsubscribe(patient.id, subscription)
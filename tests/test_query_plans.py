@@ -0,0 +1,47 @@
+from datetime import date, datetime
+import pytest
+from app import db
+from app.models import Appointment, MedicalFile, Message, Notification
+
+# (table, expected index, query) for the dashboard, chat and notification hot paths
+HOT_QUERIES = [
+    ('appointment', 'ix_appointment_doctor_date_status', lambda: Appointment.query.filter_by(
+        doctor_id=1, appointment_date=date.today()
+    ).order_by(Appointment.appointment_time.asc())),
+    ('appointment', 'ix_appointment_doctor_date_status', lambda: Appointment.query.filter_by(
+        doctor_id=1, status='confirmed'
+    ).filter(Appointment.appointment_date > date.today()).order_by(Appointment.appointment_date.asc()).limit(5)),
+    ('appointment', 'ix_appointment_patient_status_date', lambda: Appointment.query.filter_by(
+        patient_id=1, status='completed'
+    ).order_by(Appointment.appointment_date.desc()).limit(5)),
+    ('medical_file', 'ix_medical_file_patient_upload_date', lambda: MedicalFile.query.filter_by(
+        patient_id=1
+    ).order_by(MedicalFile.upload_date.desc()).limit(5)),
+    ('medical_file', 'ix_medical_file_doctor_upload_date', lambda: MedicalFile.query.filter_by(
+        doctor_id=1
+    ).filter(MedicalFile.upload_date >= datetime(2026, 1, 1))),
+    ('message', 'ix_message_receiver_read_timestamp', lambda: Message.query.filter_by(
+        receiver_id=1, is_read=False
+    ).order_by(Message.timestamp.desc()).limit(5)),
+    ('message', 'ix_message_sender_receiver_read', lambda: Message.query.filter_by(
+        sender_id=2, receiver_id=1, is_read=False
+    )),
+    ('notification', 'ix_notification_user_read_created', lambda: Notification.query.filter_by(
+        user_id=1, is_read=False
+    ).order_by(Notification.created_at.desc()).limit(5)),
+]
+
+
+def query_plan(query):
+    compiled = query.statement.compile(dialect=db.engine.dialect)
+    # the plan does not depend on the bound values
+    params = (None,) * len(compiled.positiontup or ())
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}', params).all()
+    return [row[-1] for row in rows]
+
+
+@pytest.mark.parametrize('table, index, build', HOT_QUERIES, ids=[index for _, index, _ in HOT_QUERIES])
+def test_hot_query_searches_its_index(app, table, index, build):
+    plan = query_plan(build())
+    assert any(step.startswith(f'SEARCH {table} USING') and index in step for step in plan), plan
+    assert not any(step.startswith(f'SCAN {table}') for step in plan), plan
@@ -0,0 +1,101 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+from app import db
+from app.appointments.reservations import reserve_slot, SlotUnavailableError
+from app.models import Appointment
+from tests.conftest import make_user
+
+SLOT_DATE = date.today() + timedelta(days=3)
+
+
+def book(app, patient_id, doctor_id, slot, barrier):
+    with app.app_context():
+        appointment = Appointment(
+            patient_id=patient_id,
+            doctor_id=doctor_id,
+            appointment_type='in-person',
+            appointment_date=SLOT_DATE,
+            appointment_time=slot,
+            status='pending'
+        )
+        barrier.wait()
+        try:
+            reserve_slot(appointment)
+            db.session.commit()
+            return 'ok'
+        except SlotUnavailableError:
+            db.session.rollback()
+            return 'conflict'
+        finally:
+            db.session.remove()
+
+
+def test_concurrent_bookings_of_one_slot_admit_exactly_one(app):
+    doctor_id = make_user('doctor', 'Doctor').id
+    patient_ids = [make_user('patient', f'Patient{number}').id for number in range(20)]
+    barrier = threading.Barrier(10)
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        outcomes = list(pool.map(
+            lambda patient_id: book(app, patient_id, doctor_id, time(10, 0), barrier),
+            patient_ids
+        ))
+
+    assert outcomes.count('ok') == 1
+    assert outcomes.count('conflict') == 19
+    assert Appointment.query.filter_by(doctor_id=doctor_id, appointment_time=time(10, 0)).count() == 1
+
+
+def test_rescheduling_a_lapsed_hold_renews_it(app):
+    doctor = make_user('doctor', 'Doctor')
+    patient = make_user('patient', 'Patient')
+    appointment = Appointment(
+        patient_id=patient.id,
+        doctor_id=doctor.id,
+        appointment_type='online',
+        appointment_date=SLOT_DATE,
+        appointment_time=time(10, 0),
+        status='pending',
+        hold_expires_at=datetime.utcnow() - timedelta(minutes=1)
+    )
+    db.session.add(appointment)
+    db.session.commit()
+
+    appointment.appointment_time = time(11, 0)
+    reserve_slot(appointment, hold=True)
+    db.session.commit()
+
+    status, hold_expires_at = db.session.query(Appointment.status, Appointment.hold_expires_at).filter_by(
+        id=appointment.id
+    ).one()
+    assert status == 'pending'
+    assert hold_expires_at > datetime.utcnow()
+
+
+def test_expired_holds_of_other_bookings_free_their_slot(app):
+    doctor = make_user('doctor', 'Doctor')
+    first, second = make_user('patient', 'First'), make_user('patient', 'Second')
+    lapsed = Appointment(
+        patient_id=first.id,
+        doctor_id=doctor.id,
+        appointment_type='online',
+        appointment_date=SLOT_DATE,
+        appointment_time=time(10, 0),
+        status='pending',
+        hold_expires_at=datetime.utcnow() - timedelta(minutes=1)
+    )
+    db.session.add(lapsed)
+    db.session.commit()
+
+    reserve_slot(Appointment(
+        patient_id=second.id,
+        doctor_id=doctor.id,
+        appointment_type='in-person',
+        appointment_date=SLOT_DATE,
+        appointment_time=time(10, 0),
+        status='pending'
+    ))
+    db.session.commit()
+
+    assert db.session.get(Appointment, lapsed.id).status == 'expired'